@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so the session and auth queries are measured too
+    'relationship_app.middleware.QueryInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -71,18 +74,162 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'LibraryProject.wsgi.application'
 
+# Route the catalogue pages and dashboards to relationship_app.async_views.
+# LibraryProject.asgi turns this on; under WSGI the sync views avoid
+# running an event loop per request.
+ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS', '0') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+#
+# SQLite is tuned for concurrent web traffic; every knob can be overridden
+# from the environment (see benchmarks/sqlite_concurrency.py):
+# - WAL lets readers run alongside the single writer, and
+#   synchronous=NORMAL is durable in WAL mode except on power loss.
+#   The journal mode is stored in the database file, so it is set once,
+#   by relationship_app migration 0011, not on every connection;
+# - busy_timeout makes a blocked writer wait instead of failing with
+#   "database is locked";
+# - transaction_mode IMMEDIATE takes the write lock when an atomic block
+#   starts. A deferred transaction that reads and then writes can fail
+#   at once when another writer got in first, without waiting;
+# - mmap_size and cache_size (negative = KiB) keep hot pages in memory.
+# Connections are kept for CONN_MAX_AGE seconds and checked before
+# reuse. The default is 0 under ASGI, where each request's thread-
+# sensitive executor opens its own connection.
+
+SQLITE_JOURNAL_MODE = os.environ.get('DJANGO_SQLITE_JOURNAL_MODE', 'wal')
+SQLITE_PRAGMAS = {
+    'synchronous': os.environ.get('DJANGO_SQLITE_SYNCHRONOUS', 'normal'),
+    'busy_timeout': int(os.environ.get('DJANGO_SQLITE_BUSY_TIMEOUT_MS', 5000)),
+    'mmap_size': int(os.environ.get('DJANGO_SQLITE_MMAP_SIZE', 256 * 2 ** 20)),
+    'cache_size': int(os.environ.get('DJANGO_SQLITE_CACHE_SIZE', -20000)),
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('DJANGO_DB_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 0 if ASYNC_VIEWS else 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': '; '.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            'transaction_mode': os.environ.get('DJANGO_SQLITE_TRANSACTION_MODE', 'IMMEDIATE') or None,
+        },
     }
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# Two tiers, both usable without external services:
+# - 'default' is per-process local memory for hot keys.
+# - 'shared' is visible to every worker process on the host. It is
+#   file-based by default. Set DJANGO_SHARED_CACHE=db to use the database
+#   cache table (run `manage.py createcachetable` first), or =locmem for a
+#   single-process setup.
+# relationship_app.caching combines the two tiers.
+
+SHARED_CACHE_BACKENDS = {
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}
+SHARED_CACHE = os.environ.get('DJANGO_SHARED_CACHE', 'file')
+SHARED_CACHE_LOCATIONS = {
+    'file': os.environ.get('DJANGO_CACHE_DIR', str(BASE_DIR / 'cache')),
+    'db': 'django_cache',
+    'locmem': 'libraryproject-shared',
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'libraryproject-hot',
+        'TIMEOUT': int(os.environ.get('DJANGO_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('DJANGO_HOT_CACHE_MAX_ENTRIES', 1000))},
+    },
+    'shared': {
+        'BACKEND': SHARED_CACHE_BACKENDS[SHARED_CACHE],
+        'LOCATION': SHARED_CACHE_LOCATIONS[SHARED_CACHE],
+        'TIMEOUT': int(os.environ.get('DJANGO_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('DJANGO_SHARED_CACHE_MAX_ENTRIES', 10000))},
+    },
+    # {% cache %} fragments, in both tiers so every worker can serve them
+    'template_fragments': {
+        'BACKEND': 'relationship_app.caching.TieredCache',
+        'TIMEOUT': int(os.environ.get('DJANGO_CACHE_TIMEOUT', 300)),
+    },
+}
+
+# The tests run with the file and database cache tiers in local memory
+TEST_RUNNER = 'LibraryProject.test_runner.TestRunner'
+
+# Seconds a value copied from the shared tier stays in the per-process
+# tier. Bounds how stale an unversioned key can be in other workers.
+HOT_CACHE_TIMEOUT = int(os.environ.get('DJANGO_HOT_CACHE_TIMEOUT', 30))
+
+# Lifetime of the {% cache %} fragments in the catalogue templates (0 disables them)
+FRAGMENT_CACHE_TIMEOUT = int(os.environ.get('DJANGO_FRAGMENT_CACHE_TIMEOUT', 300))
+
+# Cache warming (manage.py warm_caches, relationship_app.warming):
+# - threads rendering pages at once;
+# - seconds after which a page's recent access count has halved.
+WARM_CACHE_THREADS = int(os.environ.get('DJANGO_WARM_CACHE_THREADS', 4))
+ACCESS_COUNT_HALF_LIFE = int(os.environ.get('DJANGO_ACCESS_COUNT_HALF_LIFE', 3600))
+
+# Seconds before the cached admin dashboard statistics are recomputed in
+# the background (relationship_app.services.get_dashboard_stats)
+DASHBOARD_STATS_TTL = int(os.environ.get('DJANGO_DASHBOARD_STATS_TTL', 30))
+
+# Query/SQL-time/template-time instrumentation
+# (relationship_app.middleware.QueryInstrumentationMiddleware):
+# - the fraction of requests measured, all of them under DEBUG;
+# - whether each measured request logs a JSON line;
+# - how many runs of the same SQL statement in one request flag an N+1.
+INSTRUMENTATION_SAMPLE_RATE = float(
+    os.environ.get('DJANGO_INSTRUMENTATION_SAMPLE_RATE', 1 if DEBUG else 0.01)
+)
+INSTRUMENTATION_LOG = os.environ.get('DJANGO_INSTRUMENTATION_LOG', '0') == '1'
+INSTRUMENTATION_DUPLICATE_THRESHOLD = int(os.environ.get('DJANGO_INSTRUMENTATION_DUPLICATE_THRESHOLD', 3))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'relationship_app.instrumentation': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+        # Retries and failures; `run_workers -v 2` also logs every finished job
+        'relationship_app.jobs': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+
+# Per-process autocomplete prefix index (relationship_app.autocomplete):
+# entry cap (~190 bytes each, one per word of every title and author name)
+# and how often, in seconds, to check for changes made by other processes
+AUTOCOMPLETE_MAX_ENTRIES = int(os.environ.get('DJANGO_AUTOCOMPLETE_MAX_ENTRIES', 200000))
+AUTOCOMPLETE_CHECK_INTERVAL = float(os.environ.get('DJANGO_AUTOCOMPLETE_CHECK_INTERVAL', 2))
+
+# Database job queue (relationship_app.jobs, run by `manage.py run_workers`):
+# - worker processes, and seconds between polls of an empty queue;
+# - runs per job, and the delay before the first retry (doubled after each);
+# - seconds between heartbeats of a running job, and seconds without one
+#   after which its worker is presumed dead;
+# - selection size above which the bulk admin actions run as a job.
+JOB_WORKERS = int(os.environ.get('DJANGO_JOB_WORKERS', 2))
+JOB_POLL_INTERVAL = float(os.environ.get('DJANGO_JOB_POLL_INTERVAL', 1))
+JOB_MAX_ATTEMPTS = int(os.environ.get('DJANGO_JOB_MAX_ATTEMPTS', 3))
+JOB_RETRY_DELAY = int(os.environ.get('DJANGO_JOB_RETRY_DELAY', 10))
+JOB_HEARTBEAT_INTERVAL = float(os.environ.get('DJANGO_JOB_HEARTBEAT_INTERVAL', 60))
+JOB_TIMEOUT = int(os.environ.get('DJANGO_JOB_TIMEOUT', 3600))
+BULK_BACKGROUND_THRESHOLD = int(os.environ.get('DJANGO_BULK_BACKGROUND_THRESHOLD', 10000))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -125,5 +272,7 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Authentication settings
+# ProfileBackend loads request.user together with its UserProfile
+AUTHENTICATION_BACKENDS = ['relationship_app.backends.ProfileBackend']
 LOGIN_REDIRECT_URL = '/relationship/'
 LOGOUT_REDIRECT_URL = '/relationship/login/'
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+LOCMEM = 'django.core.cache.backends.locmem.LocMemCache'
+# Backends whose data outlives the test run
+PERSISTENT_BACKENDS = {
+    'django.core.cache.backends.filebased.FileBasedCache',
+    'django.core.cache.backends.db.DatabaseCache',
+}
+
+
+class TestRunner(DiscoverRunner):
+    """
+    DiscoverRunner with the file and database cache tiers swapped for
+    local memory, so the tests clearing the caches cannot empty the
+    shared cache of the developer or server running them
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        caches = {
+            alias: {**config, 'BACKEND': LOCMEM, 'LOCATION': f'test-{alias}'}
+            if config['BACKEND'] in PERSISTENT_BACKENDS else config
+            for alias, config in settings.CACHES.items()
+        }
+        self._caches = override_settings(CACHES=caches)
+        self._caches.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._caches.disable()
+        super().teardown_test_environment(**kwargs)
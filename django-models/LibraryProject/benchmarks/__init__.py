@@ -0,0 +1,8 @@
+"""
+Benchmarks for the relationship_app catalogue.
+
+Each module runs against a throwaway test database, so the development
+db.sqlite3 is never touched. Run them from the project directory, e.g.:
+
+    python -m benchmarks.pagination
+"""
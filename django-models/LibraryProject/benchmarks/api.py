@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Requests/sec and response size of the JSON API against the list_books page:
+
+    python -m benchmarks.api [--books 5000] [--requests 300]
+
+Both serve one page of 50 books with their authors. The HTML page is
+rendered with FRAGMENT_CACHE_TIMEOUT=0, so it builds model instances and
+renders the template on every request. The API serializes values() rows.
+"""
+import argparse
+
+from benchmarks.fragment_cache import client_for, populate, requests_per_second
+from benchmarks.utils import setup_django, temporary_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--books', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import override_settings
+    from django.urls import reverse
+
+    with temporary_database(), override_settings(FRAGMENT_CACHE_TIMEOUT=0):
+        populate(args.books, libraries=20)
+        client = client_for('Member')
+        api = reverse('relationship_app:api_books')
+        pages = [
+            ('list_books.html', reverse('relationship_app:list_books')),
+            ('api ?fields=title,author', f'{api}?fields=title,author'),
+            ('api ?include=author', f'{api}?include=author'),
+            ('api ?include=author,libraries', f'{api}?include=author,libraries'),
+        ]
+
+        print(f"{'endpoint':<32} {'req/s':>7} {'bytes':>7}")
+        for name, url in pages:
+            size = len(client.get(url).content)
+            rate = requests_per_second(client, url, args.requests)
+            print(f"{name:<32} {rate:>7.0f} {size:>7}")
+
+
+if __name__ == '__main__':
+    main()
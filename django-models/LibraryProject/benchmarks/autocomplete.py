@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Build cost, memory and lookup latency of the autocomplete prefix index:
+
+    python -m benchmarks.autocomplete [--books 100000] [--lookups 5000] [--max-entries N]
+
+Lookups are timed twice: directly against PrefixIndex.lookup() and end
+to end through the /relationship/autocomplete/ endpoint with the test
+client, signed in as a member. Prefixes are 1-6 characters taken from
+real titles and names.
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from benchmarks.fragment_cache import client_for
+from benchmarks.utils import percentile, setup_django, temporary_database
+
+
+def populate(books):
+    from relationship_app.importers import import_rows
+
+    words = ['great', 'adventure', 'silent', 'river', 'winter', 'garden', 'empire', 'shadow', 'night', 'sea']
+    rng = random.Random(7)
+    import_rows(
+        {
+            'title': ' '.join(rng.choice(words).title() for _ in range(rng.randint(2, 5))) + f' {i}',
+            'author': f"{rng.choice(words).title()} Author{i % 5000}",
+        }
+        for i in range(books)
+    )
+
+
+def latencies(func, prefixes):
+    samples = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        func(prefix)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(name, samples):
+    print(f"{name:<10} p50 {percentile(samples, 50) * 1000:6.3f}ms  "
+          f"p99 {percentile(samples, 99) * 1000:6.3f}ms  max {max(samples) * 1000:6.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--books', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=5000)
+    parser.add_argument('--max-entries', type=int, help='Override AUTOCOMPLETE_MAX_ENTRIES')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import override_settings
+    from django.urls import reverse
+    from relationship_app import autocomplete
+    from relationship_app.models import Book
+
+    with temporary_database(), override_settings(DEBUG=False):
+        populate(args.books)
+        index = autocomplete.index
+        if args.max_entries:
+            index.max_entries = args.max_entries
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        index.build()
+        elapsed = time.perf_counter() - start
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"build: {len(index)} entries in {elapsed:.2f}s, {size / 2 ** 20:.1f}MB"
+              f"{' (truncated)' if index.truncated else ''}")
+
+        rng = random.Random(11)
+        labels = list(Book.objects.values_list('title', flat=True)[:1000])
+        prefixes = []
+        for _ in range(args.lookups):
+            word = rng.choice(rng.choice(labels).split())
+            prefixes.append(word[:rng.randint(1, 6)])
+
+        report('lookup()', latencies(index.lookup, prefixes))
+        client = client_for('Member')
+        url = reverse('relationship_app:autocomplete')
+        report('endpoint', latencies(lambda prefix: client.get(url, {'q': prefix}), prefixes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Admin bulk actions on large selections, set-based against per-object:
+
+    python -m benchmarks.bulk_actions [--rows 100000] [--sample 2000]
+
+Each action in relationship_app.bulk runs once over a selection of
+``--rows`` books, for relationship_app.Book and bookshelf.Book. The
+per-object equivalent is what the actions replace: save() in a loop,
+library.books.add() of loaded objects, and QuerySet.delete() as called
+by delete_selected, which collects the rows and sends their signals. It
+runs on ``--sample`` rows, and its time is scaled up to ``--rows``.
+"""
+import argparse
+import time
+
+from benchmarks.utils import setup_django, temporary_database
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def report(name, rows, bulk_seconds, sample, per_object_seconds):
+    scaled = per_object_seconds * rows / sample
+    print(f"{name:<28} {bulk_seconds:>9.2f}s {rows / bulk_seconds:>12,.0f} {scaled:>13.1f}s "
+          f"{scaled / bulk_seconds:>8.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--sample', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import override_settings
+
+    from bookshelf.models import Book as ShelfBook
+    from relationship_app import bulk
+    from relationship_app.importers import import_rows
+    from relationship_app.models import Author, Book, Library
+
+    rows, sample = args.rows, args.sample
+    with temporary_database(), override_settings(DEBUG=False):
+        import_rows({'title': f'Book {i:07d}', 'author': f'Author {i % 500:03d}'} for i in range(rows + sample))
+        ShelfBook.objects.bulk_create(
+            (ShelfBook(title=f'Book {i:07d}', author=f'Author {i % 500:03d}', publication_year=1950 + i % 70)
+             for i in range(rows + sample)),
+            batch_size=10000,
+        )
+        target = Author.objects.create(name='Target')
+        library = Library.objects.create(name='Central')
+        other = Library.objects.create(name='Branch')
+        books = Book.objects.order_by('pk')
+        selection = Book.objects.filter(pk__in=books.values('pk')[:rows])
+        sampled = list(books[rows:rows + sample].select_related('author'))
+        shelf_ids = ShelfBook.objects.order_by('pk').values_list('pk', flat=True)
+        shelf_selection = ShelfBook.objects.filter(pk__lte=shelf_ids[rows - 1])
+        shelf_sampled = list(ShelfBook.objects.filter(pk__gt=shelf_ids[rows - 1]))
+
+        print(f"{rows:,} selected rows, chunks of {bulk.BULK_CHUNK_SIZE:,}; per-object on {sample:,} rows, scaled")
+        print(f"{'action':<28} {'bulk':>10} {'rows/s':>12} {'per-object':>14} {'speedup':>8}")
+
+        def save_each(objects, **values):
+            for obj in objects:
+                for field, value in values.items():
+                    setattr(obj, field, value)
+                obj.save()
+
+        seconds, _ = timed(lambda: bulk.reassign_books(selection, target))
+        report('reassign author', rows, seconds, sample, timed(lambda: save_each(sampled, author=target))[0])
+
+        seconds, _ = timed(lambda: bulk.add_books_to_library(selection, library))
+        report('add to library', rows, seconds, sample, timed(lambda: other.books.add(*sampled))[0])
+
+        seconds, _ = timed(lambda: bulk.remove_books_from_library(selection, library))
+        report('remove from library', rows, seconds, sample, timed(lambda: other.books.remove(*sampled))[0])
+
+        bulk.add_books_to_library(selection, library)
+        seconds, _ = timed(lambda: bulk.delete_books(selection))
+        per_object, _ = timed(lambda: Book.objects.filter(pk__in=[book.pk for book in sampled]).delete())
+        report('delete', rows, seconds, sample, per_object)
+
+        seconds, _ = timed(lambda: bulk.update_rows(shelf_selection, publication_year=2001))
+        report('bookshelf: set year', rows, seconds, sample,
+               timed(lambda: save_each(shelf_sampled, publication_year=2001))[0])
+
+        seconds, _ = timed(lambda: bulk.update_rows(shelf_selection, author='Target'))
+        report('bookshelf: reassign author', rows, seconds, sample,
+               timed(lambda: save_each(shelf_sampled, author='Target'))[0])
+
+        seconds, _ = timed(lambda: bulk.delete_rows(shelf_selection))
+        per_object, _ = timed(lambda: ShelfBook.objects.filter(pk__in=[book.pk for book in shelf_sampled]).delete())
+        report('bookshelf: delete', rows, seconds, sample, per_object)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Peak memory and throughput of the streaming catalogue export:
+
+    python -m benchmarks.export_catalogue [--sizes 10000 100000 500000] [--format csv]
+
+For each catalogue size the books export is consumed through the
+/relationship/export/books.<fmt> view, block by block, the way a client
+would. Peak Python memory (tracemalloc) should stay flat as the
+catalogue grows.
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.utils import setup_django, temporary_database
+
+
+def grow_catalogue(target):
+    from relationship_app.importers import import_rows
+    from relationship_app.models import Book
+
+    start = Book.objects.count()
+    import_rows(
+        {'title': f"Book {i:08d}", 'author': f"Author {i % 5000:05d}"}
+        for i in range(start, target)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 500000])
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    with temporary_database(), override_settings(DEBUG=False):
+        client = Client()
+        client.force_login(User.objects.create_user('bench-export', password='pass12345'))
+        url = reverse('relationship_app:export_books', args=[args.format])
+
+        print(f"{'rows':>10} {'seconds':>8} {'rows/sec':>10} {'MB out':>8} {'peak KB':>8}")
+        for size in sorted(args.sizes):
+            grow_catalogue(size)
+            tracemalloc.start()
+            start = time.perf_counter()
+            response = client.get(url)
+            written = sum(len(block) for block in response.streaming_content)
+            response.close()
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{size:>10} {elapsed:>8.2f} {size / elapsed:>10,.0f} "
+                  f"{written / 1e6:>8.1f} {peak / 1024:>8.0f}")
+
+
+if __name__ == '__main__':
+    main()
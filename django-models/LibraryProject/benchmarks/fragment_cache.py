@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Rendered requests/sec for the catalogue pages with and without the
+template fragment cache:
+
+    python -m benchmarks.fragment_cache [--books 5000] [--requests 300]
+
+"uncached" runs with FRAGMENT_CACHE_TIMEOUT=0, which makes every
+{% cache %} block render from the database.
+"""
+import argparse
+import time
+
+from benchmarks.utils import setup_django, temporary_database
+
+
+def populate(books, libraries):
+    from relationship_app.models import Author, Book, Library
+
+    authors = Author.objects.bulk_create(Author(name=f"Author {i:04d}") for i in range(max(1, books // 10)))
+    Book.objects.bulk_create(
+        (Book(title=f"Book {i:06d}", author=authors[i % len(authors)]) for i in range(books)),
+        batch_size=5000,
+    )
+    book_ids = list(Book.objects.values_list('pk', flat=True))
+    per_library = min(len(book_ids), 200)
+    for i in range(libraries):
+        library = Library.objects.create(name=f"Branch {i:03d}")
+        start = (i * per_library) % len(book_ids)
+        library.books.add(*book_ids[start:start + per_library])
+
+
+def client_for(role):
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    user = User.objects.create_user(f"bench-{role.lower()}", password='pass12345')
+    user.profile.role = role
+    user.profile.save()
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def requests_per_second(client, url, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        response = client.get(url)
+        assert response.status_code == 200, (url, response.status_code)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--books', type=int, default=5000)
+    parser.add_argument('--libraries', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.cache import caches
+    from django.test import override_settings
+    from django.urls import reverse
+    from relationship_app.models import Library
+
+    with temporary_database():
+        populate(args.books, args.libraries)
+        member, librarian = client_for('Member'), client_for('Librarian')
+        library = Library.objects.first()
+        pages = [
+            ('list_books', member, reverse('relationship_app:list_books')),
+            ('library_detail', member, reverse('relationship_app:library_detail', args=[library.pk])),
+            ('member_view', member, reverse('relationship_app:member_view')),
+            ('librarian_view', librarian, reverse('relationship_app:librarian_view')),
+        ]
+
+        print(f"{'page':<16} {'uncached req/s':>15} {'cached req/s':>13} {'speedup':>8}")
+        for name, client, url in pages:
+            with override_settings(FRAGMENT_CACHE_TIMEOUT=0):
+                uncached = requests_per_second(client, url, args.requests)
+            caches['default'].clear()
+            client.get(url)  # warm the fragment
+            cached = requests_per_second(client, url, args.requests)
+            print(f"{name:<16} {uncached:>15.0f} {cached:>13.0f} {cached / uncached:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+WSGI vs ASGI throughput of the catalogue pages under many concurrent clients:
+
+    python -m benchmarks.load_test [--clients 64] [--duration 10] [--workers 2]
+
+Builds a throwaway SQLite database, then for each server:
+- serves the project with gunicorn, using gthread workers (WSGI, sync
+  views) or uvicorn workers (ASGI, async views);
+- hammers every page with ``--clients`` keep-alive connections for
+  ``--duration`` seconds;
+- reports requests/sec and latency percentiles.
+
+Both servers run the same number of worker processes.
+
+Requires gunicorn and uvicorn (``pip install gunicorn uvicorn``). Pass
+``--no-fragment-cache`` to make every request render from the database.
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.utils import percentile
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+PAGES = ['/relationship/books/', '/relationship/member/', '/relationship/library/1/']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare_database(env, books):
+    """Migrate and populate the database in a child process; return a session cookie"""
+    script = f"""
+import django
+django.setup()
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import Client
+from relationship_app.importers import import_rows
+from relationship_app.models import Library
+
+call_command('migrate', verbosity=0)
+import_rows(
+    {{'title': f'Book {{i:06d}}', 'author': f'Author {{i % 500:03d}}',
+      'libraries': ['Central Library'] if i % 10 == 0 else []}}
+    for i in range({books})
+)
+user = User.objects.create_user('load-test', password='pass12345')
+client = Client()
+client.force_login(user)
+print(client.cookies['sessionid'].value)
+"""
+    result = subprocess.run(
+        [sys.executable, '-c', script], env=env, cwd=PROJECT_DIR,
+        check=True, capture_output=True, text=True,
+    )
+    return result.stdout.strip().splitlines()[-1]
+
+
+def server_command(kind, port, workers, threads):
+    if kind == 'wsgi':
+        return [
+            sys.executable, '-m', 'gunicorn', 'LibraryProject.wsgi:application',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+            '--worker-class', 'gthread', '--threads', str(threads), '--log-level', 'warning',
+        ]
+    # gunicorn also supervises the ASGI workers: uvicorn's own --workers
+    # mode adds ~50ms to every keep-alive request here, even static pages
+    return [
+        sys.executable, '-m', 'gunicorn', 'LibraryProject.asgi:application',
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+        '--worker-class', 'uvicorn.workers.UvicornWorker', '--log-level', 'warning',
+    ]
+
+
+async def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f'Server on port {port} did not start')
+
+
+async def read_response(reader):
+    """Read one HTTP/1.1 response and return its status code"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Server closed the connection')
+    status = int(status_line.split()[1])
+    length = 0
+    chunked = False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+        elif name.lower() == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(length)
+    return status
+
+
+async def client_loop(port, cookie, deadline, latencies, errors, offset):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    index = offset
+    try:
+        while time.monotonic() < deadline:
+            path = PAGES[index % len(PAGES)]
+            index += 1
+            request = (
+                f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                f'Cookie: sessionid={cookie}\r\nConnection: keep-alive\r\n\r\n'
+            )
+            start = time.perf_counter()
+            writer.write(request.encode())
+            status = await read_response(reader)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors.append(status)
+    except (ConnectionError, asyncio.IncompleteReadError):
+        errors.append('disconnect')
+    finally:
+        writer.close()
+
+
+async def run_load(port, cookie, clients, duration):
+    await wait_for_port(port)
+    # Warm every worker's caches before measuring
+    warm_deadline = time.monotonic() + 1
+    await asyncio.gather(*(client_loop(port, cookie, warm_deadline, [], [], i) for i in range(clients)))
+    latencies, errors = [], []
+    start = time.monotonic()
+    await asyncio.gather(*(
+        client_loop(port, cookie, start + duration, latencies, errors, i) for i in range(clients)
+    ))
+    return len(latencies) / (time.monotonic() - start), latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='gthread threads per WSGI worker')
+    parser.add_argument('--books', type=int, default=5000)
+    parser.add_argument('--no-fragment-cache', action='store_true')
+    args = parser.parse_args()
+
+    missing = [name for name in ('gunicorn', 'uvicorn') if importlib.util.find_spec(name) is None]
+    if missing:
+        sys.exit(f"load_test needs {' and '.join(missing)}: pip install {' '.join(missing)}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'LibraryProject.settings',
+            'DJANGO_DB_PATH': os.path.join(directory, 'load.sqlite3'),
+            'DJANGO_CACHE_DIR': os.path.join(directory, 'cache'),
+        }
+        if args.no_fragment_cache:
+            env['DJANGO_FRAGMENT_CACHE_TIMEOUT'] = '0'
+        cookie = prepare_database(env, args.books)
+
+        print(f"{args.clients} clients, {args.workers} workers, {args.duration:.0f}s per server")
+        print(f"{'server':<6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for kind in ('wsgi', 'asgi'):
+            port = free_port()
+            server_env = {**env, 'DJANGO_ASYNC_VIEWS': '1' if kind == 'asgi' else '0'}
+            server = subprocess.Popen(
+                server_command(kind, port, args.workers, args.threads), env=server_env, cwd=PROJECT_DIR,
+            )
+            try:
+                rate, latencies, errors = asyncio.run(run_load(port, cookie, args.clients, args.duration))
+            finally:
+                server.terminate()
+                server.wait()
+            print(f"{kind:<6} {rate:>8.0f} {percentile(latencies, 50) * 1000:>8.1f} "
+                  f"{percentile(latencies, 99) * 1000:>8.1f} {len(errors):>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Login throughput with and without the legacy UserProfile double write.
+
+"legacy" reconnects the old ``save_user_profile`` behaviour (re-saving the
+profile on every User save, including the last_login update), "current"
+runs with the handlers shipped in relationship_app.models:
+
+    python -m benchmarks.login [--logins 2000]
+
+Passwords use the MD5 hasher so the numbers reflect database work rather
+than PBKDF2 cost.
+"""
+import argparse
+import time
+
+from benchmarks.utils import setup_django, temporary_database
+
+
+def legacy_save_user_profile(sender, instance, **kwargs):
+    """The handler this benchmark compares against: an unconditional profile UPDATE"""
+    from django.db import models
+    models.Model.save(instance.profile)
+
+
+def run(client, logins):
+    from django.db import connection
+
+    executed = 0
+
+    def count_queries(execute, sql, params, many, context):
+        nonlocal executed
+        executed += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_queries):
+        start = time.perf_counter()
+        for _ in range(logins):
+            client.login(username='reader', password='pass12345')
+        elapsed = time.perf_counter() - start
+    return logins / elapsed, executed / logins
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--logins', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db.models.signals import post_save
+    from django.test import Client, override_settings
+
+    with temporary_database(), override_settings(
+        PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    ):
+        User.objects.create_user('reader', password='pass12345')
+        client = Client()
+
+        post_save.connect(legacy_save_user_profile, sender=User)
+        try:
+            legacy_rate, legacy_queries = run(client, args.logins)
+        finally:
+            post_save.disconnect(legacy_save_user_profile, sender=User)
+        current_rate, current_queries = run(client, args.logins)
+
+        print(f"{'':>8} {'logins/sec':>11} {'queries/login':>14}")
+        print(f"{'legacy':>8} {legacy_rate:>11.0f} {legacy_queries:>14.1f}")
+        print(f"{'current':>8} {current_rate:>11.0f} {current_queries:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Keyset vs OFFSET pagination benchmark for the book listing.
+
+Loads enough books to reach page 10,000 and times fetching pages
+1, 10, 100, 1,000 and 10,000 both ways:
+
+    python -m benchmarks.pagination [--per-page 20] [--repeat 20]
+"""
+import argparse
+
+from benchmarks.utils import measure, setup_django, summarize, temporary_database
+
+PAGES = [1, 10, 100, 1000, 10000]
+
+
+def populate(total):
+    from relationship_app.models import Author, Book
+
+    authors = Author.objects.bulk_create(Author(name=f"Author {i:05d}") for i in range(1000))
+    batch = []
+    for i in range(total):
+        batch.append(Book(title=f"Book {i:07d}", author=authors[i % len(authors)]))
+        if len(batch) == 10000:
+            Book.objects.bulk_create(batch)
+            batch = []
+    Book.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from relationship_app.models import Book
+    from relationship_app.pagination import CursorPaginator
+
+    with temporary_database():
+        total = PAGES[-1] * args.per_page
+        print(f"Loading {total} books...")
+        populate(total)
+
+        queryset = Book.objects.select_related('author')
+        paginator = CursorPaginator(queryset, args.per_page)
+
+        print(f"\n{'page':>8} {'keyset median':>14} {'keyset p95':>11} {'offset median':>14} {'offset p95':>11}")
+        for number in PAGES:
+            # Build the cursor for this page outside the timed section
+            cursor = None
+            if number > 1:
+                boundary = queryset.order_by('title', 'id')[(number - 1) * args.per_page - 1]
+                cursor = paginator.encode_cursor('next', [boundary.title, boundary.id])
+
+            keyset = summarize(measure(lambda: list(paginator.page(cursor)), args.repeat))
+            start = (number - 1) * args.per_page
+            offset = summarize(measure(
+                lambda: list(queryset.order_by('title', 'id')[start:start + args.per_page]),
+                args.repeat,
+            ))
+            print(f"{number:>8} {keyset['median_ms']:>12.2f}ms {keyset['p95_ms']:>9.2f}ms "
+                  f"{offset['median_ms']:>12.2f}ms {offset['p95_ms']:>9.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Admin-style search latency, LIKE '%term%' against the FTS5 index:
+
+    python -m benchmarks.search [--books 200000] [--repeat 20]
+
+Each search counts the matches and fetches the first changelist page,
+which is what the admin does for a search term.
+"""
+import argparse
+
+from benchmarks.utils import measure, setup_django, summarize, temporary_database
+
+TERMS = ['adventure', 'author 0042', 'zebra']
+
+
+def populate(books):
+    from relationship_app.importers import import_rows
+
+    words = ['great', 'adventure', 'silent', 'river', 'winter', 'garden', 'empire', 'shadow']
+    import_rows(
+        {
+            'title': f"The {words[i % 8]} {words[(i // 8) % 8]} {i:07d}",
+            'author': f"Author {i % 5000:04d}",
+        }
+        for i in range(books)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--books', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.admin.sites import site
+    from django.db.models import Q
+    from relationship_app.models import Book
+    from relationship_app.search import BOOK_INDEX
+
+    with temporary_database():
+        populate(args.books)
+        admin = site._registry[Book]
+        queryset = Book.objects.select_related('author').order_by('title', 'id')
+
+        def like(term):
+            predicate = Q()
+            for word in term.split():
+                predicate &= Q(title__icontains=word) | Q(author__name__icontains=word)
+            return queryset.filter(predicate)
+
+        for term in TERMS:
+            for name, results in [
+                ('LIKE', lambda: like(term)),
+                ('FTS5', lambda: admin.get_search_results(None, queryset, term)[0]),
+            ]:
+                def run():
+                    qs = results()
+                    qs.count()
+                    list(qs[:100])
+                stats = summarize(measure(run, args.repeat))
+                print(f"{term!r:<14} {name:<5} {results().count():>7} matches  "
+                      f"median {stats['median_ms']:7.1f}ms  p95 {stats['p95_ms']:7.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Concurrent login-style writers and catalogue readers against SQLite,
+before and after the connection tuning in settings.DATABASES:
+
+    python -m benchmarks.sqlite_concurrency [--writers 8] [--readers 8] [--duration 5]
+
+Each configuration gets a fresh file database, then ``--writers`` plus
+``--readers`` worker processes hit it for ``--duration`` seconds.
+
+- A write is what a login does: in one atomic block, read the user,
+  update last_login and insert a session row.
+- A read loads a page of books with their authors.
+
+Every operation is wrapped in request_started/request_finished, so
+CONN_MAX_AGE decides whether a connection is reused. Failed operations
+("database is locked") are counted, not retried.
+
+Configurations:
+- default: Django's SQLite defaults, the settings before tuning
+  (rollback journal, synchronous=FULL, deferred transactions, 5s
+  sqlite3 timeout, a new connection per request);
+- wal: the tuned pragmas, with deferred transactions and no connection
+  reuse;
+- tuned: the settings defaults (WAL pragmas, IMMEDIATE transactions,
+  persistent connections).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.utils import percentile
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+CONFIGS = {
+    'default': {
+        'DJANGO_SQLITE_JOURNAL_MODE': 'delete',
+        'DJANGO_SQLITE_SYNCHRONOUS': 'full',
+        'DJANGO_SQLITE_BUSY_TIMEOUT_MS': '5000',
+        'DJANGO_SQLITE_MMAP_SIZE': '0',
+        'DJANGO_SQLITE_CACHE_SIZE': '-2000',
+        'DJANGO_SQLITE_TRANSACTION_MODE': '',
+        'DJANGO_CONN_MAX_AGE': '0',
+    },
+    'wal': {
+        'DJANGO_SQLITE_TRANSACTION_MODE': '',
+        'DJANGO_CONN_MAX_AGE': '0',
+    },
+    'tuned': {},
+}
+
+
+def prepare(env, users, books):
+    script = f"""
+import django
+django.setup()
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from relationship_app.importers import import_rows
+
+call_command('migrate', verbosity=0)
+User.objects.bulk_create(User(username=f'user{{i}}') for i in range({users}))
+import_rows({{'title': f'Book {{i:06d}}', 'author': f'Author {{i % 500:03d}}'}} for i in range({books}))
+"""
+    subprocess.run([sys.executable, '-c', script], env=env, cwd=PROJECT_DIR, check=True)
+
+
+def worker(kind, start_at, duration, users, seed):
+    """Run one worker process's operations and print its results as JSON"""
+    from benchmarks.utils import setup_django
+
+    setup_django()
+    import random
+    import uuid
+    from datetime import timedelta
+
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.models import Session
+    from django.core.signals import request_finished, request_started
+    from django.db import OperationalError, transaction
+    from django.utils import timezone
+
+    from relationship_app.models import Book
+
+    rng = random.Random(seed)
+
+    def write():
+        with transaction.atomic():
+            user = User.objects.get(pk=rng.randint(1, users))
+            user.last_login = timezone.now()
+            user.save(update_fields=['last_login'])
+            Session.objects.create(
+                session_key=uuid.uuid4().hex, session_data='x',
+                expire_date=timezone.now() + timedelta(days=14),
+            )
+
+    def read():
+        list(Book.objects.select_related('author').order_by('title', 'id')[:50])
+
+    operation = write if kind == 'write' else read
+    latencies, errors = [], 0
+    time.sleep(max(0, start_at - time.time()))
+    deadline = start_at + duration
+    while time.time() < deadline:
+        request_started.send(sender=None)
+        start = time.perf_counter()
+        try:
+            operation()
+            latencies.append(time.perf_counter() - start)
+        except OperationalError:
+            errors += 1
+        finally:
+            request_finished.send(sender=None)
+    print(json.dumps({'latencies': latencies, 'errors': errors}))
+
+
+def run_config(name, overrides, args, directory):
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'LibraryProject.settings',
+        'DJANGO_DB_PATH': os.path.join(directory, f'{name}.sqlite3'),
+        'DJANGO_CACHE_DIR': os.path.join(directory, f'{name}-cache'),
+        **overrides,
+    }
+    prepare(env, args.users, args.books)
+    start_at = time.time() + 3  # after every worker has set Django up
+    workers = [
+        (kind, subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.sqlite_concurrency', '--worker', kind,
+             '--start-at', str(start_at), '--duration', str(args.duration),
+             '--users', str(args.users), '--seed', str(index)],
+            env=env, cwd=PROJECT_DIR, stdout=subprocess.PIPE, text=True,
+        ))
+        for index, kind in enumerate(['write'] * args.writers + ['read'] * args.readers)
+    ]
+    results = {'write': {'latencies': [], 'errors': 0}, 'read': {'latencies': [], 'errors': 0}}
+    for kind, process in workers:
+        output, _ = process.communicate()
+        result = json.loads(output.strip().splitlines()[-1])
+        results[kind]['latencies'] += result['latencies']
+        results[kind]['errors'] += result['errors']
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--configs', default=','.join(CONFIGS))
+    parser.add_argument('--worker', choices=['write', 'read'], help=argparse.SUPPRESS)
+    parser.add_argument('--start-at', type=float, help=argparse.SUPPRESS)
+    parser.add_argument('--seed', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.start_at, args.duration, args.users, args.seed)
+        return
+
+    print(f"{args.writers} writers, {args.readers} readers, {args.duration:.0f}s per configuration")
+    print(f"{'config':<8} {'writes/s':>9} {'w p99 ms':>9} {'w errors':>9} {'reads/s':>9} {'r p99 ms':>9} {'r errors':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name in args.configs.split(','):
+            results = run_config(name, CONFIGS[name], args, directory)
+            row = [name]
+            for kind in ('write', 'read'):
+                latencies = results[kind]['latencies']
+                p99 = percentile(latencies, 99) * 1000 if latencies else float('nan')
+                row += [f"{len(latencies) / args.duration:>9.0f}", f"{p99:>9.1f}", f"{results[kind]['errors']:>9}"]
+            print(f"{row[0]:<8} {' '.join(row[1:])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Benchmark every relationship_app URL at several catalogue sizes, as JSON:
+
+    python -m benchmarks.suite [--sizes 1k,100k,1m] [--requests 30] [--output results.json]
+    python -m benchmarks.suite --compare before.json after.json
+
+One throwaway SQLite database is grown through the requested sizes with
+a synthetic catalogue (20 books per author, every tenth book in one of
+100 libraries). At each size, every pattern in relationship_app.urls is
+requested, as the role it needs:
+
+- through the test client, recording latency percentiles, the queries
+  of the first (cold) and of a warm request, and the peak Python memory
+  of one request (tracemalloc);
+- through a real local server (gunicorn if installed, otherwise
+  runserver), over one keep-alive connection, recording latency
+  percentiles and the peak RSS of the server process.
+
+Results are written with the commit, Python, Django and SQLite versions.
+``--compare`` prints the p50 change of every endpoint between two result
+files, so runs can be compared between commits. A URL pattern the suite
+does not know how to request fails the run instead of being skipped.
+"""
+import argparse
+import asyncio
+import http.client
+import importlib.util
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.load_test import free_port, server_command, wait_for_port
+from benchmarks.utils import percentile, setup_django
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+SIZES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+WORDS = ['great', 'adventure', 'silent', 'river', 'winter', 'garden', 'empire', 'shadow', 'night', 'sea']
+
+# Requests made as a given role; every other URL is requested as a Member
+ROLES = {'admin_view': 'Admin', 'librarian_view': 'Librarian'}
+ANONYMOUS = {'login', 'register', 'logout'}
+QUERY_STRINGS = {'search': 'q=silent+river', 'autocomplete': 'q=gar'}
+# Full-catalogue exports are repeated fewer times
+HEAVY_PREFIX = 'export_'
+
+
+def catalogue_rows(start, stop):
+    """Deterministic synthetic catalogue rows ``start``..``stop``"""
+    for i in range(start, stop):
+        yield {
+            'title': f"{WORDS[i % 10].title()} {WORDS[(i // 10) % 10]} {i:07d}",
+            'author': f"Author {i // 20:06d}",
+            'libraries': [f"Branch {i % 100:02d}"] if i % 10 == 0 else [],
+        }
+
+
+def populate(start, stop):
+    """Import catalogue rows ``start``..``stop`` and staff every new library"""
+    from relationship_app.caching import bump_model_version
+    from relationship_app.importers import import_rows
+    from relationship_app.models import Librarian, Library
+
+    import_rows(catalogue_rows(start, stop))
+    unstaffed = Library.objects.filter(librarian__isnull=True)
+    Librarian.objects.bulk_create(
+        Librarian(name=f"Librarian of {library.name}", library=library) for library in unstaffed
+    )
+    bump_model_version(Librarian)
+
+
+def sample_values(name):
+    """Values for the URL parameters of pattern ``name``"""
+    from relationship_app import api
+    from relationship_app.models import Library
+
+    model = Library
+    if name.startswith('api_') and name.endswith('_detail'):
+        model = api.RESOURCES[name[len('api_'):-len('_detail')]].model
+    return {'pk': model.objects.order_by('pk').values_list('pk', flat=True).first(), 'fmt': 'csv'}
+
+
+def endpoints():
+    """``(name, role, url)`` for every pattern in relationship_app.urls"""
+    from django.urls import reverse
+    from relationship_app import urls
+
+    result = []
+    for pattern in urls.urlpatterns:
+        name = pattern.name
+        values = sample_values(name)
+        params = pattern.pattern.converters
+        missing = [param for param in params if param not in values]
+        if missing:
+            raise SystemExit(f"benchmarks.suite cannot request {name!r}: no sample value for {missing}")
+        url = reverse(f'{urls.app_name}:{name}', kwargs={param: values[param] for param in params})
+        if name in QUERY_STRINGS:
+            url = f'{url}?{QUERY_STRINGS[name]}'
+        role = None if name in ANONYMOUS else ROLES.get(name, 'Member')
+        result.append((name, role, url))
+    return result
+
+
+def repeats(name, requests):
+    return max(3, requests // 10) if name.startswith(HEAVY_PREFIX) else requests
+
+
+def consume(response):
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return response
+
+
+def latency_stats(samples):
+    return {
+        'requests': len(samples),
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'max_ms': max(samples) * 1000,
+    }
+
+
+class QueryCounter:
+    """connection.execute_wrapper() that counts queries; unlike
+    CaptureQueriesContext it survives the reset_queries() of each request"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def count_queries(func):
+    from django.db import connection
+
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        result = func()
+    return result, counter.count
+
+
+def run_client(clients, requests):
+    """Latency, query counts and peak memory of every endpoint through the test client"""
+    results = {}
+    for name, role, url in endpoints():
+        client = clients[role]
+        start = time.perf_counter()
+        response, cold_queries = count_queries(lambda: consume(client.get(url)))
+        cold_ms = (time.perf_counter() - start) * 1000
+        status = response.status_code
+        if status >= 400:
+            raise SystemExit(f"{name}: {url} returned {status}")
+        _, warm_queries = count_queries(lambda: consume(client.get(url)))
+        tracemalloc.start()
+        consume(client.get(url))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        samples = []
+        for _ in range(repeats(name, requests)):
+            start = time.perf_counter()
+            consume(client.get(url))
+            samples.append(time.perf_counter() - start)
+        results[name] = {
+            'url': url,
+            'status': status,
+            'cold_ms': cold_ms,
+            'cold_queries': cold_queries,
+            'queries': warm_queries,
+            'peak_memory_kb': peak // 1024,
+            **latency_stats(samples),
+        }
+    return results
+
+
+def peak_rss_kb(pid):
+    """Peak resident set size of ``pid`` and its children (Linux only)"""
+    total = 0
+    pids = [pid]
+    children = Path(f'/proc/{pid}/task/{pid}/children')
+    if children.exists():
+        pids += [int(child) for child in children.read_text().split()]
+    for process in pids:
+        status = Path(f'/proc/{process}/status')
+        if status.exists():
+            for line in status.read_text().splitlines():
+                if line.startswith('VmHWM:'):
+                    total += int(line.split()[1])
+    return total or None
+
+
+def start_server(env):
+    port = free_port()
+    if importlib.util.find_spec('gunicorn'):
+        name, command = 'gunicorn', server_command('wsgi', port, workers=1, threads=1)
+    else:
+        name = 'runserver'
+        command = [sys.executable, 'manage.py', 'runserver', '--noreload', '--nothreading', f'127.0.0.1:{port}']
+    server = subprocess.Popen(command, env=env, cwd=PROJECT_DIR, stdout=subprocess.DEVNULL)
+    asyncio.run(wait_for_port(port))
+    return server, port, name
+
+
+def request(connection, url, cookie):
+    headers = {'Cookie': f'sessionid={cookie}'} if cookie else {}
+    connection.request('GET', url, headers=headers)
+    response = connection.getresponse()
+    response.read()
+    if response.status >= 400:
+        raise SystemExit(f"{url} returned {response.status} from the server")
+
+
+def run_server(env, cookies, requests):
+    """Latency of every endpoint through a real local server"""
+    server, port, server_name = start_server(env)
+    results = {}
+    try:
+        for name, role, url in endpoints():
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+            request(connection, url, cookies[role])
+            samples = []
+            for _ in range(repeats(name, requests)):
+                start = time.perf_counter()
+                request(connection, url, cookies[role])
+                samples.append(time.perf_counter() - start)
+            connection.close()
+            results[name] = {'url': url, **latency_stats(samples)}
+        results['_server'] = {'name': server_name, 'peak_rss_kb': peak_rss_kb(server.pid)}
+    finally:
+        server.terminate()
+        server.wait()
+    return results
+
+
+def metadata(requests):
+    import django
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=PROJECT_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'requests': requests,
+    }
+
+
+def print_table(size, mode, results):
+    print(f"\n{size} books, {mode}")
+    print(f"{'endpoint':<24} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'peak KB':>8}")
+    for name, row in results.items():
+        if name.startswith('_'):
+            continue
+        print(f"{name:<24} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f} "
+              f"{row.get('queries', ''):>8} {row.get('peak_memory_kb', ''):>8}")
+
+
+def compare(before_path, after_path):
+    """Print the p50 change of every endpoint present in both result files"""
+    before, after = (json.loads(Path(path).read_text()) for path in (before_path, after_path))
+    print(f"{before['meta']['commit'] or before_path} -> {after['meta']['commit'] or after_path}")
+    print(f"{'size':<5} {'mode':<7} {'endpoint':<24} {'before':>9} {'after':>9} {'change':>8}")
+    for size, modes in after['sizes'].items():
+        for mode in ('client', 'server'):
+            for name, row in modes.get(mode, {}).items():
+                old = before['sizes'].get(size, {}).get(mode, {}).get(name)
+                if name.startswith('_') or old is None:
+                    continue
+                change = (row['p50_ms'] / old['p50_ms'] - 1) * 100 if old['p50_ms'] else 0.0
+                print(f"{size:<5} {mode:<7} {name:<24} {old['p50_ms']:>8.2f}ms {row['p50_ms']:>7.2f}ms "
+                      f"{change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default=','.join(SIZES), help=f"comma-separated, from {', '.join(SIZES)}")
+    parser.add_argument('--requests', type=int, default=30, help='timed requests per endpoint')
+    parser.add_argument('--output', default='benchmark-results.json')
+    parser.add_argument('--no-server', action='store_true', help='only use the test client')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    sizes = args.sizes.split(',')
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes {unknown}, choose from {', '.join(SIZES)}")
+    sizes.sort(key=SIZES.get)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Set before Django reads the settings, so the server sees the same files
+        os.environ['DJANGO_DB_PATH'] = os.path.join(directory, 'suite.sqlite3')
+        os.environ['DJANGO_CACHE_DIR'] = os.path.join(directory, 'cache')
+        os.environ['DJANGO_ASYNC_VIEWS'] = '0'
+        setup_django()
+        from django.core.management import call_command
+        from django.test import Client, override_settings
+
+        from benchmarks.fragment_cache import client_for
+
+        call_command('migrate', verbosity=0)
+        clients = {role: client_for(role) for role in ('Admin', 'Librarian', 'Member')}
+        clients[None] = Client()
+        cookies = {role: client.cookies['sessionid'].value for role, client in clients.items() if role}
+        cookies[None] = None
+
+        report = {'meta': metadata(args.requests), 'sizes': {}}
+        loaded = 0
+        for size in sizes:
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+                start = time.perf_counter()
+                populate(loaded, SIZES[size])
+                loaded = SIZES[size]
+                results = {'books': loaded, 'populate_s': time.perf_counter() - start}
+                results['client'] = run_client(clients, args.requests)
+            print_table(size, 'test client', results['client'])
+            if not args.no_server:
+                results['server'] = run_server(dict(os.environ), cookies, args.requests)
+                print_table(size, f"server ({results['server']['_server']['name']})", results['server'])
+            report['sizes'][size] = results
+            Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == '__main__':
+    main()
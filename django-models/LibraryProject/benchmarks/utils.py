@@ -0,0 +1,56 @@
+"""
+Shared helpers for the benchmark scripts
+"""
+import os
+import statistics
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup_django():
+    """Configure Django the same way manage.py does"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LibraryProject.settings')
+    django.setup()
+
+
+@contextmanager
+def temporary_database(verbosity=0):
+    """Create a fresh test database for the duration of the block"""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        teardown_test_environment()
+
+
+def measure(func, repeat=20):
+    """Call func() ``repeat`` times and return the durations in seconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples):
+    """Median/p95 of a list of durations, in milliseconds"""
+    return {
+        'median_ms': statistics.median(samples) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+    }
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+First requests after a deploy, with and without ``manage.py warm_caches``:
+
+    python -m benchmarks.warm_caches [--books 20000] [--libraries 100] [--threads 4]
+
+Every library detail page and the first ``--pages`` book list pages are
+requested once, as the first requests a freshly started worker serves:
+- cold: both cache tiers empty;
+- warmed: after warm() on 1 and on ``--threads`` threads, with the
+  per-process tier emptied, as in a worker other than the one that
+  warmed the cache.
+"""
+import argparse
+import time
+
+from benchmarks.fragment_cache import client_for, populate
+from benchmarks.utils import setup_django, summarize, temporary_database
+
+
+def report(name, samples, warm_up='', hit_ratio=''):
+    timings = summarize(samples)
+    print(f"{name:<22} {warm_up:>9} {hit_ratio:>10} {timings['median_ms']:>9.2f}ms {timings['p95_ms']:>9.2f}ms "
+          f"{sum(samples):>7.2f}s")
+
+
+def first_requests(client, urls):
+    samples = []
+    for url in urls:
+        start = time.perf_counter()
+        response = client.get(url)
+        samples.append(time.perf_counter() - start)
+        assert response.status_code == 200, (url, response.status_code)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--libraries', type=int, default=100)
+    parser.add_argument('--pages', type=int, default=10)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.cache import caches
+    from django.test import override_settings
+    from django.urls import reverse
+
+    from relationship_app.models import Book, Library
+    from relationship_app.pagination import CursorPaginator
+    from relationship_app.views import BOOKS_PER_PAGE
+    from relationship_app.warming import warm, warming_plan
+
+    def clear():
+        for alias in ('default', 'shared'):
+            caches[alias].clear()
+
+    with temporary_database(), override_settings(DEBUG=False):
+        populate(args.books, args.libraries)
+        client = client_for('Member')
+        cursors = [None, *CursorPaginator(Book.objects.all(), BOOKS_PER_PAGE).cursors(args.pages)]
+        list_url = reverse('relationship_app:list_books')
+        urls = [f'{list_url}?cursor={cursor}' if cursor else list_url for cursor in cursors]
+        urls += [reverse('relationship_app:library_detail', args=[pk]) for pk in Library.objects.values_list('pk', flat=True)]
+
+        print(f"{len(urls)} pages, {args.books:,} books in {args.libraries} libraries")
+        print(f"{'':<22} {'warm-up':>9} {'hit ratio':>10} {'median':>11} {'p95':>11} {'total':>8}")
+        clear()
+        report('cold', first_requests(client, urls))
+        for threads in sorted({1, args.threads}):
+            clear()
+            stats = warm(warming_plan(args.libraries, args.pages), threads)
+            caches['default'].clear()
+            report(f'warmed, {threads} threads', first_requests(client, urls),
+                   f'{stats.elapsed:.2f}s', f'{stats.hit_ratio:.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,3 +4,16 @@ from django.apps import AppConfig
 class BookshelfConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bookshelf'
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
+
+    def hot_queries(self):
+        """The shelf's lookups, for relationship_app's explain_hot_queries"""
+        from .models import Book
+
+        return [
+            ('Bookshelf list', Book.objects.order_by('title')[:25], False),
+            ('Bookshelf by author', Book.objects.filter(author='George Orwell').order_by('title')[:25], False),
+            ('Bookshelf by year', Book.objects.filter(publication_year=1949).order_by('title')[:25], False),
+        ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:10
+
+from django.db import migrations
+
+# The FTS5 table keeps its own copy of title and author, keyed by the
+# book id, and triggers keep it in step with every write path.
+FORWARD = [
+    "CREATE VIRTUAL TABLE bookshelf_book_fts USING fts5("
+    "title, author, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO bookshelf_book_fts(rowid, title, author) SELECT id, title, author FROM bookshelf_book",
+    """CREATE TRIGGER bookshelf_book_fts_insert AFTER INSERT ON bookshelf_book BEGIN
+        INSERT INTO bookshelf_book_fts(rowid, title, author) VALUES (new.id, new.title, new.author);
+    END""",
+    """CREATE TRIGGER bookshelf_book_fts_update AFTER UPDATE OF title, author ON bookshelf_book BEGIN
+        UPDATE bookshelf_book_fts SET title = new.title, author = new.author WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER bookshelf_book_fts_delete AFTER DELETE ON bookshelf_book BEGIN
+        DELETE FROM bookshelf_book_fts WHERE rowid = old.id;
+    END""",
+]
+
+BACKWARD = [
+    'DROP TRIGGER IF EXISTS bookshelf_book_fts_delete',
+    'DROP TRIGGER IF EXISTS bookshelf_book_fts_update',
+    'DROP TRIGGER IF EXISTS bookshelf_book_fts_insert',
+    'DROP TABLE IF EXISTS bookshelf_book_fts',
+]
+
+
+def run_sqlite(statements):
+    def operation(apps, schema_editor):
+        # FTS5 is SQLite-only; other backends fall back to LIKE search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookshelf', '0002_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(FORWARD), run_sqlite(BACKWARD)),
+    ]
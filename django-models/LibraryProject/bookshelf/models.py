@@ -1,12 +1,36 @@
 from django.db import models
+from django.db.models import F, Value
+from django.utils import timezone
+
+
+class BookQuerySet(models.QuerySet):
+    def with_age(self, year=None):
+        """
+        Annotate ``age`` (years since publication, as of ``year``, default
+        this year) and ``decade`` (e.g. 1990), computed by the database
+        """
+        year = year or timezone.now().year
+        return self.annotate(
+            age=Value(year) - F('publication_year'),
+            decade=F('publication_year') / 10 * 10,
+        )
+
 
 class Book(models.Model):
     title = models.CharField(max_length=200)
     author = models.CharField(max_length=100)
     publication_year = models.IntegerField()
+
+    objects = BookQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.title} by {self.author} ({self.publication_year})"
     
     class Meta:
-        ordering = ['title']
\ No newline at end of file
+        ordering = ['title']
+        indexes = [
+            models.Index(fields=['title'], name='bookshelf_title_idx'),
+            # Admin list_filter on author / publication_year, ordered by title
+            models.Index(fields=['author', 'title'], name='bookshelf_author_title_idx'),
+            models.Index(fields=['publication_year', 'title'], name='bookshelf_year_title_idx'),
+        ]
\ No newline at end of file
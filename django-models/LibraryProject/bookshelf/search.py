@@ -0,0 +1,4 @@
+"""The shelf's FTS5 index (bookshelf 0003), searched by the admin changelist"""
+from relationship_app.search import FullTextIndex
+
+SHELF_INDEX = FullTextIndex('bookshelf_book_fts', weights=(2.0, 1.0), fallback_fields=('title', 'author'))
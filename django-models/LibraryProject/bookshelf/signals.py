@@ -0,0 +1,17 @@
+"""
+Signal handlers that keep the shelf's cache version in step with the
+database. Connected in BookshelfConfig.ready().
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from relationship_app.caching import bump_model_version
+
+from .models import Book
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def shelf_changed(sender, **kwargs):
+    """Invalidate the cached changelist filters and counts of the shelf"""
+    bump_model_version(sender)
@@ -0,0 +1,24 @@
+"""
+The shelf's bulk admin actions as relationship_app.jobs tasks, queued
+for large selections by relationship_app.changelist.run_or_enqueue().
+"""
+from relationship_app import bulk
+from relationship_app.caching import bump_model_version
+from relationship_app.jobs import task
+from relationship_app.tasks import HIGH
+
+from .models import Book
+
+
+@task(priority=HIGH)
+def update_shelf_books(books, **values):
+    updated = bulk.update_rows(bulk.selection(Book, books), **values)
+    bump_model_version(Book)
+    return updated
+
+
+@task(priority=HIGH)
+def delete_shelf_books(books):
+    deleted = bulk.delete_rows(bulk.selection(Book, books))
+    bump_model_version(Book)
+    return deleted
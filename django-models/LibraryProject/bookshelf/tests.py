@@ -1,3 +1,129 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from relationship_app import bulk, jobs
+from relationship_app.models import Job
+from relationship_app.tests import clear_caches
+
+from .models import Book
+
+
+class BookAdminTests(TestCase):
+    """The bookshelf changelist stays cheap as the shelf grows"""
+
+    def setUp(self):
+        clear_caches()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass12345'))
+
+    def test_changelist_query_count(self):
+        """session + user, the capped count and the page; the filters are cached"""
+        url = reverse('admin:bookshelf_book_changelist')
+        for count in (3, 40):
+            Book.objects.bulk_create(
+                Book(title=f'Book {i:03d}', author=f'Author {i % 7}', publication_year=1990 + i % 5)
+                for i in range(Book.objects.count(), count)
+            )
+            self.assertEqual(self.client.get(url).status_code, 200)
+            with self.assertNumQueries(4):
+                self.client.get(url)
+        # The choices are cached for FILTER_CACHE_TIMEOUT; recompute them
+        clear_caches()
+        author, year = self.client.get(url).context['cl'].filter_specs
+        self.assertEqual(list(author.lookup_choices), [f'Author {i}' for i in range(7)])
+        self.assertEqual(year.buckets, [(1990, 40)])
+
+    def test_age_and_decade_are_annotations(self):
+        Book.objects.create(title='Dune', author='Frank Herbert', publication_year=1965)
+        book = Book.objects.with_age(year=2025).get()
+        self.assertEqual((book.age, book.decade), (60, 1960))
+        response = self.client.get(reverse('admin:bookshelf_book_changelist'))
+        self.assertContains(response, '<td class="field-get_decade">1960s</td>', html=True)
+
+    def test_year_range_filter(self):
+        """Decade buckets and free ranges filter on the year index; the page costs the same queries"""
+        Book.objects.bulk_create(
+            Book(title=f'Book {i:03d}', author=f'Author {i % 3}', publication_year=1985 + i) for i in range(30)
+        )
+        url = reverse('admin:bookshelf_book_changelist')
+        response = self.client.get(url)
+        author, year = response.context['cl'].filter_specs
+        self.assertEqual(year.buckets, [(1980, 5), (1990, 10), (2000, 10), (2010, 5)])
+        self.assertContains(response, '1990–1999 (10)')
+        self.assertContains(response, 'Author 1 (10)')
+
+        with self.assertNumQueries(4):
+            response = self.client.get(url, {'publication_year__gte': 1990, 'publication_year__lte': 1999})
+        self.assertEqual(response.context['cl'].result_count, 10)
+        # A bound left empty in the form is ignored
+        response = self.client.get(url, {'publication_year__gte': 2010, 'publication_year__lte': ''})
+        self.assertEqual(response.context['cl'].result_count, 5)
+        # Oldest first when sorted by age, descending
+        response = self.client.get(url, {'o': '-4'})
+        self.assertEqual(response.context['cl'].result_list[0].publication_year, 1985)
+
+    def test_bulk_actions(self):
+        """Reassign, set year and delete run as chunked UPDATE/DELETE statements"""
+        Book.objects.bulk_create(
+            Book(title=f'Book {i:03d}', author='Someone', publication_year=2000) for i in range(25)
+        )
+        url = reverse('admin:bookshelf_book_changelist')
+        choices = self.client.get(url).context['action_form'].fields['action'].choices
+        self.assertNotIn('delete_selected', [name for name, _ in choices])
+        selected = {'_selected_action': list(Book.objects.values_list('pk', flat=True)[:12])}
+
+        with mock.patch.object(bulk, 'BULK_CHUNK_SIZE', 5), CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {**selected, 'action': 'set_publication_year', 'publication_year': 1999})
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE "bookshelf_book"')]), 3)
+        self.assertEqual(Book.objects.filter(publication_year=1999).count(), 12)
+        # The cached filter choices were invalidated
+        year = self.client.get(url).context['cl'].filter_specs[1]
+        self.assertEqual(year.buckets, [(1990, 12), (2000, 13)])
+
+        self.client.post(url, {**selected, 'action': 'reassign_author', 'author': 'Someone Else'})
+        self.assertEqual(Book.objects.filter(author='Someone Else').count(), 12)
+
+        response = self.client.post(url, {**selected, 'action': 'set_publication_year'}, follow=True)
+        self.assertContains(response, 'Year: This field is required.')
+        response = self.client.post(url, {**selected, 'action': 'set_publication_year', 'publication_year': 'abc'}, follow=True)
+        self.assertContains(response, 'Year: Enter a whole number.')
+        self.assertNotContains(response, 'No action selected.')
+        self.client.post(url, {**selected, 'action': 'delete_books', 'confirm': 'on'})
+        self.assertEqual(Book.objects.count(), 13)
+
+    def test_admin_search_uses_fts(self):
+        """Changelist searches query bookshelf_book_fts instead of LIKE"""
+        Book.objects.create(title='Animal Farm', author='George Orwell', publication_year=1945)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:bookshelf_book_changelist'), {'q': 'animal'})
+        self.assertContains(response, 'Animal Farm')
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertIn('bookshelf_book_fts', sql)
+        self.assertNotIn('LIKE', sql)
+
+    def test_saves_invalidate_cached_filters(self):
+        """bookshelf.signals bumps the shelf's cache version on every save and delete"""
+        url = reverse('admin:bookshelf_book_changelist')
+        book = Book.objects.create(title='Dune', author='Frank Herbert', publication_year=1965)
+        self.assertContains(self.client.get(url), 'Frank Herbert (1)')
+        book.author = 'F. Herbert'
+        book.save()
+        self.assertContains(self.client.get(url), 'F. Herbert (1)')
+        book.delete()
+        self.assertNotContains(self.client.get(url), 'F. Herbert (1)')
+
+    @override_settings(BULK_BACKGROUND_THRESHOLD=2)
+    def test_large_selections_become_jobs(self):
+        """The shelf's bulk tasks are registered by bookshelf.tasks"""
+        Book.objects.bulk_create(Book(title=f'Book {i}', author='Someone', publication_year=2000) for i in range(3))
+        self.client.post(reverse('admin:bookshelf_book_changelist'), {
+            '_selected_action': list(Book.objects.values_list('pk', flat=True)),
+            'action': 'set_publication_year', 'publication_year': 1999,
+        })
+        self.assertEqual(Job.objects.get().task, 'bookshelf.tasks.update_shelf_books')
+        jobs.work(burst=True)
+        self.assertEqual(Book.objects.filter(publication_year=1999).count(), 3)
@@ -9,30 +9,22 @@ import django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'LibraryProject.settings')
 django.setup()
 
+from relationship_app.importers import import_rows
 from relationship_app.models import Author, Book, Library, Librarian
 
 def create_sample_data():
     """Create sample authors, books, libraries, and librarians"""
     
-    # Create authors
-    author1 = Author.objects.create(name="J.K. Rowling")
-    author2 = Author.objects.create(name="George R.R. Martin")
-    author3 = Author.objects.create(name="J.R.R. Tolkien")
-    
-    # Create books
-    book1 = Book.objects.create(title="Harry Potter and the Philosopher's Stone", author=author1)
-    book2 = Book.objects.create(title="Harry Potter and the Chamber of Secrets", author=author1)
-    book3 = Book.objects.create(title="A Game of Thrones", author=author2)
-    book4 = Book.objects.create(title="The Lord of the Rings", author=author3)
-    book5 = Book.objects.create(title="The Hobbit", author=author3)
-    
-    # Create libraries
-    library1 = Library.objects.create(name="Central Library")
-    library2 = Library.objects.create(name="University Library")
-    
-    # Add books to libraries
-    library1.books.add(book1, book2, book3)
-    library2.books.add(book3, book4, book5)
+    # Authors, books and library memberships go through the bulk importer
+    import_rows([
+        {'title': "Harry Potter and the Philosopher's Stone", 'author': "J.K. Rowling", 'libraries': ["Central Library"]},
+        {'title': "Harry Potter and the Chamber of Secrets", 'author': "J.K. Rowling", 'libraries': ["Central Library"]},
+        {'title': "A Game of Thrones", 'author': "George R.R. Martin", 'libraries': ["Central Library", "University Library"]},
+        {'title': "The Lord of the Rings", 'author': "J.R.R. Tolkien", 'libraries': ["University Library"]},
+        {'title': "The Hobbit", 'author': "J.R.R. Tolkien", 'libraries': ["University Library"]},
+    ])
+    library1 = Library.objects.get(name="Central Library")
+    library2 = Library.objects.get(name="University Library")
     
     # Create librarians
     librarian1 = Librarian.objects.create(name="Sarah Johnson", library=library1)
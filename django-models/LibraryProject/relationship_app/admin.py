@@ -1,23 +1,102 @@
+from django import forms
 from django.contrib import admin
-from .models import Author, Book, Library, Librarian
+from django.contrib.admin.helpers import ActionForm
+from django.utils import timezone
+from .models import Author, Book, Job, Library, Librarian
+from . import tasks
+from .changelist import (
+    ActionArgumentsMixin, LargeChangelistMixin, TopRelatedFieldListFilter, action_argument, run_or_enqueue,
+)
+from .search import AUTHOR_INDEX, BOOK_INDEX, FullTextSearchMixin
 
 @admin.register(Author)
-class AuthorAdmin(admin.ModelAdmin):
-    list_display = ('name',)
+class AuthorAdmin(LargeChangelistMixin, FullTextSearchMixin, admin.ModelAdmin):
+    list_display = ('name', 'book_count')
     search_fields = ('name',)
+    search_index = AUTHOR_INDEX
+
+class BookActionForm(ActionForm):
+    """Action bar with the arguments of the bulk actions"""
+    author = forms.ModelChoiceField(
+        Author.objects.all(), required=False, label='Author id',
+        widget=forms.TextInput(attrs={'size': 8, 'placeholder': 'Author id'}),
+    )
+    library = forms.ModelChoiceField(
+        Library.objects.all(), required=False, label='Library id',
+        widget=forms.TextInput(attrs={'size': 8, 'placeholder': 'Library id'}),
+    )
+    confirm = forms.BooleanField(required=False, label='Confirm delete')
 
 @admin.register(Book)
-class BookAdmin(admin.ModelAdmin):
+class BookAdmin(ActionArgumentsMixin, LargeChangelistMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'author')
-    list_filter = ('author',)
+    list_select_related = ('author',)
+    # The most prolific authors; the rest are found through the search box
+    list_filter = (('author', TopRelatedFieldListFilter),)
     search_fields = ('title', 'author__name')
+    search_index = BOOK_INDEX
+    autocomplete_fields = ('author',)
+    # Set-based, chunked SQL in bulk.py, no object is loaded or saved;
+    # large selections run as background jobs
+    action_form = BookActionForm
+    actions = ('reassign_author', 'add_to_library', 'remove_from_library', 'delete_books')
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # delete_selected loads and lists every object; delete_books replaces it
+        actions.pop('delete_selected', None)
+        return actions
+
+    @admin.action(description='Reassign selected books to author id', permissions=['change'])
+    def reassign_author(self, request, queryset):
+        author = action_argument(self, request, 'author')
+        if author is not None:
+            run_or_enqueue(self, request, queryset, tasks.reassign_books, author, done=f'reassigned to {author}')
+
+    @admin.action(description='Add selected books to library id', permissions=['change'])
+    def add_to_library(self, request, queryset):
+        library = action_argument(self, request, 'library')
+        if library is not None:
+            run_or_enqueue(self, request, queryset, tasks.add_books_to_library, library, done=f'added to {library}')
+
+    @admin.action(description='Remove selected books from library id', permissions=['change'])
+    def remove_from_library(self, request, queryset):
+        library = action_argument(self, request, 'library')
+        if library is not None:
+            run_or_enqueue(
+                self, request, queryset, tasks.remove_books_from_library, library, done=f'removed from {library}',
+            )
+
+    @admin.action(description='Delete selected books (tick Confirm delete)', permissions=['delete'])
+    def delete_books(self, request, queryset):
+        if action_argument(self, request, 'confirm'):
+            run_or_enqueue(self, request, queryset, tasks.delete_books, done='deleted')
 
 @admin.register(Library)
-class LibraryAdmin(admin.ModelAdmin):
-    list_display = ('name',)
-    filter_horizontal = ('books',)
+class LibraryAdmin(LargeChangelistMixin, admin.ModelAdmin):
+    list_display = ('name', 'book_count')
+    search_fields = ('name',)
+    # A select box of the whole catalogue does not scale; edit book ids instead
+    raw_id_fields = ('books',)
 
 @admin.register(Librarian)
 class LibrarianAdmin(admin.ModelAdmin):
     list_display = ('name', 'library')
-    list_filter = ('library',)
\ No newline at end of file
+    list_select_related = ('library',)
+    list_filter = (('library', TopRelatedFieldListFilter),)
+    autocomplete_fields = ('library',)
+
+@admin.register(Job)
+class JobAdmin(LargeChangelistMixin, admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'priority', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status',)
+    search_fields = ('task',)
+    readonly_fields = ('result', 'error', 'worker', 'attempts', 'created_at', 'started_at', 'heartbeat_at', 'finished_at')
+    actions = ('retry',)
+
+    @admin.action(description='Queue selected failed jobs again', permissions=['change'])
+    def retry(self, request, queryset):
+        count = queryset.filter(status=Job.FAILED).update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now(), finished_at=None,
+        )
+        self.message_user(request, f'{count} jobs queued again.')
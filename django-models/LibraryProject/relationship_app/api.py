@@ -0,0 +1,263 @@
+"""
+Read-only JSON API for the catalogue.
+
+    GET /relationship/api/<resource>/             a cursor-paginated list
+    GET /relationship/api/<resource>/<pk>/        a single object
+
+Resources are ``books``, ``authors``, ``libraries`` and ``librarians``.
+Query parameters:
+
+- ``fields=title,author`` limits the attributes returned (``id`` is
+  always included);
+- ``include=author,libraries`` expands related objects inline;
+- ``limit`` sets the page size (default 50, at most 200), and
+  ``cursor`` selects a page, using the tokens in ``next`` / ``previous``.
+
+Rows are read with values(), so no model instances are built. Related
+objects are loaded eagerly in a fixed number of queries. To-one relations
+are JOINed into the main query, as select_related() does. To-many
+relations are fetched for the whole page in one extra query per include,
+as prefetch_related() does.
+"""
+from collections import defaultdict
+from functools import wraps
+
+from django.http import JsonResponse
+
+from .conditional import catalogue_condition
+from .models import Author, Book, Librarian, Library
+from .pagination import CursorPaginator, InvalidCursor
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class ApiError(Exception):
+    """A client error reported as a 400 JSON response"""
+    pass
+
+
+def _book_libraries(book_ids):
+    rows = (
+        Library.books.through.objects.filter(book_id__in=book_ids)
+        .order_by('library__name', 'library_id')
+        .values_list('book_id', 'library_id', 'library__name')
+    )
+    grouped = defaultdict(list)
+    for book_id, library_id, name in rows:
+        grouped[book_id].append({'id': library_id, 'name': name})
+    return grouped
+
+
+def _author_books(author_ids):
+    rows = Book.objects.filter(author_id__in=author_ids).order_by('title', 'id').values_list('author_id', 'id', 'title')
+    grouped = defaultdict(list)
+    for author_id, book_id, title in rows:
+        grouped[author_id].append({'id': book_id, 'title': title})
+    return grouped
+
+
+def _library_books(library_ids):
+    rows = (
+        Library.books.through.objects.filter(library_id__in=library_ids)
+        .order_by('book__title', 'book_id')
+        .values_list('library_id', 'book_id', 'book__title', 'book__author_id')
+    )
+    grouped = defaultdict(list)
+    for library_id, book_id, title, author_id in rows:
+        grouped[library_id].append({'id': book_id, 'title': title, 'author': author_id})
+    return grouped
+
+
+class Resource:
+    """
+    How one model is exposed:
+
+    - ``fields`` maps public attribute names to values() paths;
+    - ``to_one`` maps an includable relation to the values() paths of
+      its nested attributes, fetched with a JOIN;
+    - ``to_many`` maps an includable relation to a loader taking the ids
+      on the page and returning ``{id: [nested dicts]}``.
+    """
+
+    def __init__(self, model, fields, to_one=None, to_many=None):
+        self.model = model
+        self.fields = fields
+        self.to_one = to_one or {}
+        self.to_many = to_many or {}
+
+    def parse(self, request):
+        """Validate ?fields= and ?include= and return (fields, includes)"""
+        def names(param):
+            value = request.GET.get(param, '')
+            return [name.strip() for name in value.split(',') if name.strip()]
+
+        fields = names('fields') or list(self.fields)
+        unknown = [name for name in fields if name not in self.fields]
+        if unknown:
+            raise ApiError(f'Unknown fields: {", ".join(unknown)}')
+        includes = names('include')
+        unknown = [name for name in includes if name not in self.to_one and name not in self.to_many]
+        if unknown:
+            raise ApiError(f'Unknown includes: {", ".join(unknown)}')
+        if 'id' not in fields:
+            fields.insert(0, 'id')
+        for name in includes:
+            if name not in fields:
+                fields.append(name)
+        return fields, includes
+
+    def queryset(self, fields, includes):
+        """A values() queryset selecting everything the page needs"""
+        paths = []
+        for name in fields:
+            if name in self.to_one and name in includes:
+                paths.extend(self.to_one[name].values())
+            elif name in self.fields:
+                paths.append(self.fields[name])
+        # The cursor needs the ordering columns, selected or not
+        opts = self.model._meta
+        for name in opts.ordering:
+            paths.append(opts.get_field(name.lstrip('-')).attname)
+        return self.model.objects.values(*dict.fromkeys(paths))
+
+    def serialize(self, rows, fields, includes):
+        """Turn values() rows into API dicts, loading to-many includes"""
+        loaded = {}
+        ids = [row['id'] for row in rows]
+        for name in includes:
+            if name in self.to_many:
+                loaded[name] = self.to_many[name](ids) if ids else {}
+
+        data = []
+        for row in rows:
+            item = {}
+            for name in fields:
+                if name in loaded:
+                    item[name] = loaded[name].get(row['id'], [])
+                elif name in self.to_one and name in includes:
+                    nested = {key: row[path] for key, path in self.to_one[name].items()}
+                    item[name] = nested if nested['id'] is not None else None
+                elif name in self.fields:
+                    item[name] = row[self.fields[name]]
+            data.append(item)
+        return data
+
+
+RESOURCES = {
+    'books': Resource(
+        Book,
+        fields={'id': 'id', 'title': 'title', 'author': 'author_id', 'updated_at': 'updated_at'},
+        to_one={'author': {'id': 'author__id', 'name': 'author__name', 'book_count': 'author__book_count'}},
+        to_many={'libraries': _book_libraries},
+    ),
+    'authors': Resource(
+        Author,
+        fields={'id': 'id', 'name': 'name', 'book_count': 'book_count', 'updated_at': 'updated_at'},
+        to_many={'books': _author_books},
+    ),
+    'libraries': Resource(
+        Library,
+        fields={
+            'id': 'id', 'name': 'name', 'book_count': 'book_count',
+            'librarian': 'librarian__id', 'updated_at': 'updated_at',
+        },
+        to_one={'librarian': {'id': 'librarian__id', 'name': 'librarian__name'}},
+        to_many={'books': _library_books},
+    ),
+    'librarians': Resource(
+        Librarian,
+        fields={'id': 'id', 'name': 'name', 'library': 'library_id'},
+        to_one={'library': {'id': 'library__id', 'name': 'library__name', 'book_count': 'library__book_count'}},
+    ),
+}
+
+
+def _error(status, message):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_view(*models):
+    """
+    Decorator for the API views: session authentication answered with
+    401 JSON instead of a login redirect, 400 JSON for ApiError, and
+    conditional GET on ``models``.
+    """
+    def decorator(view_func):
+        conditional_view = catalogue_condition(*models)(view_func)
+
+        @wraps(view_func)
+        def _wrapper_view(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return _error(401, 'Authentication required.')
+            if request.method not in ('GET', 'HEAD'):
+                return _error(405, 'The API is read-only.')
+            try:
+                return conditional_view(request, *args, **kwargs)
+            except ApiError as e:
+                return _error(400, str(e))
+        return _wrapper_view
+    return decorator
+
+
+def _page_size(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ApiError('limit must be an integer.')
+    if limit < 1:
+        raise ApiError('limit must be positive.')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def resource_list(resource):
+    def view(request):
+        fields, includes = resource.parse(request)
+        paginator = CursorPaginator(resource.queryset(fields, includes), _page_size(request))
+        try:
+            page = paginator.page(request.GET.get('cursor'))
+            rows = page.object_list
+        except InvalidCursor as e:
+            raise ApiError(str(e))
+        return JsonResponse({
+            'data': resource.serialize(rows, fields, includes),
+            'next': _page_url(request, page.next_cursor),
+            'previous': _page_url(request, page.previous_cursor),
+        })
+    return view
+
+
+def resource_detail(resource):
+    def view(request, pk):
+        fields, includes = resource.parse(request)
+        rows = list(resource.queryset(fields, includes).filter(pk=pk))
+        if not rows:
+            return _error(404, f'No {resource.model._meta.verbose_name} with id {pk}.')
+        return JsonResponse({'data': resource.serialize(rows, fields, includes)[0]})
+    return view
+
+
+# Every resource depends on the models its includes can reach
+_DEPENDENCIES = {
+    'books': (Book, Author, Library),
+    'authors': (Author, Book),
+    'libraries': (Library, Librarian, Book),
+    'librarians': (Librarian, Library),
+}
+
+list_views = {
+    name: api_view(*_DEPENDENCIES[name])(resource_list(resource))
+    for name, resource in RESOURCES.items()
+}
+detail_views = {
+    name: api_view(*_DEPENDENCIES[name])(resource_detail(resource))
+    for name, resource in RESOURCES.items()
+}
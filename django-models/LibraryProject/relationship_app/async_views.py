@@ -0,0 +1,196 @@
+"""
+Async versions of the catalogue pages and role dashboards, routed
+instead of their relationship_app.views counterparts when
+settings.ASYNC_VIEWS is on (the default under LibraryProject.asgi).
+
+They render the same templates with the same fragment caching, query
+budget and conditional GET handling. Under ASGI they avoid the
+sync_to_async hop Django otherwise makes for every sync view.
+
+The cache tiers may be files, so they are read through sync_to_async,
+and so are the templates rendered, since their {% cache %} tags read
+the tiers too. Each view checks whether its template fragments are
+cached:
+- on a hit, the page data is never loaded, as in the sync views. The
+  context holds lazy pages, which load in the rendering thread if the
+  fragment expires before it renders, or not_loaded() stand-ins, which
+  raise SynchronousOnlyOperation; render_loaded() then loads their data
+  and renders again;
+- on a miss, the data is loaded with the async ORM before rendering.
+"""
+import asyncio
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import SynchronousOnlyOperation
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject
+from django.views import View
+
+from .caching import cache_version, fragment_cached
+from .conditional import catalogue_condition
+from .decorators import aget_user_role, aload_user, role_required
+from .models import Author, Book, Librarian, Library, UserProfile
+from .pagination import paginate_by_cursor
+from .services import aget_dashboard_stats, aget_library_summary, dashboard_stats_version
+from .views import (
+    BOOKS_PER_PAGE, LIBRARIAN_BOOKS_PER_PAGE, MEMBER_BOOKS_PER_PAGE, fragment_cache_context,
+)
+from .warming import arecord_access
+
+
+def _not_loaded():
+    raise SynchronousOnlyOperation('Data left unloaded for a cached fragment was used.')
+
+
+def not_loaded():
+    """Context stand-in for data whose fragment is cached; any use raises SynchronousOnlyOperation"""
+    return SimpleLazyObject(_not_loaded)
+
+
+@sync_to_async
+def fragment_state(name, models, *vary_on):
+    """
+    fragment_cache_context(*models), and whether the fragment ``name``
+    varying on ``vary_on`` and the models' version is stored
+    """
+    fragments = fragment_cache_context(*models)
+    return fragments, fragment_cached(name, *vary_on, fragments['cache_version'])
+
+
+arender = sync_to_async(render)
+
+
+async def render_loaded(request, template_name, context, **loaders):
+    """
+    Render a template whose data is loaded or cached. If a fragment
+    expired between the check and the render, each context entry in
+    ``loaders`` is set to the result of awaiting its function, and the
+    template is rendered again.
+    """
+    try:
+        return await arender(request, template_name, context)
+    except SynchronousOnlyOperation:
+        for name, load in loaders.items():
+            context[name] = await load()
+        return await arender(request, template_name, context)
+
+
+@login_required
+@catalogue_condition(Book, Author)
+async def list_books(request):
+    """
+    Async list_books: one page of books and their authors, keyset-paginated
+    """
+    await aload_user(request)
+    page = paginate_by_cursor(request, Book.objects.all().select_related('author'), BOOKS_PER_PAGE)
+    await arecord_access(request, 'book_list', page.cursor)
+    fragments, cached = await fragment_state('book_list', (Book, Author), page.cursor)
+    if not cached:
+        await page.aload()
+    context = {'books': page, 'page': page, **fragments}
+    return await render_loaded(request, 'relationship_app/list_books.html', context)
+
+
+@method_decorator(login_required(login_url='/relationship/login/'), name='get')
+@method_decorator(catalogue_condition(Library, Book, Author, Librarian), name='get')
+class LibraryDetailView(View):
+    """
+    Async LibraryDetailView: a library, its librarian and its books with
+    their authors, loaded in one aget() only on a fragment cache miss
+    """
+    template_name = 'relationship_app/library_detail.html'
+
+    def get_queryset(self):
+        return Library.objects.select_related('librarian').prefetch_related(
+            Prefetch('books', queryset=Book.objects.select_related('author'))
+        )
+
+    async def get(self, request, pk):
+        await aload_user(request)
+        await arecord_access(request, 'library_detail', pk)
+        fragments, cached = await fragment_state('library_detail', (Library, Book, Author, Librarian), pk)
+        library = not_loaded() if cached else await self.aget_library(pk)
+        context = {'library_id': pk, 'library': library, **fragments}
+        return await render_loaded(request, self.template_name, context, library=lambda: self.aget_library(pk))
+
+    async def aget_library(self, pk):
+        try:
+            return await self.get_queryset().aget(pk=pk)
+        except Library.DoesNotExist:
+            raise Http404('No library found matching the query')
+
+
+@role_required('Admin', login_url='/relationship/login/')
+@catalogue_condition(UserProfile, Book, Library, personal=True, extra=dashboard_stats_version)
+async def admin_view(request):
+    """
+    Async admin dashboard; the statistics and the library summary are
+    awaited together
+    """
+    stats, libraries = await asyncio.gather(aget_dashboard_stats(), aget_library_summary())
+    context = {
+        'user': await aload_user(request),
+        'role': await aget_user_role(request),
+        'libraries': libraries,
+        **stats,
+    }
+    return await arender(request, 'relationship_app/admin_view.html', context)
+
+
+@role_required('Librarian', login_url='/relationship/login/')
+@catalogue_condition(Book, Author, Library, personal=True)
+async def librarian_view(request):
+    """
+    Async librarian dashboard
+    """
+    page = paginate_by_cursor(request, Book.objects.select_related('author'), LIBRARIAN_BOOKS_PER_PAGE)
+
+    def fragments():
+        books_version, libraries_version = cache_version(Book, Author), cache_version(Library, Book)
+        return (
+            books_version, libraries_version, fragment_cached('librarian_books', page.cursor, books_version),
+            fragment_cached('librarian_libraries', libraries_version),
+        )
+
+    books_version, libraries_version, books_cached, libraries_cached = await sync_to_async(fragments)()
+    if not books_cached:
+        await page.aload()
+    libraries = not_loaded() if libraries_cached else await aget_library_summary()
+    context = {
+        'user': await aload_user(request),
+        'role': await aget_user_role(request),
+        'books': page,
+        'page': page,
+        'libraries': libraries,
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'books_version': books_version,
+        'libraries_version': libraries_version,
+    }
+    return await render_loaded(
+        request, 'relationship_app/librarian_view.html', context, libraries=aget_library_summary,
+    )
+
+
+@role_required('Member', login_url='/relationship/login/')
+@catalogue_condition(Book, Author, personal=True)
+async def member_view(request):
+    """
+    Async member dashboard
+    """
+    page = paginate_by_cursor(request, Book.objects.select_related('author'), MEMBER_BOOKS_PER_PAGE)
+    fragments, cached = await fragment_state('member_books', (Book, Author), page.cursor)
+    if not cached:
+        await page.aload()
+    context = {
+        'user': await aload_user(request),
+        'role': await aget_user_role(request),
+        'available_books': page,
+        'page': page,
+        **fragments,
+    }
+    return await render_loaded(request, 'relationship_app/member_view.html', context)
@@ -0,0 +1,223 @@
+"""
+In-memory prefix index for type-ahead search over book titles and
+author names.
+
+Each worker process keeps its own index: a sorted list of
+``(key, position, kind, pk)`` entries, one per word of every title and
+name. ``key`` is the normalised text from that word onwards, and
+``position`` is the word's index. A prefix lookup is a bisect into the
+list followed by a short scan, so it never touches the database.
+
+- The index is built lazily on the first lookup.
+- Saves and deletes in this process update it incrementally through
+  the signal receivers in relationship_app.signals, which then accept
+  the version bump the change made with synced().
+- Changes made elsewhere (other workers, bulk imports) bump the
+  Book/Author cache versions. The index compares them at most every
+  AUTOCOMPLETE_CHECK_INTERVAL seconds and rebuilds when they moved;
+  lookups keep answering from the old entries during the rebuild.
+- At most AUTOCOMPLETE_MAX_ENTRIES entries are held. A truncated index
+  sends the lookups it cannot fully answer to the FTS5 search in
+  relationship_app.search.
+"""
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.conf import settings
+
+from .caching import model_version
+from .models import Author, Book
+from .search import AUTHOR_INDEX, BOOK_INDEX
+
+DEFAULT_MAX_ENTRIES = 200000
+DEFAULT_CHECK_INTERVAL = 2.0
+MAX_RESULTS = 20
+
+# The models whose versions the index follows, in the order of PrefixIndex.version
+VERSIONED = (Book, Author)
+
+SOURCES = {
+    'book': (Book, 'title'),
+    'author': (Author, 'name'),
+}
+
+
+def normalize(text):
+    """Casefold and strip accents, so 'Émile' is found by 'emi'"""
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).strip()
+
+
+def _keys(label):
+    """The normalised suffixes of ``label`` that start at a word, in order"""
+    words = normalize(label).split()
+    return [' '.join(words[index:]) for index in range(len(words))]
+
+
+class PrefixIndex:
+    """A bounded, sorted prefix index over Book.title and Author.name"""
+
+    def __init__(self, max_entries=None, check_interval=None):
+        self.max_entries = max_entries or getattr(settings, 'AUTOCOMPLETE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+        self.check_interval = (
+            check_interval if check_interval is not None
+            else getattr(settings, 'AUTOCOMPLETE_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+        )
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._entries = None
+        self._labels = {}
+        self.truncated = False
+        self.version = None
+        self._checked = 0.0
+
+    def __len__(self):
+        return len(self._entries or ())
+
+    @property
+    def loaded(self):
+        return self._entries is not None
+
+    def _current_version(self):
+        return tuple(model_version(model) for model in VERSIONED)
+
+    def build(self):
+        """(Re)load every title and name from the database"""
+        with self._build_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        # Load into new lists without holding the lookup lock, so other
+        # threads keep answering from the current entries, then swap
+        version = self._current_version()
+        entries, labels, truncated = [], {}, False
+        for kind, (model, field) in SOURCES.items():
+            for pk, label in model.objects.order_by().values_list('pk', field).iterator(chunk_size=5000):
+                keys = _keys(label)
+                if len(entries) + len(keys) > self.max_entries:
+                    truncated = True
+                    break
+                labels[(kind, pk)] = label
+                entries.extend((key, position, kind, pk) for position, key in enumerate(keys))
+        entries.sort()
+        with self._lock:
+            self._entries, self._labels, self.truncated = entries, labels, truncated
+            self.version = version
+            self._checked = time.monotonic()
+
+    def _ensure_fresh(self):
+        if self._entries is None:
+            # Nothing to answer from yet: wait for the thread loading it
+            with self._build_lock:
+                if self._entries is None:
+                    self._rebuild()
+            return
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        # One thread rebuilds; the others answer from the stale entries
+        if self._current_version() != self.version and self._build_lock.acquire(blocking=False):
+            try:
+                self._rebuild()
+            finally:
+                self._build_lock.release()
+
+    def add(self, kind, pk, label):
+        """Index (or re-index) one row; no-op until the index is loaded"""
+        with self._lock:
+            if self._entries is None:
+                return
+            self._discard(kind, pk)
+            keys = _keys(label)
+            if len(self._entries) + len(keys) > self.max_entries:
+                self.truncated = True
+                return
+            self._labels[(kind, pk)] = label
+            for position, key in enumerate(keys):
+                insort(self._entries, (key, position, kind, pk))
+
+    def remove(self, kind, pk):
+        with self._lock:
+            if self._entries is not None:
+                self._discard(kind, pk)
+
+    def _discard(self, kind, pk):
+        label = self._labels.pop((kind, pk), None)
+        if label is None:
+            return
+        for position, key in enumerate(_keys(label)):
+            entry = (key, position, kind, pk)
+            index = bisect_left(self._entries, entry)
+            if index < len(self._entries) and self._entries[index] == entry:
+                del self._entries[index]
+
+    def synced(self, model):
+        """
+        Accept the one bump of ``model``'s version made by a change this
+        process has already applied, so the next freshness check does not
+        rebuild. If the version moved by more than that, another process
+        changed the model too, and the check rebuilds.
+        """
+        with self._lock:
+            if self._entries is None:
+                return
+            version = list(self.version)
+            position = VERSIONED.index(model)
+            if model_version(model) == version[position] + 1:
+                version[position] += 1
+                self.version = tuple(version)
+
+    def lookup(self, prefix, limit=10):
+        """
+        Up to ``limit`` ``{'type', 'id', 'label'}`` dicts whose title or
+        name has a word starting with ``prefix``. Matches at the start of
+        the label come first, then alphabetical order.
+        """
+        prefix = normalize(prefix)
+        limit = max(1, min(limit, MAX_RESULTS))
+        if not prefix:
+            return []
+        self._ensure_fresh()
+        with self._lock:
+            entries, labels = self._entries, self._labels
+            # Scan a few extra candidates so label-start matches can be ranked first
+            candidates = []
+            seen = set()
+            index = bisect_left(entries, (prefix,))
+            while index < len(entries) and len(candidates) < limit * 4:
+                key, position, kind, pk = entries[index]
+                if not key.startswith(prefix):
+                    break
+                if (kind, pk) not in seen:
+                    seen.add((kind, pk))
+                    candidates.append((position > 0, key, kind, pk))
+                index += 1
+            truncated = self.truncated
+            results = [
+                {'type': kind, 'id': pk, 'label': labels[(kind, pk)]}
+                for _, _, kind, pk in sorted(candidates)[:limit]
+            ]
+        if truncated and len(results) < limit:
+            results = self._search_database(prefix, limit, results)
+        return results
+
+    def _search_database(self, prefix, limit, results):
+        seen = {(result['type'], result['id']) for result in results}
+        for kind, index, queryset in [
+            ('book', BOOK_INDEX, Book.objects.only('title')),
+            ('author', AUTHOR_INDEX, Author.objects.only('name')),
+        ]:
+            for obj in index.search(queryset, prefix, limit):
+                if len(results) >= limit:
+                    return results
+                if (kind, obj.pk) not in seen:
+                    label = obj.title if kind == 'book' else obj.name
+                    results.append({'type': kind, 'id': obj.pk, 'label': label})
+        return results
+
+
+# The per-process index used by the autocomplete view and the signals
+index = PrefixIndex()
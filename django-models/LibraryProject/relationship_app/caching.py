@@ -0,0 +1,200 @@
+"""
+Tiered caching helpers for relationship_app.
+
+Reads try the per-process 'default' cache first and fall back to the
+host-wide 'shared' cache (see CACHES in settings). Writes go to both.
+
+Keys can depend on models. Each model has a version number kept in the
+shared tier, and that version is part of every key that depends on the
+model. Saving or deleting a Book, Author, Library or Librarian bumps its
+model's version (see relationship_app.signals). That invalidates every
+dependent key in every worker at once, and stale entries simply expire.
+
+The {% cache %} template tag stores its fragments in the
+'template_fragments' alias, a TieredCache over the same two tiers. A
+fragment rendered by one process, such as ``manage.py warm_caches``, is
+then served by every other process on the host.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.utils import make_template_fragment_key
+
+HOT_ALIAS = 'default'
+SHARED_ALIAS = 'shared'
+FRAGMENT_ALIAS = 'template_fragments'
+KEY_PREFIX = 'relationship_app'
+
+_missing = object()
+
+
+def hot_cache():
+    return caches[HOT_ALIAS]
+
+
+def shared_cache():
+    return caches[SHARED_ALIAS]
+
+
+def _hot_timeout(timeout):
+    hot_timeout = getattr(settings, 'HOT_CACHE_TIMEOUT', 30)
+    if timeout is DEFAULT_TIMEOUT:
+        timeout = shared_cache().default_timeout
+    if timeout is None:
+        return hot_timeout
+    return min(timeout, hot_timeout)
+
+
+def cache_get(key, default=None):
+    """Read ``key`` from the hot tier, falling back to the shared tier"""
+    value = hot_cache().get(key, _missing)
+    if value is not _missing:
+        return value
+    value = shared_cache().get(key, _missing)
+    if value is _missing:
+        return default
+    hot_cache().set(key, value, _hot_timeout(None))
+    return value
+
+
+def cache_set(key, value, timeout=DEFAULT_TIMEOUT):
+    """
+    Write ``key`` to both tiers, for ``timeout`` seconds (default: the
+    shared tier's TIMEOUT, None: forever); the hot copy expires after
+    HOT_CACHE_TIMEOUT at most
+    """
+    shared_cache().set(key, value, timeout)
+    hot_cache().set(key, value, _hot_timeout(timeout))
+
+
+def cache_delete(key):
+    """Remove ``key`` from both tiers"""
+    shared_cache().delete(key)
+    hot_cache().delete(key)
+
+
+class TieredCache(BaseCache):
+    """
+    Cache backend reading and writing through cache_get()/cache_set(),
+    for code that takes a cache alias rather than calling the helpers
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def get(self, key, default=None, version=None):
+        return cache_get(self.make_and_validate_key(key, version), default)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        cache_set(self.make_and_validate_key(key, version), value, self._timeout(timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version)
+        timeout = self._timeout(timeout)
+        if not shared_cache().add(key, value, timeout):
+            return False
+        hot_cache().set(key, value, _hot_timeout(timeout))
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version)
+        timeout = self._timeout(timeout)
+        hot_cache().touch(key, _hot_timeout(timeout))
+        return shared_cache().touch(key, timeout)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version)
+        deleted = shared_cache().delete(key)
+        return hot_cache().delete(key) or deleted
+
+    def clear(self):
+        shared_cache().clear()
+        hot_cache().clear()
+
+
+def fragment_cache():
+    return caches[FRAGMENT_ALIAS]
+
+
+def fragment_cached(name, *vary_on):
+    """Whether the {% cache %} fragment ``name`` with ``vary_on`` is stored"""
+    return fragment_cache().get(make_template_fragment_key(name, vary_on)) is not None
+
+
+def _version_key(model):
+    return f'{KEY_PREFIX}:version:{model._meta.label_lower}'
+
+
+def model_version(model):
+    """Current cache version of ``model``, shared by all workers"""
+    key = _version_key(model)
+    version = shared_cache().get(key)
+    if version is None:
+        # Start from the clock so a lost/evicted version never reuses an old number
+        shared_cache().add(key, time.time_ns(), None)
+        version = shared_cache().get(key)
+    return version
+
+
+def bump_model_version(*models):
+    """Invalidate every cached value that depends on any of ``models``"""
+    for model in models:
+        key = _version_key(model)
+        try:
+            shared_cache().incr(key)
+        except ValueError:
+            shared_cache().set(key, time.time_ns(), None)
+
+
+def cache_version(*models):
+    """
+    Combined version string of ``models``. Pass it as a vary_on argument
+    to {% cache %} so template fragments are invalidated with the models.
+    """
+    return '.'.join(str(model_version(model)) for model in models)
+
+
+def make_key(name, *parts, depends_on=()):
+    """
+    Build a cache key from ``name`` and ``parts`` that embeds the current
+    versions of the ``depends_on`` models, e.g.
+    ``relationship_app:library_detail:17:v1760680000000000001``.
+    """
+    versions = cache_version(*depends_on)
+    segments = [KEY_PREFIX, name, *[str(part) for part in parts]]
+    if versions:
+        segments.append(f'v{versions}')
+    return ':'.join(segments)
+
+
+def cached(name, compute, *parts, depends_on=(), timeout=DEFAULT_TIMEOUT):
+    """
+    Return the cached value for ``name``/``parts``. On a miss, store and
+    return ``compute()`` for ``timeout`` seconds, as cache_set() does.
+    """
+    key = make_key(name, *parts, depends_on=depends_on)
+    value = cache_get(key, _missing)
+    if value is _missing:
+        value = compute()
+        cache_set(key, value, timeout)
+    return value
+
+
+async def acached(name, acompute, *parts, depends_on=(), timeout=DEFAULT_TIMEOUT):
+    """
+    Async counterpart of cached(); ``acompute`` is a coroutine function.
+    The tiers are read and written through sync_to_async, since the shared
+    tier may be files or a database table.
+    """
+    key = await sync_to_async(make_key)(name, *parts, depends_on=depends_on)
+    value = await sync_to_async(cache_get)(key, _missing)
+    if value is _missing:
+        value = await acompute()
+        await sync_to_async(cache_set)(key, value, timeout)
+    return value
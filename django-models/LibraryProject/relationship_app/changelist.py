@@ -0,0 +1,305 @@
+"""
+Admin changelist helpers for tables too large to count or enumerate.
+
+- EstimatedCountPaginator counts at most COUNT_LIMIT rows. Beyond that,
+  an unfiltered changelist estimates its size from the primary key range,
+  and a filtered one reports COUNT_LIMIT. Gaps in the keys make the
+  estimate too high; a page that comes back short of it is the last
+  one, and the count is corrected from it.
+- TopRelatedFieldListFilter and TopValuesFieldListFilter offer only the
+  FILTER_CHOICES most common choices, plus the selected one. The choices
+  are computed on first use and cached; everything else is reached
+  through the search box.
+- RangeFieldListFilter filters a numeric field by lower and upper bounds,
+  which an index on the field serves as one range scan, and lists
+  buckets such as decades.
+- facet_counts() is the cached per-value row count behind the value and
+  range filters. It is counted over the whole table, so the counts shown
+  next to the choices ignore the other active filters.
+
+LargeChangelistMixin applies the paginator, shows its corrected count,
+and skips the second, unfiltered count the changelist makes for its
+"N total" link.
+
+ActionArgumentsMixin validates a ModelAdmin.action_form with extra
+fields, for bulk actions that take a value such as the author to
+reassign to, and reports what is wrong with them. action_argument()
+hands an action the cleaned value.
+run_or_enqueue() runs a bulk action's task inline, or hands selections
+over BULK_BACKGROUND_THRESHOLD rows to the job queue.
+"""
+from collections import Counter
+
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import EmptyPage, Paginator
+from django.db.models import Count, Model
+from django.http import HttpResponseRedirect
+from django.http.response import HttpResponseBase
+from django.utils.functional import cached_property
+from django.utils.translation import gettext as _
+
+from . import bulk
+from .caching import cached
+
+COUNT_LIMIT = 10000
+FILTER_CHOICES = 50
+FILTER_CACHE_TIMEOUT = 300
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator whose count never scans more than COUNT_LIMIT rows"""
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        exact = queryset.order_by()[:COUNT_LIMIT + 1].count()
+        if exact <= COUNT_LIMIT:
+            return exact
+        if queryset.query.where:
+            return COUNT_LIMIT
+        # Two index probes; separate queries, since SQLite only optimises
+        # a lone MIN() or MAX()
+        pks = queryset.model._default_manager.order_by().values_list('pk', flat=True)
+        first, last = pks.order_by('pk').first(), pks.order_by('-pk').first()
+        self.estimated = True
+        return max(exact, last - first + 1)
+
+    def page(self, number):
+        """The page; one that comes back short of the estimate clamps the count to where it ends"""
+        page = super().page(number)
+        if not self.estimated:
+            return page
+        bottom = (page.number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        rows = len(page.object_list)
+        if rows < top - bottom:
+            self.count = bottom + rows
+            self.__dict__.pop('num_pages', None)
+            if not rows and page.number > 1:
+                raise EmptyPage(_('That page contains no results'))
+        return page
+
+
+class EstimatedCountChangeList(ChangeList):
+    """ChangeList reporting the count its EstimatedCountPaginator ended up with"""
+
+    def get_results(self, request):
+        super().get_results(request)
+        if not self.paginator.estimated:
+            return
+        if self.multi_page and not (self.show_all and self.can_show_all):
+            # Corrected if the page came back short
+            self.result_count = self.paginator.count
+        else:
+            # Every row is listed
+            self.result_count = len(self.result_list)
+
+
+class LargeChangelistMixin:
+    """ModelAdmin mixin for changelists over large tables"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return EstimatedCountChangeList
+
+
+class TopRelatedFieldListFilter(admin.RelatedFieldListFilter):
+    """
+    RelatedFieldListFilter listing the FILTER_CHOICES related objects with
+    the highest ``count_field``, cached until the related model changes
+    """
+    count_field = 'book_count'
+
+    def field_choices(self, field, request, model_admin):
+        related = field.remote_field.model
+
+        def top_choices():
+            rows = related._default_manager.order_by(f'-{self.count_field}', 'pk')[:FILTER_CHOICES]
+            return sorted(((obj.pk, str(obj)) for obj in rows), key=lambda choice: choice[1])
+
+        choices = cached(
+            'admin_filter', top_choices, related._meta.label_lower, self.count_field,
+            depends_on=(related,), timeout=FILTER_CACHE_TIMEOUT,
+        )
+        listed = {str(pk) for pk, _ in choices}
+        selected = [value for value in self.lookup_val or () if value not in listed]
+        if selected:
+            choices = choices + [(obj.pk, str(obj)) for obj in related._default_manager.filter(pk__in=selected)]
+        return choices
+
+
+def facet_counts(queryset, field_path, limit=None):
+    """
+    ``[(value, rows)]`` for the values of ``field_path`` in ``queryset``,
+    most common first, at most ``limit`` of them. One GROUP BY, cached for
+    FILTER_CACHE_TIMEOUT or until the model changes.
+    """
+    model = queryset.model
+
+    def count():
+        rows = queryset.order_by().values_list(field_path).annotate(rows=Count('pk')).order_by('-rows', field_path)
+        return list(rows[:limit] if limit else rows)
+
+    return cached(
+        'admin_facets', count, model._meta.label_lower, field_path, limit,
+        depends_on=(model,), timeout=FILTER_CACHE_TIMEOUT,
+    )
+
+
+class TopValuesFieldListFilter(admin.AllValuesFieldListFilter):
+    """
+    AllValuesFieldListFilter over the FILTER_CHOICES most common values of
+    a local field, listed in value order with their facet_counts()
+    """
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        # Replace the lazy SELECT DISTINCT built above before it is evaluated
+        self.counts = dict(facet_counts(model_admin.get_queryset(request), field.name, limit=FILTER_CHOICES))
+        values = sorted(self.counts, key=lambda value: (value is None, value))
+        listed = {str(value) for value in values}
+        self.lookup_choices = values + [value for value in self.lookup_val or () if value not in listed]
+
+    def choices(self, changelist):
+        counts = {str(value): rows for value, rows in self.counts.items() if value is not None}
+        for index, choice in enumerate(super().choices(changelist)):
+            # Django's own facets (?_facets) already append filtered counts
+            if index and not changelist.add_facets and choice['display'] in counts:
+                choice = {**choice, 'display': f"{choice['display']} ({counts[choice['display']]})"}
+            yield choice
+
+
+class RangeFieldListFilter(admin.FieldListFilter):
+    """
+    ``__gte``/``__lte`` bounds on a numeric field, set through a small form
+    or by picking one of the ``bucket_size`` wide buckets (decades, for
+    years). The buckets and their row counts are summed from the field's
+    facet_counts().
+    """
+    bucket_size = 10
+    template = 'admin/range_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg_gte = f'{field_path}__gte'
+        self.lookup_kwarg_lte = f'{field_path}__lte'
+        super().__init__(field, request, params, model, model_admin, field_path)
+        # An empty box in the form means no bound, not an invalid one
+        for name in self.expected_parameters():
+            values = [value for value in self.used_parameters.pop(name, ()) if value != '']
+            if values:
+                self.used_parameters[name] = values
+        self.gte = self.used_parameters.get(self.lookup_kwarg_gte, [None])[-1]
+        self.lte = self.used_parameters.get(self.lookup_kwarg_lte, [None])[-1]
+        buckets = Counter()
+        for value, rows in facet_counts(model_admin.get_queryset(request), field_path):
+            if value is not None:
+                buckets[value // self.bucket_size * self.bucket_size] += rows
+        self.buckets = sorted(buckets.items())
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg_gte, self.lookup_kwarg_lte]
+
+    def choices(self, changelist):
+        # The other parameters of the changelist, carried through the form
+        self.form_params = [
+            (name, value) for name, value in changelist.params.items() if name not in self.expected_parameters()
+        ]
+        yield {
+            'selected': self.gte is None and self.lte is None,
+            'query_string': changelist.get_query_string(remove=self.expected_parameters()),
+            'display': _('All'),
+        }
+        for start, rows in self.buckets:
+            end = start + self.bucket_size - 1
+            yield {
+                'selected': (self.gte, self.lte) == (str(start), str(end)),
+                'query_string': changelist.get_query_string({self.lookup_kwarg_gte: start, self.lookup_kwarg_lte: end}),
+                'display': f'{start}–{end} ({rows})',
+            }
+
+class ActionArgumentsMixin:
+    """
+    Validate the action bar once per action. Invalid extra fields are
+    reported one by one, where Django only says "No action selected.",
+    and the cleaned values are kept on the request for action_argument(),
+    so a model choice is not looked up again.
+    """
+
+    def response_action(self, request, queryset):
+        # As ModelAdmin.response_action: the action of the bar whose button was pushed
+        try:
+            action_index = int(request.POST.get('index', 0))
+        except ValueError:
+            action_index = 0
+        data = request.POST.copy()
+        data.pop(helpers.ACTION_CHECKBOX_NAME, None)
+        data.pop('index', None)
+        try:
+            data.update({'action': data.getlist('action')[action_index]})
+        except IndexError:
+            pass
+        action_form = self.action_form(data, auto_id=None)
+        action_form.fields['action'].choices = self.get_action_choices(request)
+        if not action_form.is_valid():
+            if 'action' in action_form.errors:
+                self.message_user(request, _('No action selected.'), messages.WARNING)
+            for name, errors in action_form.errors.items():
+                if name != 'action':
+                    label = action_form.fields[name].label or name.capitalize()
+                    self.message_user(request, f"{label}: {' '.join(errors)}", messages.ERROR)
+            return None
+
+        selected = request.POST.getlist(helpers.ACTION_CHECKBOX_NAME)
+        if not selected and not action_form.cleaned_data['select_across']:
+            self.message_user(request, _(
+                'Items must be selected in order to perform actions on them. No items have been changed.'
+            ), messages.WARNING)
+            return None
+        if not action_form.cleaned_data['select_across']:
+            queryset = queryset.filter(pk__in=selected)
+        request.action_arguments = action_form.cleaned_data
+        func = self.get_actions(request)[action_form.cleaned_data['action']][0]
+        response = func(self, request, queryset)
+        if isinstance(response, HttpResponseBase):
+            return response
+        return HttpResponseRedirect(request.get_full_path())
+
+
+def action_argument(model_admin, request, name):
+    """
+    The cleaned value of the ``name`` field of the action bar, validated
+    by ActionArgumentsMixin, or None after reporting that it is missing
+    """
+    value = getattr(request, 'action_arguments', {}).get(name)
+    field = model_admin.action_form.base_fields[name]
+    # An unticked confirmation box cleans to False
+    if value is False or value in field.empty_values:
+        model_admin.message_user(request, f'{field.label or name.capitalize()}: This field is required.', messages.ERROR)
+        return None
+    return value
+
+
+def run_or_enqueue(model_admin, request, queryset, task, *args, done, **kwargs):
+    """
+    Call ``task(queryset, *args, **kwargs)`` and report
+    ``<count> <objects> <done>``. A selection over BULK_BACKGROUND_THRESHOLD
+    rows is queued as a job instead, so that the action returns at once.
+    The job carries bulk.describe_selection(queryset), not the selected
+    keys, and model instances in ``args`` as their primary keys.
+    """
+    count = queryset.count()
+    noun = model_admin.opts.verbose_name_plural
+    if count > getattr(settings, 'BULK_BACKGROUND_THRESHOLD', COUNT_LIMIT):
+        job = task.enqueue(
+            bulk.describe_selection(queryset), *[arg.pk if isinstance(arg, Model) else arg for arg in args], **kwargs
+        )
+        model_admin.message_user(request, f'{count} {noun} will be {done} by background job {job.pk}.')
+    else:
+        model_admin.message_user(request, f'{task(queryset, *args, **kwargs)} {noun} {done}.')
@@ -0,0 +1,147 @@
+"""
+Conditional GET (ETag / Last-Modified) support for the catalogue views.
+
+Both validators are computed before the view runs:
+
+- Last-Modified is the newest ``updated_at`` across the models a page
+  shows, found with one indexed max-probe per model in a single query.
+- The ETag also includes the cache versions from relationship_app.caching.
+  Those change on deletes and m2m changes, which MAX(updated_at) cannot
+  see. On personalised pages it also includes the user and role.
+  Browsers send If-None-Match alongside If-Modified-Since, and the ETag
+  takes precedence.
+
+When the client's copy is current, the view is skipped and a 304 is
+returned without rendering anything.
+
+Async views get the same behaviour, with the probe run through the
+async ORM. Django's condition() would call the validators synchronously
+even for an async view.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db.models import Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+from .caching import cache_version
+from .decorators import aget_user_role, aload_user, get_user_role
+
+
+def _newest(model):
+    return model.objects.order_by('-updated_at').values('updated_at')[:1]
+
+
+def _probe(models):
+    """
+    (models with updated_at, probe queryset) for latest_update(): the
+    newest row of the first model plus a scalar subquery per other model
+    """
+    models = [
+        model for model in models
+        if any(field.name == 'updated_at' for field in model._meta.concrete_fields)
+    ]
+    if not models:
+        return models, None
+    others = {f'latest_{index}': Subquery(_newest(model)) for index, model in enumerate(models[1:])}
+    return models, _newest(models[0]).annotate(**others).values('updated_at', *others)
+
+
+def _newest_value(row):
+    return max((value for value in row.values() if value is not None), default=None)
+
+
+def latest_update(*models):
+    """
+    Newest updated_at across ``models``, or None if they are all empty.
+    All models are probed in one query: the newest row of the first model
+    plus a scalar subquery per other model, each an index lookup.
+    """
+    models, probe = _probe(models)
+    if probe is None:
+        return None
+    row = probe.first()
+    if row is None:
+        # The first model is empty, so its row cannot carry the subqueries
+        return latest_update(*models[1:])
+    return _newest_value(row)
+
+
+async def alatest_update(*models):
+    """Async counterpart of latest_update()"""
+    models, probe = _probe(models)
+    if probe is None:
+        return None
+    row = await probe.afirst()
+    if row is None:
+        return await alatest_update(*models[1:])
+    return _newest_value(row)
+
+
+def _etag(models, latest, user_parts=()):
+    parts = [cache_version(*models), latest.isoformat() if latest else '', *user_parts]
+    return hashlib.md5(':'.join(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def catalogue_condition(*models, personal=False, extra=None):
+    """
+    Decorator applying django.views.decorators.http.condition with
+    validators derived from ``models``. Set ``personal=True`` for pages
+    that show per-user content; their ETag then varies by user and role,
+    and no Last-Modified is sent because it cannot tell users apart.
+    ``extra`` is a function returning a string that also goes into the
+    ETag, for content that can change while the models do not (such as
+    statistics refreshed in the background); Last-Modified is then
+    omitted too. Works on sync and async views.
+    """
+    omit_last_modified = personal or extra is not None
+
+    def probe(request):
+        # Memoise per request: condition() asks for both validators
+        cache_attr = '_catalogue_latest_update'
+        if not hasattr(request, cache_attr):
+            setattr(request, cache_attr, latest_update(*models))
+        return getattr(request, cache_attr)
+
+    def etag(request, *args, **kwargs):
+        user_parts = [str(request.user.pk), str(get_user_role(request))] if personal else []
+        if extra is not None:
+            user_parts.append(extra())
+        return _etag(models, probe(request), user_parts)
+
+    def last_modified(request, *args, **kwargs):
+        return probe(request)
+
+    sync_decorator = condition(etag_func=etag, last_modified_func=None if omit_last_modified else last_modified)
+
+    def decorator(view_func):
+        if not iscoroutinefunction(view_func):
+            return sync_decorator(view_func)
+
+        @wraps(view_func)
+        async def _wrapper_view(request, *args, **kwargs):
+            latest = await alatest_update(*models)
+            user_parts = []
+            if personal:
+                user = await aload_user(request)
+                user_parts = [str(user.pk), str(await aget_user_role(request))]
+            if extra is not None:
+                user_parts.append(await sync_to_async(extra)())
+            # The cache versions are read from the shared tier, which may be files
+            res_etag = f'"{await sync_to_async(_etag)(models, latest, user_parts)}"'
+            res_last_modified = None if omit_last_modified or latest is None else int(latest.timestamp())
+            response = get_conditional_response(request, etag=res_etag, last_modified=res_last_modified)
+            if response is None:
+                response = await view_func(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if res_last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(res_last_modified)
+                response.headers.setdefault('ETag', res_etag)
+            return response
+        return _wrapper_view
+
+    return decorator
+
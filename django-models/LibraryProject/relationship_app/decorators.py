@@ -0,0 +1,92 @@
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import REDIRECT_FIELD_NAME
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import ObjectDoesNotExist
+from django.shortcuts import resolve_url
+
+from .models import UserProfile
+
+
+def get_user_role(request):
+    """
+    Return the role of request.user ('Admin', 'Librarian', 'Member') or
+    None for anonymous users and users without a profile. The result is
+    cached on the request, so repeated checks cost nothing.
+    """
+    try:
+        return request._user_role
+    except AttributeError:
+        pass
+    role = None
+    user = request.user
+    if user.is_authenticated:
+        try:
+            role = user.profile.role
+        except ObjectDoesNotExist:
+            role = None
+    request._user_role = role
+    return role
+
+
+async def aload_user(request):
+    """
+    Load request.user with the async auth API and store it on the request,
+    so templates and context processors do not lazily load it again with
+    synchronous queries
+    """
+    user = await request.auser()
+    request.user = user
+    return user
+
+
+async def aget_user_role(request):
+    """Async counterpart of get_user_role() for async views"""
+    try:
+        return request._user_role
+    except AttributeError:
+        pass
+    role = None
+    user = await aload_user(request)
+    if user.is_authenticated:
+        if type(user).profile.is_cached(user):
+            try:
+                profile = user.profile
+            except ObjectDoesNotExist:
+                # A lookup that found no profile is cached too
+                profile = None
+        else:
+            # Backends other than ProfileBackend do not preload it
+            profile = await UserProfile.objects.filter(user=user).afirst()
+        role = profile.role if profile else None
+    request._user_role = role
+    return role
+
+
+def role_required(*roles, login_url=None, redirect_field_name=REDIRECT_FIELD_NAME):
+    """
+    Decorator for views that only users with one of ``roles`` may see.
+    Everyone else is redirected to the login page, like user_passes_test.
+    Works on sync and async views.
+    """
+    def decorator(view_func):
+        def _redirect(request):
+            resolved_login_url = resolve_url(login_url or settings.LOGIN_URL)
+            return redirect_to_login(request.get_full_path(), resolved_login_url, redirect_field_name)
+
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapper_view(request, *args, **kwargs):
+                if await aget_user_role(request) in roles:
+                    return await view_func(request, *args, **kwargs)
+                return _redirect(request)
+        else:
+            @wraps(view_func)
+            def _wrapper_view(request, *args, **kwargs):
+                if get_user_role(request) in roles:
+                    return view_func(request, *args, **kwargs)
+                return _redirect(request)
+        return _wrapper_view
+    return decorator
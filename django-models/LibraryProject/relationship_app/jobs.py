@@ -0,0 +1,247 @@
+"""
+Database-backed job queue, for work too slow for a request thread.
+
+Functions decorated with @task (see relationship_app.tasks) are queued as
+Job rows with task.enqueue(*args, **kwargs), or task.enqueue_on_commit()
+to queue only once the surrounding transaction commits. Arguments and
+results must be JSON serialisable. Calling the task directly still runs
+it inline.
+
+``manage.py run_workers`` runs a pool of worker processes. Each worker
+repeatedly claims the next due job, highest priority first, and runs it.
+- A claim is a compare-and-set UPDATE on the job's status. It needs no
+  row locks, so it works on SQLite, and two workers cannot take the same
+  job.
+- A task that raises is retried JOB_RETRY_DELAY, 2x, 4x... seconds later,
+  until it has run max_attempts times; then the job is marked failed,
+  with the traceback in Job.error.
+- While a job runs, a thread in its worker refreshes Job.heartbeat_at
+  every JOB_HEARTBEAT_INTERVAL seconds. A job whose heartbeat stopped
+  for JOB_TIMEOUT seconds, because its worker died, is queued again by
+  requeue_stale(); one that is merely slow keeps running. A worker only
+  records the outcome of a job it still holds, so one that was queued
+  again meanwhile is left to its new run.
+- A task whose result is not JSON serialisable fails without a retry.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger('relationship_app.jobs')
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 10
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_HEARTBEAT_INTERVAL = 60
+DEFAULT_TIMEOUT = 3600
+
+# Queued jobs considered per claim, in case other workers take the first ones
+CLAIM_CANDIDATES = 5
+
+registry = {}
+
+
+class Task:
+    """A function that can be queued as a Job; created with @task"""
+
+    def __init__(self, func, name, priority, max_attempts):
+        self.func = func
+        self.name = name
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def __repr__(self):
+        return f'<Task {self.name}>'
+
+    def enqueue(self, *args, **kwargs):
+        """Queue a call now with the task's priority; returns the Job"""
+        return enqueue(self.name, args, kwargs)
+
+    def enqueue_on_commit(self, *args, **kwargs):
+        """Queue a call when the current transaction commits, or at once outside one"""
+        transaction.on_commit(lambda: self.enqueue(*args, **kwargs))
+
+
+def task(func=None, *, name=None, priority=0, max_attempts=None):
+    """Register ``func`` as a Task, under its dotted path unless ``name`` is given"""
+    def register(func):
+        task_name = name or f'{func.__module__}.{func.__qualname__}'
+        registry[task_name] = Task(
+            func, task_name, priority,
+            max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS),
+        )
+        return registry[task_name]
+
+    return register(func) if func else register
+
+
+def enqueue(name, args=(), kwargs=None, priority=None, delay=0):
+    """Queue a call of the task registered as ``name``, due ``delay`` seconds from now"""
+    task = registry[name]
+    return Job.objects.create(
+        task=name,
+        args=list(args),
+        kwargs=kwargs or {},
+        priority=task.priority if priority is None else priority,
+        max_attempts=task.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def claim(worker):
+    """Mark the next due job as running on ``worker`` and return it, or None"""
+    now = timezone.now()
+    due = (
+        Job.objects.filter(status=Job.QUEUED, run_at__lte=now)
+        .order_by('-priority', 'run_at', 'pk').values_list('pk', flat=True)
+    )
+    for pk in due[:CLAIM_CANDIDATES]:
+        # Zero rows when another worker claimed it since the SELECT
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, worker=worker, started_at=now, heartbeat_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def _beat(pk):
+    Job.objects.filter(pk=pk, status=Job.RUNNING).update(heartbeat_at=timezone.now())
+
+
+@contextmanager
+def _heartbeat(job):
+    """Refresh the job's heartbeat_at from a thread while the block runs"""
+    interval = getattr(settings, 'JOB_HEARTBEAT_INTERVAL', DEFAULT_HEARTBEAT_INTERVAL)
+    stopped = threading.Event()
+
+    def beat():
+        try:
+            while not stopped.wait(interval):
+                try:
+                    _beat(job.pk)
+                except DatabaseError as e:
+                    logger.warning('Heartbeat of job %s failed: %s', job, e)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name=f'job-{job.pk}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def run(job):
+    """Run a claimed job and record its result, or schedule its retry"""
+    try:
+        with _heartbeat(job):
+            result = registry[job.task](*job.args, **job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            delay = getattr(settings, 'JOB_RETRY_DELAY', DEFAULT_RETRY_DELAY) * 2 ** (job.attempts - 1)
+            logger.warning('Job %s failed (attempt %d/%d), retrying in %ss', job, job.attempts, job.max_attempts, delay)
+            changes = {'status': Job.QUEUED, 'run_at': timezone.now() + timedelta(seconds=delay)}
+        else:
+            logger.error('Job %s failed after %d attempts', job, job.attempts)
+            changes = {'status': Job.FAILED, 'finished_at': timezone.now()}
+        _finish(job, error=error, worker='', **changes)
+        return
+    try:
+        # Up front: failing inside the UPDATE would break the surrounding transaction
+        json.dumps(result, cls=Job._meta.get_field('result').encoder)
+    except (TypeError, ValueError):
+        logger.error('Job %s returned a result that is not JSON serialisable', job)
+        _finish(job, status=Job.FAILED, error=traceback.format_exc(), worker='', finished_at=timezone.now())
+        return
+    _finish(job, status=Job.DONE, result=result, error='', finished_at=timezone.now())
+
+
+def _finish(job, **changes):
+    # Zero rows when requeue_stale() took the job away from this worker
+    finished = Job.objects.filter(pk=job.pk, status=Job.RUNNING, worker=job.worker).update(**changes)
+    if not finished:
+        logger.warning('Job %s was queued again while it ran; this run is not recorded', job)
+
+
+def requeue_stale(timeout=None):
+    """
+    Queue again the running jobs without a heartbeat for over ``timeout``
+    seconds, whose worker is presumed dead; returns how many were
+    requeued or failed
+    """
+    timeout = timeout if timeout is not None else getattr(settings, 'JOB_TIMEOUT', DEFAULT_TIMEOUT)
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=timeout)
+    # Jobs claimed before heartbeat_at existed only have started_at
+    stale = Job.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status=Job.RUNNING,
+    )
+    error = f'Worker stopped responding; no heartbeat for over {timeout}s'
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, error=error, worker='', finished_at=now,
+    )
+    requeued = stale.update(status=Job.QUEUED, error=error, worker='', run_at=now)
+    return failed + requeued
+
+
+def _connection_upkeep():
+    # What Django does around each request: honour CONN_MAX_AGE and drop
+    # connections a previous job left broken. Not inside a transaction
+    # (work() called from a test or an atomic block), which would be lost.
+    if not any(connection.in_atomic_block for connection in connections.all(initialized_only=True)):
+        close_old_connections()
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def work(stop=None, burst=False, poll_interval=None):
+    """
+    Claim and run jobs until ``stop`` (anything with is_set() and
+    wait(timeout), such as a threading.Event) is set, or, with ``burst``,
+    until no job is due; returns the number of jobs run
+    """
+    if poll_interval is None:
+        poll_interval = getattr(settings, 'JOB_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+    name = worker_name()
+    processed = 0
+    while not (stop and stop.is_set()):
+        _connection_upkeep()
+        job = claim(name)
+        if job is None:
+            if burst:
+                break
+            if stop:
+                stop.wait(poll_interval)
+            else:
+                time.sleep(poll_interval)
+            continue
+        start = time.perf_counter()
+        run(job)
+        processed += 1
+        logger.info('Job #%s %s finished in %.2fs', job.pk, job.task, time.perf_counter() - start)
+    _connection_upkeep()
+    return processed
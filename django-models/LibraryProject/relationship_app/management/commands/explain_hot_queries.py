@@ -0,0 +1,74 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+def hot_queries():
+    """
+    (label, queryset, sort_ok) triples for the lookups the app performs on
+    every request or admin page. ``sort_ok`` marks queries whose ORDER BY
+    only sorts an already index-selected subset (e.g. one library's books).
+    Keep this list in step with the views. Other apps add theirs with a
+    hot_queries() method on their AppConfig.
+    """
+    from relationship_app.models import Author, Book, Librarian, Library
+    from relationship_app.pagination import CursorPaginator
+
+    seek = CursorPaginator(Book.objects.all(), 50)._seek(['M', 1], backwards=False)
+    queries = [
+        ('Author by name', Author.objects.filter(name='George Orwell'), False),
+        ('Library by name', Library.objects.filter(name='Central Library'), False),
+        ('Authors ordered by name', Author.objects.order_by('name')[:50], False),
+        ('Libraries ordered by name', Library.objects.order_by('name')[:50], False),
+        ('Librarians ordered by name', Librarian.objects.order_by('name')[:50], False),
+        ('Librarian for library', Librarian.objects.filter(library_id=1), False),
+        ('Book list, first page', Book.objects.select_related('author').order_by('title', 'id')[:51], False),
+        ('Book list, keyset page', Book.objects.select_related('author').filter(seek).order_by('title', 'id')[:51], False),
+        ("Author's books by title", Book.objects.filter(author_id=1).order_by('title'), False),
+        ("Library's books", Book.objects.filter(libraries=1).select_related('author'), True),
+        ('Latest book update', Book.objects.order_by('-updated_at').values('updated_at')[:1], False),
+    ]
+    for config in apps.get_app_configs():
+        if hasattr(config, 'hot_queries'):
+            queries.extend(config.hot_queries())
+    return queries
+
+
+def plan_problems(plan, sort_ok=False):
+    """Full table scans and ORDER BY sorts in an EXPLAIN QUERY PLAN result"""
+    problems = []
+    for detail in plan:
+        if detail.startswith('SCAN ') and ' USING ' not in detail:
+            problems.append(f'full table scan: {detail}')
+        elif 'USE TEMP B-TREE FOR ORDER BY' in detail and not sort_ok:
+            problems.append(f'sort without index: {detail}')
+    return problems
+
+
+class Command(BaseCommand):
+    help = (
+        'Print the SQLite EXPLAIN QUERY PLAN of every hot query and fail if any '
+        'of them scans a whole table or sorts without an index'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('explain_hot_queries only understands SQLite query plans.')
+
+        failures = []
+        with connection.cursor() as cursor:
+            for label, queryset, sort_ok in hot_queries():
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[-1] for row in cursor.fetchall()]
+                problems = plan_problems(plan, sort_ok)
+
+                style = self.style.ERROR if problems else self.style.SUCCESS
+                self.stdout.write(style(label))
+                for detail in plan:
+                    self.stdout.write(f'    {detail}')
+                failures.extend(f'{label}: {problem}' for problem in problems)
+
+        if failures:
+            raise CommandError('Index regressions found:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('All hot queries use an index.'))
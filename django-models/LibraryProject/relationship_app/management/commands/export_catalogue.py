@@ -0,0 +1,69 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from relationship_app import tasks
+from relationship_app.exporters import (
+    DEFAULT_CHUNK_SIZE, WRITERS, author_rows, book_rows, export_blocks, library_book_rows,
+)
+from relationship_app.models import Library
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream the books, the authors or one library\'s books as CSV or JSON Lines, '
+        'with constant memory use'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=['books', 'authors', 'library-books'])
+        parser.add_argument('--library', type=int, help='Library id (required for library-books)')
+        parser.add_argument('--format', choices=sorted(WRITERS), default='csv')
+        parser.add_argument('--output', '-o', default='-', help="Output file, or '-' for standard output")
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'Rows fetched from the database at a time (default: {DEFAULT_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--background',
+            action='store_true',
+            help='Queue the export to --output for `manage.py run_workers` and return at once',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dataset = options['dataset']
+        if dataset == 'library-books':
+            library_id = options['library']
+            if library_id is None:
+                raise CommandError('--library is required for the library-books dataset.')
+            if not Library.objects.filter(pk=library_id).exists():
+                raise CommandError(f'Library {library_id} does not exist.')
+            rows = library_book_rows(library_id, chunk_size)
+        elif dataset == 'authors':
+            rows = author_rows(chunk_size)
+        else:
+            rows = book_rows(chunk_size)
+
+        if options['background']:
+            if options['output'] == '-':
+                raise CommandError('--output is required with --background.')
+            job = tasks.export_catalogue.enqueue(
+                os.path.abspath(options['output']), dataset, options['format'], options['library'],
+            )
+            self.stdout.write(self.style.SUCCESS(f'Queued as job {job.pk}.'))
+            return
+
+        blocks = export_blocks(rows, options['format'])
+        if options['output'] == '-':
+            for block in blocks:
+                self.stdout.write(block, ending='')
+            return
+        try:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as handle:
+                for block in blocks:
+                    handle.write(block)
+        except OSError as e:
+            raise CommandError(str(e))
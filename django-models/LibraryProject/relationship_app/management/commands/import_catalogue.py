@@ -0,0 +1,64 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from relationship_app import tasks
+from relationship_app.importers import DEFAULT_CHUNK_SIZE, READERS, CatalogueImportError, import_file
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream a CSV or JSON Lines catalogue (title, author, libraries) into the '
+        'database in chunked bulk inserts'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' for standard input")
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='Input format (default: taken from the file extension)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help=f'Rows per transaction (default: {DEFAULT_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--background',
+            action='store_true',
+            help='Queue the import for `manage.py run_workers` and return at once',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path == '-' and not options['format']:
+            raise CommandError('--format is required when reading standard input.')
+        if options['background']:
+            if path == '-':
+                raise CommandError('Standard input cannot be imported in the background.')
+            job = tasks.import_catalogue.enqueue(os.path.abspath(path), options['format'])
+            self.stdout.write(self.style.SUCCESS(f'Queued as job {job.pk}.'))
+            return
+
+        def progress(stats):
+            self.stdout.write(f'{stats.rows} rows imported ({stats.rate:,.0f} rows/sec)')
+
+        try:
+            stats = import_file(
+                path,
+                fmt=options['format'],
+                chunk_size=options['chunk_size'],
+                progress=progress,
+                stream=sys.stdin if path == '-' else None,
+            )
+        except (CatalogueImportError, OSError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats.rows} rows in {stats.elapsed:.1f}s ({stats.rate:,.0f} rows/sec): '
+            f'{stats.books} books, {stats.authors_created} new authors, '
+            f'{stats.libraries_created} new libraries, {stats.memberships} library memberships.'
+        ))
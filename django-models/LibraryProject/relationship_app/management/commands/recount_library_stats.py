@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from relationship_app import tasks
+from relationship_app.services import recount_book_counts
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized Author.book_count and Library.book_count columns in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted rows without updating them',
+        )
+        parser.add_argument(
+            '--background',
+            action='store_true',
+            help='Queue the recount for `manage.py run_workers` and return at once',
+        )
+
+    def handle(self, *args, **options):
+        if options['background']:
+            job = tasks.recount.enqueue(dry_run=options['dry_run'])
+            self.stdout.write(self.style.SUCCESS(f'Queued as job {job.pk}.'))
+            return
+        drift = recount_book_counts(dry_run=options['dry_run'])
+        verb = 'would be repaired' if options['dry_run'] else 'repaired'
+        for label, count in drift.items():
+            self.stdout.write(f'{count} {label} {verb}')
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Book counts are up to date.'))
@@ -0,0 +1,121 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from relationship_app import jobs
+
+# Seconds between sweeps for jobs whose worker died
+STALE_CHECK_INTERVAL = 60
+
+
+class _Stop:
+    """
+    Set by SIGTERM, which the supervisor sends to stop a worker, or when
+    the supervisor itself is gone. A plain flag: a multiprocessing Event
+    shared with the workers is left locked by one killed while waiting.
+    """
+
+    def __init__(self):
+        self.supervisor = os.getppid()
+        self.terminated = False
+
+    def is_set(self):
+        return self.terminated or os.getppid() != self.supervisor
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+
+
+def _worker(burst, poll_interval):
+    stop = _Stop()
+    signal.signal(signal.SIGTERM, lambda signum, frame: setattr(stop, 'terminated', True))
+    # Ctrl-C reaches the whole process group; the supervisor decides
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    jobs.work(stop=stop, burst=burst, poll_interval=poll_interval)
+
+
+class Command(BaseCommand):
+    help = (
+        'Run queued background jobs (relationship_app.jobs) in a pool of worker processes, '
+        'restarting any that die. Ctrl-C or SIGTERM lets the current jobs finish; a second '
+        'one kills them.'
+    )
+
+    def add_arguments(self, parser):
+        default = getattr(settings, 'JOB_WORKERS', 2)
+        parser.add_argument(
+            '--processes', '-p',
+            type=int,
+            default=default,
+            help=f'Worker processes (default: JOB_WORKERS, {default})',
+        )
+        parser.add_argument(
+            '--burst',
+            action='store_true',
+            help='Exit once no job is due instead of waiting for more',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            help='Seconds between polls of an empty queue (default: JOB_POLL_INTERVAL)',
+        )
+
+    def handle(self, *args, **options):
+        processes, burst = options['processes'], options['burst']
+        if processes < 1:
+            raise CommandError('--processes must be at least 1.')
+        if options['verbosity'] > 1:
+            jobs.logger.setLevel(logging.INFO)
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stdout.write(f'{requeued} stale jobs requeued or failed')
+
+        context = multiprocessing.get_context('fork')
+
+        def start():
+            # A forked child must not inherit the parent's open connection
+            connections.close_all()
+            process = context.Process(target=_worker, args=(burst, options['poll_interval']))
+            process.start()
+            return process
+
+        signals = []
+        signal.signal(signal.SIGINT, lambda signum, frame: signals.append(signum))
+        signal.signal(signal.SIGTERM, lambda signum, frame: signals.append(signum))
+        pool = [start() for _ in range(processes)]
+        self.stdout.write(f"{processes} workers started: pids {', '.join(str(p.pid) for p in pool)}")
+
+        stopping = 0
+        last_sweep = time.monotonic()
+        while pool:
+            time.sleep(0.5)
+            if len(signals) > stopping:
+                stopping = len(signals)
+                self.stdout.write('Killing the workers.' if stopping > 1 else 'Stopping after the current jobs...')
+                for process in pool:
+                    if stopping > 1:
+                        process.kill()
+                    else:
+                        process.terminate()
+            running = []
+            for process in pool:
+                if process.is_alive():
+                    running.append(process)
+                    continue
+                process.join()
+                # Done: told to stop, or a --burst worker that found no job
+                if stopping or (burst and process.exitcode == 0):
+                    continue
+                self.stderr.write(f'Worker {process.pid} exited with code {process.exitcode}; restarting')
+                running.append(start())
+            pool = running
+            if not stopping and time.monotonic() - last_sweep > STALE_CHECK_INTERVAL:
+                jobs.requeue_stale()
+                last_sweep = time.monotonic()
+        self.stdout.write(self.style.SUCCESS('All workers stopped.'))
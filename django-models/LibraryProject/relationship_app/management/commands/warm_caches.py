@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from relationship_app import tasks
+from relationship_app.warming import DEFAULT_BOOK_PAGES, DEFAULT_LIBRARIES, warm, warming_plan
+
+
+class Command(BaseCommand):
+    help = (
+        'Pre-render the dashboard aggregates, library detail pages and book list pages into the '
+        'cache, most recently requested first (relationship_app.warming)'
+    )
+
+    def add_arguments(self, parser):
+        default = getattr(settings, 'WARM_CACHE_THREADS', 4)
+        parser.add_argument(
+            '--threads', '-t',
+            type=int,
+            default=default,
+            help=f'Pages rendered at once (default: WARM_CACHE_THREADS, {default})',
+        )
+        parser.add_argument(
+            '--libraries',
+            type=int,
+            default=DEFAULT_LIBRARIES,
+            help=f'Library detail pages to warm (default: {DEFAULT_LIBRARIES})',
+        )
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=DEFAULT_BOOK_PAGES,
+            help=f'Book list pages to warm (default: {DEFAULT_BOOK_PAGES})',
+        )
+        parser.add_argument(
+            '--background',
+            action='store_true',
+            help='Queue the warm-up for `manage.py run_workers` and return at once',
+        )
+
+    def handle(self, *args, **options):
+        threads, libraries, book_pages = options['threads'], options['libraries'], options['pages']
+        if min(threads, libraries, book_pages) < 0 or threads < 1:
+            raise CommandError('--threads must be at least 1, --libraries and --pages at least 0.')
+        if options['background']:
+            job = tasks.warm_caches.enqueue(libraries=libraries, book_pages=book_pages, threads=threads)
+            self.stdout.write(self.style.SUCCESS(f'Queued as job {job.pk}.'))
+            return
+        plan = warming_plan(libraries, book_pages)
+        if options['verbosity'] > 1:
+            for page in plan:
+                label = page.name if page.key is None else f'{page.name} {page.key}'
+                hits = '' if page.hits is None else f' ({page.hits:.1f} recent requests)'
+                self.stdout.write(f'{label}{hits}')
+        stats = warm(plan, threads)
+        for page, error in stats.failed:
+            self.stderr.write(f'{page.name} {page.key}: {error}')
+        self.stdout.write(
+            f'Warmed {stats.warmed} of {len(plan)} entries in {stats.elapsed:.2f}s on {threads} threads'
+        )
+        style = self.style.SUCCESS if stats.hits == stats.checked else self.style.WARNING
+        self.stdout.write(style(f'Hit ratio afterwards: {stats.hit_ratio:.1%} ({stats.hits}/{stats.checked})'))
@@ -0,0 +1,196 @@
+"""
+Per-request SQL and template instrumentation.
+
+QueryInstrumentationMiddleware samples INSTRUMENTATION_SAMPLE_RATE of the
+requests. For each sampled request it records:
+
+- the number of queries and the time spent in them, through a
+  connection.execute_wrapper() on every database connection;
+- statements whose SQL text ran INSTRUMENTATION_DUPLICATE_THRESHOLD
+  times or more, whatever their parameters: a repeated lookup, or the
+  signature of an N+1 such as ``{{ library.books.count }}`` in a loop.
+  These are logged as warnings;
+- the time spent rendering templates. Queries run lazily from a template
+  count towards both figures. Django has no timing hook for this (the
+  template_rendered signal is only sent under the test runner), so
+  Template.render is wrapped while sampled requests are in flight.
+
+The figures are sent back in a ``Server-Timing`` header, which browser
+developer tools display per request. With INSTRUMENTATION_LOG on, each
+sampled request also logs one JSON line to the
+``relationship_app.instrumentation`` logger. Requests that are not
+sampled cost one random() call.
+
+Streaming responses are measured up to the moment they are returned, so
+the queries made while their content is generated are not included.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template
+
+logger = logging.getLogger('relationship_app.instrumentation')
+
+DEFAULT_DUPLICATE_THRESHOLD = 3
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Query and template timings of one request; also the execute wrapper"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+        self._rendering = False
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def duplicates(self, threshold):
+        """``{sql: count}`` of the statements run at least ``threshold`` times"""
+        return {sql: count for sql, count in self.statements.most_common() if count >= threshold}
+
+    def install(self):
+        for connection in connections.all():
+            connection.execute_wrappers.append(self)
+
+    def uninstall(self):
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+_render = None
+_render_lock = threading.Lock()
+_timed_requests = 0
+
+
+def _timed_render(self, context=None, request=None):
+    metrics = _current.get()
+    # Only the outermost render is timed; nested ones are part of it
+    if metrics is None or metrics._rendering:
+        return _render(self, context, request)
+    metrics._rendering = True
+    start = time.perf_counter()
+    try:
+        return _render(self, context, request)
+    finally:
+        metrics.template_time += time.perf_counter() - start
+        metrics._rendering = False
+
+
+def _time_templates():
+    """Wrap the backend's Template.render() while the first sampled request runs"""
+    global _render, _timed_requests
+    with _render_lock:
+        if not _timed_requests:
+            _render, Template.render = Template.render, _timed_render
+        _timed_requests += 1
+
+
+def _stop_timing_templates():
+    """Restore Template.render() when the last sampled request is done"""
+    global _timed_requests
+    with _render_lock:
+        _timed_requests -= 1
+        if not _timed_requests:
+            Template.render = _render
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Add ``Server-Timing`` (queries, SQL time, template time, total) to
+    sampled responses, and log N+1 query patterns. Works on sync and
+    async request paths.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def sampled(self):
+        rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 1.0)
+        return rate >= 1 or random.random() < rate
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        metrics.install()
+        _time_templates()
+        try:
+            response = self.get_response(request)
+        finally:
+            _stop_timing_templates()
+            metrics.uninstall()
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        # The async ORM runs its queries in the request's thread-sensitive
+        # executor thread, whose connection is not this thread's
+        await sync_to_async(metrics.install)()
+        _time_templates()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _stop_timing_templates()
+            await sync_to_async(metrics.uninstall)()
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        duplicates = metrics.duplicates(
+            getattr(settings, 'INSTRUMENTATION_DUPLICATE_THRESHOLD', DEFAULT_DUPLICATE_THRESHOLD)
+        )
+        timings = [
+            f'db;dur={metrics.sql_time * 1000:.2f};desc="{metrics.queries} queries"',
+            f'tpl;dur={metrics.template_time * 1000:.2f};desc="Templates"',
+            f'total;dur={total * 1000:.2f}',
+        ]
+        if duplicates:
+            timings.append(f'nplus1;desc="{len(duplicates)} repeated statements"')
+            for sql, count in duplicates.items():
+                logger.warning('%s %s ran %d times: %s', request.method, request.path, count, sql[:300])
+        response['Server-Timing'] = ', '.join(timings)
+        if getattr(settings, 'INSTRUMENTATION_LOG', False):
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': metrics.queries,
+                'sql_ms': round(metrics.sql_time * 1000, 2),
+                'template_ms': round(metrics.template_time * 1000, 2),
+                'total_ms': round(total * 1000, 2),
+                'duplicates': [{'sql': sql[:300], 'count': count} for sql, count in duplicates.items()],
+            }))
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:26
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_book_counts(apps, schema_editor):
+    Author = apps.get_model('relationship_app', 'Author')
+    Book = apps.get_model('relationship_app', 'Book')
+    Library = apps.get_model('relationship_app', 'Library')
+    Membership = Library.books.through
+
+    Author.objects.update(book_count=Coalesce(Subquery(
+        Book.objects.filter(author=OuterRef('pk'))
+        .order_by().values('author').annotate(total=Count('pk')).values('total')
+    ), 0))
+    Library.objects.update(book_count=Coalesce(Subquery(
+        Membership.objects.filter(library=OuterRef('pk'))
+        .order_by().values('library').annotate(total=Count('pk')).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationship_app', '0003_book_title_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='book_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='library',
+            name='book_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_book_counts, migrations.RunPython.noop),
+    ]
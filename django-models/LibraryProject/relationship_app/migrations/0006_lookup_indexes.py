@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationship_app', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='book',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='books', to='relationship_app.author'),
+        ),
+        migrations.AddIndex(
+            model_name='author',
+            index=models.Index(fields=['name'], name='author_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['author', 'title'], name='book_author_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='librarian',
+            index=models.Index(fields=['name'], name='librarian_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='library',
+            index=models.Index(fields=['name'], name='library_name_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:36
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def merge_duplicate_books(apps, schema_editor):
+    """
+    Merge the books sharing an author and a title into the one with the
+    lowest id, moving their library memberships to it, so the unique
+    constraint can be added; then recount the book counts
+    """
+    Author = apps.get_model('relationship_app', 'Author')
+    Book = apps.get_model('relationship_app', 'Book')
+    Library = apps.get_model('relationship_app', 'Library')
+    Membership = Library.books.through
+    duplicates = list(
+        Book.objects.order_by().values('author_id', 'title')
+        .annotate(keep=Min('pk'), copies=Count('pk')).filter(copies__gt=1)
+    )
+    if not duplicates:
+        return
+    for group in duplicates:
+        extra = Book.objects.filter(author_id=group['author_id'], title=group['title']).exclude(pk=group['keep'])
+        library_ids = Membership.objects.filter(book__in=extra).values_list('library_id', flat=True).distinct()
+        Membership.objects.bulk_create(
+            [Membership(library_id=library_id, book_id=group['keep']) for library_id in library_ids],
+            ignore_conflicts=True,
+        )
+        extra.delete()
+    Author.objects.update(book_count=Coalesce(Subquery(
+        Book.objects.filter(author=OuterRef('pk'))
+        .order_by().values('author').annotate(total=Count('pk')).values('total')
+    ), 0))
+    Library.objects.update(book_count=Coalesce(Subquery(
+        Membership.objects.filter(library=OuterRef('pk'))
+        .order_by().values('library').annotate(total=Count('pk')).values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationship_app', '0006_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_books, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.UniqueConstraint(fields=('author', 'title'), name='book_author_title_uniq'),
+        ),
+        migrations.RemoveIndex(
+            model_name='book',
+            name='book_author_title_idx',
+        ),
+    ]
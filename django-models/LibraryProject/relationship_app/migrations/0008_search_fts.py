@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:10
+
+from django.db import migrations
+
+# FTS5 tables keep their own copy of the indexed text, keyed by the row id.
+# Triggers keep them in step with every write path, including
+# bulk_create() and the catalogue importer, which bypass model signals.
+FORWARD = [
+    "CREATE VIRTUAL TABLE relationship_app_book_fts USING fts5("
+    "title, author, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE relationship_app_author_fts USING fts5("
+    "name, tokenize='unicode61 remove_diacritics 2')",
+
+    "INSERT INTO relationship_app_book_fts(rowid, title, author) "
+    "SELECT b.id, b.title, a.name FROM relationship_app_book b "
+    "JOIN relationship_app_author a ON a.id = b.author_id",
+    "INSERT INTO relationship_app_author_fts(rowid, name) SELECT id, name FROM relationship_app_author",
+
+    """CREATE TRIGGER relationship_app_book_fts_insert AFTER INSERT ON relationship_app_book BEGIN
+        INSERT INTO relationship_app_book_fts(rowid, title, author)
+        VALUES (new.id, new.title, (SELECT name FROM relationship_app_author WHERE id = new.author_id));
+    END""",
+    """CREATE TRIGGER relationship_app_book_fts_update AFTER UPDATE OF title, author_id ON relationship_app_book BEGIN
+        UPDATE relationship_app_book_fts
+        SET title = new.title, author = (SELECT name FROM relationship_app_author WHERE id = new.author_id)
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER relationship_app_book_fts_delete AFTER DELETE ON relationship_app_book BEGIN
+        DELETE FROM relationship_app_book_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER relationship_app_author_fts_insert AFTER INSERT ON relationship_app_author BEGIN
+        INSERT INTO relationship_app_author_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER relationship_app_author_fts_update AFTER UPDATE OF name ON relationship_app_author BEGIN
+        UPDATE relationship_app_author_fts SET name = new.name WHERE rowid = new.id;
+        UPDATE relationship_app_book_fts SET author = new.name
+        WHERE rowid IN (SELECT id FROM relationship_app_book WHERE author_id = new.id);
+    END""",
+    """CREATE TRIGGER relationship_app_author_fts_delete AFTER DELETE ON relationship_app_author BEGIN
+        DELETE FROM relationship_app_author_fts WHERE rowid = old.id;
+    END""",
+]
+
+BACKWARD = [
+    'DROP TRIGGER IF EXISTS relationship_app_author_fts_delete',
+    'DROP TRIGGER IF EXISTS relationship_app_author_fts_update',
+    'DROP TRIGGER IF EXISTS relationship_app_author_fts_insert',
+    'DROP TRIGGER IF EXISTS relationship_app_book_fts_delete',
+    'DROP TRIGGER IF EXISTS relationship_app_book_fts_update',
+    'DROP TRIGGER IF EXISTS relationship_app_book_fts_insert',
+    'DROP TABLE IF EXISTS relationship_app_author_fts',
+    'DROP TABLE IF EXISTS relationship_app_book_fts',
+]
+
+
+def run_sqlite(statements):
+    def operation(apps, schema_editor):
+        # FTS5 is SQLite-only; other backends fall back to LIKE search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('relationship_app', '0007_book_author_title_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(FORWARD), run_sqlite(BACKWARD)),
+    ]
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def set_journal_mode(apps, schema_editor):
+    """
+    Switch an SQLite database to settings.SQLITE_JOURNAL_MODE. The mode
+    persists in the file, so connections do not set it again.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    mode = getattr(settings, 'SQLITE_JOURNAL_MODE', 'wal').lower()
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA journal_mode')
+        if cursor.fetchone()[0] != mode:
+            cursor.execute(f'PRAGMA journal_mode={mode}')
+
+
+class Migration(migrations.Migration):
+    # The journal mode cannot change inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('relationship_app', '0010_job_heartbeat_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_journal_mode, migrations.RunPython.noop),
+    ]
@@ -1,41 +1,72 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 class Author(models.Model):
     """Author model with a name field"""
     name = models.CharField(max_length=100)
+    # Denormalized, maintained by relationship_app.signals
+    book_count = models.IntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.name
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name'], name='author_name_idx'),
+        ]
 
 
 class Book(models.Model):
     """Book model with title and ForeignKey relationship to Author"""
     title = models.CharField(max_length=200)
-    author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name='books')
+    # Indexed through book_author_title_uniq, which also serves author.books ordered by title
+    author = models.ForeignKey(Author, on_delete=models.CASCADE, related_name='books', db_index=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return f"{self.title} by {self.author.name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the loaded author so a reassignment can move the counters"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_author_id = instance.__dict__.get('author_id')
+        return instance
+    
     class Meta:
         ordering = ['title']
+        indexes = [
+            # Seek index for keyset pagination on (title, id)
+            models.Index(fields=['title', 'id'], name='book_title_id_idx'),
+        ]
+        constraints = [
+            # One row per (author, title); also the index for author.books ordered
+            # by title, and the conflict target for bulk imports
+            models.UniqueConstraint(fields=['author', 'title'], name='book_author_title_uniq'),
+        ]
 
 
 class Library(models.Model):
     """Library model with name and ManyToMany relationship to Books"""
     name = models.CharField(max_length=100)
     books = models.ManyToManyField(Book, related_name='libraries')
+    # Denormalized, maintained by relationship_app.signals
+    book_count = models.IntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     
     def __str__(self):
         return self.name
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name'], name='library_name_idx'),
+        ]
 
 
 class Librarian(models.Model):
@@ -48,6 +79,9 @@ class Librarian(models.Model):
     
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name'], name='librarian_name_idx'),
+        ]
 
 
 class UserProfile(models.Model):
@@ -61,21 +95,97 @@ class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='Member')
     
+    # Fields whose changes are worth writing back to the database
+    TRACKED_FIELDS = ('role',)
+    
     def __str__(self):
         return f"{self.user.username} - {self.role}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Snapshot the loaded values so save() can skip no-op writes"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._tracked_values()
+        return instance
+    
+    def _tracked_values(self):
+        return {name: self.__dict__.get(name) for name in self.TRACKED_FIELDS}
+    
+    def changed_fields(self):
+        """Names of tracked fields that differ from what was loaded"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return list(self.TRACKED_FIELDS)
+        current = self._tracked_values()
+        return [name for name in self.TRACKED_FIELDS if current[name] != loaded[name]]
+    
+    def save(self, *args, **kwargs):
+        """
+        Insert new profiles as usual, but only UPDATE existing ones when a
+        tracked field actually changed, and then only those columns.
+        """
+        if not self._state.adding and 'update_fields' not in kwargs and not kwargs.get('force_insert'):
+            changed = self.changed_fields()
+            if not changed:
+                return
+            kwargs['update_fields'] = changed
+        super().save(*args, **kwargs)
+        self._loaded_values = self._tracked_values()
+    
     class Meta:
         ordering = ['user__username']
 
 
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
-    """Signal to automatically create UserProfile when a new User is created"""
-    if created:
-        UserProfile.objects.create(user=instance)
+class Job(models.Model):
+    """A deferred call of a relationship_app.jobs task, run by manage.py run_workers"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    
+    task = models.CharField(max_length=100)
+    args = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # Higher runs first; within a priority, the earliest due first
+    priority = models.IntegerField(default=0)
+    run_at = models.DateTimeField()
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    worker = models.CharField(max_length=100, blank=True)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the worker while the job runs; see jobs.requeue_stale()
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"#{self.pk} {self.task} ({self.status})"
+    
+    class Meta:
+        ordering = ['-pk']
+        indexes = [
+            # The next due job: status = queued ORDER BY priority DESC, run_at
+            models.Index(fields=['status', '-priority', 'run_at'], name='job_due_idx'),
+        ]
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Signal to save UserProfile when User is saved"""
-    instance.profile.save()
\ No newline at end of file
+def create_user_profile(sender, instance, created, raw=False, **kwargs):
+    """
+    Signal to automatically create UserProfile when a new User is created.
+    Later User saves (e.g. the last_login update on every login) do not
+    touch the profile; role changes are saved on the profile itself.
+    Users created with bulk_create() get their profiles from
+    relationship_app.services.bulk_create_user_profiles().
+    """
+    if created and not raw:
+        UserProfile.objects.create(user=instance)
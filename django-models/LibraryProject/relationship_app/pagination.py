@@ -0,0 +1,258 @@
+"""
+Keyset (cursor) pagination for ordered querysets.
+
+Instead of OFFSET, every page is fetched with a seek predicate on the
+ordering columns plus the primary key, e.g. for Book (ordered by title):
+
+    WHERE title >= %s AND (title > %s OR (title = %s AND id > %s))
+    ORDER BY title, id LIMIT 51
+
+With an index on (title, id) the database jumps straight to the first row
+of the page, so page 10,000 costs the same as page 1. Cursors are opaque
+URL-safe tokens that encode the sort key of the boundary row and the
+direction to move in.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(InvalidPage):
+    """Raised when a cursor token cannot be decoded"""
+    pass
+
+
+class CursorPage:
+    """
+    A single page of results plus the cursors of its neighbours.
+    The query runs on first access, so a page that is only rendered
+    inside a cached template fragment never touches the database.
+    Async views load it ahead of rendering with ``await page.aload()``.
+    """
+
+    def __init__(self, queryset, finish, cursor=None):
+        self._queryset = queryset
+        self._finish = finish
+        self._result = None
+        self.cursor = cursor
+
+    def _load(self):
+        if self._result is None:
+            self._result = self._finish(list(self._queryset))
+        return self._result
+
+    async def aload(self):
+        """Fetch the page with the async ORM; later accesses do not query"""
+        if self._result is None:
+            self._result = self._finish([row async for row in self._queryset])
+        return self
+
+    @property
+    def loaded(self):
+        return self._result is not None
+
+    @property
+    def object_list(self):
+        return self._load()[0]
+
+    @property
+    def next_cursor(self):
+        return self._load()[1]
+
+    @property
+    def previous_cursor(self):
+        return self._load()[2]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        # Reject non-index keys up front: the template engine tries
+        # page['cursor'] before page.cursor and must not trigger the query.
+        if not isinstance(index, (int, slice)):
+            raise TypeError('CursorPage indices must be integers or slices.')
+        return self.object_list[index]
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset by seeking on its ordering columns.
+
+    The ordering defaults to the queryset's explicit order_by() or the
+    model's Meta.ordering, with the primary key appended as a tie-breaker
+    so every row has a unique sort key. Ordering fields must be concrete,
+    non-null columns on the model itself. Works with model instances and
+    with values() querysets (as long as the ordering fields are selected).
+    """
+
+    def __init__(self, queryset, per_page, ordering=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        opts = queryset.model._meta
+        ordering = ordering or queryset.query.order_by or opts.ordering
+        self.ordering = []
+        self._fields = []
+        for field_name in ordering:
+            descending = field_name.startswith('-')
+            name = field_name.lstrip('-')
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+            self.ordering.append((field.attname, descending))
+            self._fields.append(field)
+        if opts.pk.attname not in [name for name, _ in self.ordering]:
+            self.ordering.append((opts.pk.attname, False))
+            self._fields.append(opts.pk)
+
+    def page(self, cursor=None):
+        """
+        Return the CursorPage that follows (or precedes) ``cursor``.
+        The cursor is validated immediately; rows are fetched lazily.
+        """
+        if not cursor:
+            return CursorPage(self._order(self.queryset)[:self.per_page + 1], self._first_page)
+        direction, key = self.decode_cursor(cursor)
+        key = self._clean_key(key)
+        backwards = direction == 'prev'
+        queryset = self._order(self.queryset.filter(self._seek(key, backwards)), backwards)
+        return CursorPage(
+            queryset[:self.per_page + 1],
+            lambda rows: self._seek_page(rows, backwards),
+            cursor,
+        )
+
+    def _clean_key(self, key):
+        """
+        Convert the decoded sort key with the ordering fields' to_python(),
+        so a forged cursor is rejected instead of reaching the query
+        """
+        if len(key) != len(self.ordering):
+            raise InvalidCursor('Cursor does not match the queryset ordering.')
+        cleaned = []
+        for field, value in zip(self._fields, key):
+            if value is None or isinstance(value, (list, dict)):
+                raise InvalidCursor('Invalid cursor.')
+            try:
+                cleaned.append(field.to_python(value))
+            except (ValidationError, TypeError, ValueError):
+                raise InvalidCursor('Invalid cursor.')
+        return cleaned
+
+    def cursors(self, pages):
+        """
+        The cursors of pages 2 to ``pages``, as page.next_cursor gives
+        them, from one query over the sort keys of the preceding rows
+        """
+        names = [name for name, _ in self.ordering]
+        keys = self._order(self.queryset).values_list(*names)[:self.per_page * max(pages - 1, 0)]
+        return [
+            self.encode_cursor('next', list(key))
+            for index, key in enumerate(keys, 1) if index % self.per_page == 0
+        ]
+
+    def _first_page(self, rows):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        return rows, self._cursor_for(rows[-1], 'next') if has_more else None, None
+
+    def _seek_page(self, rows, backwards):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+        if not rows:
+            return rows, None, None
+        if backwards:
+            return (
+                rows,
+                self._cursor_for(rows[-1], 'next'),
+                self._cursor_for(rows[0], 'prev') if has_more else None,
+            )
+        return (
+            rows,
+            self._cursor_for(rows[-1], 'next') if has_more else None,
+            self._cursor_for(rows[0], 'prev'),
+        )
+
+    def _order(self, queryset, backwards=False):
+        order_by = []
+        for name, descending in self.ordering:
+            if descending != backwards:
+                order_by.append(f'-{name}')
+            else:
+                order_by.append(name)
+        return queryset.order_by(*order_by)
+
+    def _seek(self, key, backwards):
+        """Build the row-value comparison ``(f1, f2, ...) > (v1, v2, ...)``"""
+        def lookup(index):
+            name, descending = self.ordering[index]
+            return 'lt' if descending != backwards else 'gt'
+
+        predicate = Q()
+        for index in range(len(self.ordering)):
+            term = Q(**{f'{self.ordering[index][0]}__{lookup(index)}': key[index]})
+            for prior in range(index):
+                term &= Q(**{self.ordering[prior][0]: key[prior]})
+            predicate |= term
+        # The redundant bound on the leading column lets the database use
+        # the index range scan instead of evaluating the OR for every row.
+        first_name = self.ordering[0][0]
+        bound = Q(**{f'{first_name}__{lookup(0)}e': key[0]})
+        return bound & predicate
+
+    def _cursor_for(self, row, direction):
+        if isinstance(row, dict):
+            key = [row[name] for name, _ in self.ordering]
+        else:
+            key = [getattr(row, name) for name, _ in self.ordering]
+        return self.encode_cursor(direction, key)
+
+    @staticmethod
+    def encode_cursor(direction, key):
+        payload = json.dumps({'d': direction, 'k': key}, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            direction, key = payload['d'], payload['k']
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise InvalidCursor('Invalid cursor.')
+        if direction not in ('next', 'prev') or not isinstance(key, list):
+            raise InvalidCursor('Invalid cursor.')
+        return direction, key
+
+
+def paginate_by_cursor(request, queryset, per_page, param='cursor'):
+    """
+    Return the CursorPage selected by ``request.GET[param]``.
+    Raises Http404 for malformed cursors, like Django's ListView does
+    for invalid page numbers.
+    """
+    paginator = CursorPaginator(queryset, per_page)
+    try:
+        return paginator.page(request.GET.get(param))
+    except InvalidCursor as e:
+        raise Http404(str(e))
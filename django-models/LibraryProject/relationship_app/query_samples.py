@@ -4,6 +4,7 @@ Run this script in Django shell: python manage.py shell
 Then: exec(open('relationship_app/query_samples.py').read())
 """
 
+from relationship_app.importers import import_rows
 from relationship_app.models import Author, Book, Library, Librarian
 
 def query_all_books_by_author(author_name):
@@ -86,40 +87,17 @@ def create_sample_data():
     """
     print("Creating sample data...")
     
-    # Create authors
-    author1, created = Author.objects.get_or_create(name="J.K. Rowling")
-    author2, created = Author.objects.get_or_create(name="George Orwell")
-    author3, created = Author.objects.get_or_create(name="Jane Austen")
-    
-    # Create books
-    book1, created = Book.objects.get_or_create(
-        title="Harry Potter and the Philosopher's Stone", 
-        author=author1
-    )
-    book2, created = Book.objects.get_or_create(
-        title="Harry Potter and the Chamber of Secrets", 
-        author=author1
-    )
-    book3, created = Book.objects.get_or_create(
-        title="1984", 
-        author=author2
-    )
-    book4, created = Book.objects.get_or_create(
-        title="Animal Farm", 
-        author=author2
-    )
-    book5, created = Book.objects.get_or_create(
-        title="Pride and Prejudice", 
-        author=author3
-    )
-    
-    # Create libraries
-    library1, created = Library.objects.get_or_create(name="Central Library")
-    library2, created = Library.objects.get_or_create(name="Community Library")
-    
-    # Add books to libraries (ManyToMany relationship)
-    library1.books.add(book1, book2, book3, book5)
-    library2.books.add(book3, book4, book5)
+    # Authors, books and library memberships go through the bulk importer;
+    # re-running it touches the existing rows instead of duplicating them
+    import_rows([
+        {'title': "Harry Potter and the Philosopher's Stone", 'author': "J.K. Rowling", 'libraries': ["Central Library"]},
+        {'title': "Harry Potter and the Chamber of Secrets", 'author': "J.K. Rowling", 'libraries': ["Central Library"]},
+        {'title': "1984", 'author': "George Orwell", 'libraries': ["Central Library", "Community Library"]},
+        {'title': "Animal Farm", 'author': "George Orwell", 'libraries': ["Community Library"]},
+        {'title': "Pride and Prejudice", 'author': "Jane Austen", 'libraries': ["Central Library", "Community Library"]},
+    ])
+    library1 = Library.objects.get(name="Central Library")
+    library2 = Library.objects.get(name="Community Library")
     
     # Create librarians
     librarian1, created = Librarian.objects.get_or_create(
@@ -174,9 +152,8 @@ def advanced_queries():
     for author in authors_in_library:
         print(f"- {author.name}")
     
-    # Count books per author
-    from django.db.models import Count
-    authors_with_book_count = Author.objects.annotate(book_count=Count('books'))
+    # Count books per author (denormalized Author.book_count, no join needed)
+    authors_with_book_count = Author.objects.only('name', 'book_count')
     print(f"\nBooks per author:")
     for author in authors_with_book_count:
         print(f"- {author.name}: {author.book_count} books")
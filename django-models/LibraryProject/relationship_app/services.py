@@ -0,0 +1,224 @@
+"""
+Services shared by the relationship_app views and management commands.
+"""
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Count, F, Func, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .caching import acached, bump_model_version, cache_get, cache_set, cached, make_key, shared_cache
+from .models import Author, Book, Library, UserProfile
+
+logger = logging.getLogger(__name__)
+
+LIBRARY_SUMMARY_TIMEOUT = 300
+DASHBOARD_STATS_KEY = make_key('dashboard_stats')
+# Stale statistics are still served (and refreshed) for up to this long
+DASHBOARD_STATS_MAX_AGE = 3600
+
+
+def get_library_summary():
+    """
+    Return every library as a dict with ``id``, ``name`` and ``book_count``.
+    The counts are read from the denormalized Library.book_count column
+    and the result is cached until a library or its book collection changes.
+    """
+    return cached(
+        'library_summary',
+        lambda: list(_library_summary_rows()),
+        depends_on=(Library, Book),
+        timeout=LIBRARY_SUMMARY_TIMEOUT,
+    )
+
+
+def _library_summary_rows():
+    return Library.objects.values('id', 'name', 'book_count').order_by('name')
+
+
+async def aget_library_summary():
+    """Async counterpart of get_library_summary(), sharing its cache entry"""
+    async def compute():
+        return [row async for row in _library_summary_rows()]
+
+    return await acached(
+        'library_summary',
+        compute,
+        depends_on=(Library, Book),
+        timeout=LIBRARY_SUMMARY_TIMEOUT,
+    )
+
+
+def _dashboard_counters():
+    """The querysets counted on the admin dashboard, by name"""
+    counters = {
+        'total_users': UserProfile.objects.all(),
+        'total_books': Book.objects.all(),
+        'total_authors': Author.objects.all(),
+        'total_libraries': Library.objects.all(),
+    }
+    for role, _ in UserProfile.ROLE_CHOICES:
+        counters[f'role_{role}'] = UserProfile.objects.filter(role=role)
+    return counters
+
+
+def compute_dashboard_stats():
+    """
+    Count every dashboard counter in one round trip: a single SELECT of
+    scalar COUNT subqueries, one per queryset in _dashboard_counters().
+    Role counts are returned as ``users_by_role``, a list of
+    ``(label, count)`` pairs in UserProfile.ROLE_CHOICES order.
+    """
+    counters = _dashboard_counters()
+    columns, params = [], []
+    for name, queryset in counters.items():
+        # A plain COUNT(*) rather than an aggregate, so no GROUP BY is added
+        counted = queryset.order_by().annotate(n=Func(template='COUNT(*)', output_field=IntegerField()))
+        sql, query_params = counted.values('n').query.sql_with_params()
+        columns.append(f'({sql}) AS {connection.ops.quote_name(name)}')
+        params.extend(query_params)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(columns)}", params)
+        stats = dict(zip(counters, cursor.fetchone()))
+    stats['users_by_role'] = [
+        (label, stats.pop(f'role_{role}')) for role, label in UserProfile.ROLE_CHOICES
+    ]
+    return stats
+
+
+def refresh_dashboard_stats():
+    """Recompute the dashboard statistics and cache them with their timestamp"""
+    stats = compute_dashboard_stats()
+    cache_set(DASHBOARD_STATS_KEY, (stats, time.time()), DASHBOARD_STATS_MAX_AGE)
+    return stats
+
+
+def _refresh_and_close():
+    try:
+        refresh_dashboard_stats()
+    except Exception:
+        logger.exception('Refreshing the dashboard statistics failed')
+    finally:
+        connections.close_all()
+
+
+def _refresh_in_background(ttl):
+    # The lock lives in the shared tier, so one worker on the host refreshes per TTL
+    if shared_cache().add(f'{DASHBOARD_STATS_KEY}:refreshing', True, ttl):
+        threading.Thread(target=_refresh_and_close, name='dashboard-stats', daemon=True).start()
+
+
+def _cached_dashboard_stats():
+    entry = cache_get(DASHBOARD_STATS_KEY)
+    if entry is None:
+        return None
+    stats, computed_at = entry
+    ttl = getattr(settings, 'DASHBOARD_STATS_TTL', 30)
+    if time.time() - computed_at >= ttl:
+        _refresh_in_background(ttl)
+    return stats
+
+
+def dashboard_stats_version():
+    """
+    When the cached dashboard statistics were computed, as a string ('' if
+    none are cached), so conditional GETs notice a background refresh
+    """
+    entry = cache_get(DASHBOARD_STATS_KEY)
+    return '' if entry is None else repr(entry[1])
+
+
+def get_dashboard_stats():
+    """
+    The admin dashboard statistics from compute_dashboard_stats(). Once
+    cached they are always served from the cache; when older than
+    DASHBOARD_STATS_TTL seconds a background thread recomputes them, so
+    only the very first request waits on the counts.
+    """
+    stats = _cached_dashboard_stats()
+    if stats is None:
+        stats = refresh_dashboard_stats()
+    return stats
+
+
+async def aget_dashboard_stats():
+    """Async counterpart of get_dashboard_stats()"""
+    stats = await sync_to_async(_cached_dashboard_stats)()
+    if stats is None:
+        stats = await sync_to_async(refresh_dashboard_stats)()
+    return stats
+
+
+def invalidate_library_summary():
+    """Drop the cached library summary so the next read recomputes it"""
+    bump_model_version(Library)
+
+
+def _actual_book_counts():
+    """Correlated subqueries computing the true book counts per author and per library"""
+    per_author = Coalesce(Subquery(
+        Book.objects.filter(author=OuterRef('pk'))
+        .order_by().values('author').annotate(total=Count('pk')).values('total')
+    ), 0)
+    per_library = Coalesce(Subquery(
+        Library.books.through.objects.filter(library=OuterRef('pk'))
+        .order_by().values('library').annotate(total=Count('pk')).values('total')
+    ), 0)
+    return per_author, per_library
+
+
+def recount_book_counts(dry_run=False):
+    """
+    Repair drift in Author.book_count and Library.book_count.
+    Each model is fixed with one set-based UPDATE; returns the number of
+    rows that were out of date, keyed by model name.
+    """
+    per_author, per_library = _actual_book_counts()
+    with transaction.atomic():
+        drifted_authors = Author.objects.alias(actual=per_author).exclude(book_count=F('actual'))
+        drifted_libraries = Library.objects.alias(actual=per_library).exclude(book_count=F('actual'))
+        drift = {
+            'authors': drifted_authors.count(),
+            'libraries': drifted_libraries.count(),
+        }
+        if not dry_run:
+            if drift['authors']:
+                Author.objects.filter(pk__in=drifted_authors.values('pk')).update(
+                    book_count=per_author, updated_at=timezone.now(),
+                )
+                bump_model_version(Author)
+            if drift['libraries']:
+                Library.objects.filter(pk__in=drifted_libraries.values('pk')).update(
+                    book_count=per_library, updated_at=timezone.now(),
+                )
+                invalidate_library_summary()
+    return drift
+
+
+def refresh_book_counts(author_ids=(), library_ids=()):
+    """
+    Recompute Author.book_count and Library.book_count for just the given
+    rows, with one set-based UPDATE per model. Used after bulk writes
+    that bypass the signals; the caller bumps the cache versions.
+    """
+    per_author, per_library = _actual_book_counts()
+    now = timezone.now()
+    if author_ids:
+        Author.objects.filter(pk__in=author_ids).update(book_count=per_author, updated_at=now)
+    if library_ids:
+        Library.objects.filter(pk__in=library_ids).update(book_count=per_library, updated_at=now)
+
+
+def bulk_create_user_profiles(users, role='Member', batch_size=1000):
+    """
+    Create profiles for users inserted with User.objects.bulk_create(),
+    which does not send post_save. Users that already have a profile are
+    skipped, so the call is safe to repeat.
+    """
+    profiles = (UserProfile(user_id=user.pk, role=role) for user in users)
+    return UserProfile.objects.bulk_create(profiles, batch_size=batch_size, ignore_conflicts=True)
@@ -0,0 +1,148 @@
+"""
+Signal handlers that keep denormalized counters and cache versions
+in step with the database. Connected in RelationshipAppConfig.ready().
+
+Counters are adjusted with F() expressions so concurrent writers cannot
+lose updates. Bulk operations that bypass signals (bulk_create,
+queryset.update) can be repaired with ``manage.py recount_library_stats``.
+"""
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import autocomplete
+from .caching import bump_model_version
+from .models import Author, Book, Librarian, Library, UserProfile
+
+
+def _adjust(model, pks, delta):
+    # updated_at is touched too, since queryset.update() skips auto_now
+    if pks and delta:
+        model.objects.filter(pk__in=pks).update(book_count=F('book_count') + delta, updated_at=timezone.now())
+
+
+@receiver(pre_save, sender=Book)
+def book_saving(sender, instance, **kwargs):
+    """
+    Read the stored author of a book loaded without it (only(), defer())
+    or built with an existing pk, so book_saved can tell if it moved
+    """
+    if getattr(instance, '_loaded_author_id', None) is not None:
+        return
+    if instance._state.adding and instance.pk is None:
+        return
+    if 'author_id' in instance.get_deferred_fields():
+        # Never assigned, so it cannot have changed
+        return
+    instance._loaded_author_id = (
+        Book.objects.filter(pk=instance.pk).values_list('author_id', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Book)
+def book_saved(sender, instance, created, **kwargs):
+    """Count a new book against its author, or move it when the author changes"""
+    if 'author_id' in instance.get_deferred_fields():
+        return
+    previous = getattr(instance, '_loaded_author_id', None)
+    if created:
+        _adjust(Author, [instance.author_id], 1)
+    elif previous is not None and previous != instance.author_id:
+        _adjust(Author, [previous], -1)
+        _adjust(Author, [instance.author_id], 1)
+    instance._loaded_author_id = instance.author_id
+
+
+@receiver(pre_delete, sender=Book)
+def book_deleting(sender, instance, **kwargs):
+    """Remember which libraries hold the book before its memberships are deleted"""
+    instance._library_ids = list(instance.libraries.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted(sender, instance, **kwargs):
+    """Deleting a book removes it from its author and every library without firing m2m_changed"""
+    _adjust(Author, [instance.author_id], -1)
+    _adjust(Library, getattr(instance, '_library_ids', []), -1)
+
+
+@receiver(m2m_changed, sender=Library.books.through)
+def library_books_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep Library.book_count in step with additions to and removals from Library.books"""
+    if action == 'pre_clear':
+        # library.books.clear() / book.libraries.clear(): capture what is about to go
+        if reverse:
+            instance._cleared_library_ids = list(instance.libraries.values_list('pk', flat=True))
+        return
+    if action == 'pre_remove':
+        # remove() passes every id it was given, members or not; keep the members
+        if reverse:
+            members = sender.objects.filter(book_id=instance.pk, library_id__in=pk_set).values_list('library_id')
+        else:
+            members = sender.objects.filter(library_id=instance.pk, book_id__in=pk_set).values_list('book_id')
+        instance._removed_pks = {pk for pk, in members}
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if action == 'post_clear':
+        if reverse:
+            _adjust(Library, getattr(instance, '_cleared_library_ids', []), -1)
+        else:
+            Library.objects.filter(pk=instance.pk).update(book_count=0, updated_at=timezone.now())
+    else:
+        delta = 1 if action == 'post_add' else -1
+        if action == 'post_remove':
+            pk_set = instance.__dict__.pop('_removed_pks', pk_set)
+        if reverse:
+            # book.libraries.add(...): every library in pk_set gains one book
+            _adjust(Library, pk_set, delta)
+        else:
+            _adjust(Library, [instance.pk], delta * len(pk_set or ()))
+    bump_model_version(Library, Book)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=Library)
+@receiver(post_delete, sender=Library)
+@receiver(post_save, sender=Librarian)
+@receiver(post_delete, sender=Librarian)
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def catalogue_changed(sender, **kwargs):
+    """Invalidate every cached value that depends on the changed model"""
+    bump_model_version(sender)
+
+
+# The autocomplete receivers are connected after catalogue_changed and
+# library_books_changed, so the version bump they accept is this change's.
+AUTOCOMPLETE_FIELDS = {Book: ('book', 'title'), Author: ('author', 'name')}
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+def autocomplete_saved(sender, instance, **kwargs):
+    """Re-index a saved title or name in this process's prefix index"""
+    kind, field = AUTOCOMPLETE_FIELDS[sender]
+    autocomplete.index.add(kind, instance.pk, getattr(instance, field))
+    autocomplete.index.synced(sender)
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+def autocomplete_deleted(sender, instance, **kwargs):
+    """Drop a deleted title or name from this process's prefix index"""
+    kind, _ = AUTOCOMPLETE_FIELDS[sender]
+    autocomplete.index.remove(kind, instance.pk)
+    autocomplete.index.synced(sender)
+
+
+@receiver(m2m_changed, sender=Library.books.through)
+def autocomplete_memberships_changed(sender, action, **kwargs):
+    """Library membership changes bump the Book version but not any title"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        autocomplete.index.synced(Book)
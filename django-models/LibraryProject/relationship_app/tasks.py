@@ -0,0 +1,93 @@
+"""
+Slow operations as relationship_app.jobs tasks. Queue one with
+``task.enqueue(...)``; call it directly to run it inline.
+
+The bulk tasks take a queryset when run inline, and the
+bulk.describe_selection() of one when queued, so that a large selection
+is queued as its filter rather than its keys. The relationship_app.bulk
+operation then works through it a chunk at a time, so that no statement
+exceeds SQLite's bound parameter limit.
+"""
+import os
+
+from . import bulk
+from .exporters import author_rows, book_rows, export_blocks, library_book_rows
+from .importers import import_file
+from .jobs import task
+from .models import Author, Book, Library
+from .services import recount_book_counts, refresh_dashboard_stats
+from .warming import DEFAULT_BOOK_PAGES, DEFAULT_LIBRARIES, warm, warming_plan
+
+# Interactive work first
+HIGH = 10
+LOW = -10
+
+
+def _instance(model, value):
+    # Inline runs from the admin pass the instance it already looked up; queued jobs carry the pk
+    return value if isinstance(value, model) else model.objects.get(pk=value)
+
+
+@task(priority=HIGH)
+def reassign_books(books, author):
+    return bulk.reassign_books(bulk.selection(Book, books), _instance(Author, author))
+
+
+@task(priority=HIGH)
+def add_books_to_library(books, library):
+    return bulk.add_books_to_library(bulk.selection(Book, books), _instance(Library, library))
+
+
+@task(priority=HIGH)
+def remove_books_from_library(books, library):
+    return bulk.remove_books_from_library(bulk.selection(Book, books), _instance(Library, library))
+
+
+@task(priority=HIGH)
+def delete_books(books):
+    return bulk.delete_books(bulk.selection(Book, books))
+
+
+@task
+def import_catalogue(path, fmt=None):
+    """Import a catalogue file; returns the ImportStats as a dict"""
+    stats = import_file(path, fmt)
+    return {
+        'rows': stats.rows, 'books': stats.books, 'authors_created': stats.authors_created,
+        'libraries_created': stats.libraries_created, 'memberships': stats.memberships,
+        'seconds': round(stats.elapsed, 2),
+    }
+
+
+@task
+def export_catalogue(path, dataset='books', fmt='csv', library_id=None):
+    """Write an export to ``path``; returns its size in bytes"""
+    if dataset == 'library-books':
+        rows = library_book_rows(library_id)
+    else:
+        rows = author_rows() if dataset == 'authors' else book_rows()
+    with open(path, 'w', newline='', encoding='utf-8') as handle:
+        for block in export_blocks(rows, fmt):
+            handle.write(block)
+    return os.path.getsize(path)
+
+
+@task(priority=LOW)
+def recount(dry_run=False):
+    """Repair Author/Library.book_count; returns the drift found"""
+    return recount_book_counts(dry_run=dry_run)
+
+
+@task(priority=LOW)
+def refresh_dashboard():
+    refresh_dashboard_stats()
+
+
+@task(priority=LOW)
+def warm_caches(libraries=DEFAULT_LIBRARIES, book_pages=DEFAULT_BOOK_PAGES, threads=None):
+    """Warm the catalogue page caches; returns the pages warmed and the hit ratio"""
+    stats = warm(warming_plan(libraries, book_pages), threads)
+    return {
+        'warmed': stats.warmed, 'failed': len(stats.failed), 'hit_ratio': round(stats.hit_ratio, 3),
+        'seconds': round(stats.elapsed, 2),
+    }
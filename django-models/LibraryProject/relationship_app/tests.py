@@ -1,3 +1,1561 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import json
+import os
+import tempfile
+import threading
+import time
+import types
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.admin import site
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.core.paginator import EmptyPage
+from django.db import connection, connections, transaction
+from django.db.models.signals import post_delete
+from django.http import HttpResponse
+from django.template.backends.django import Template as DjangoTemplate
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.signals import template_rendered
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, resolve, reverse
+
+from . import async_views, autocomplete, bulk, changelist, jobs, services, tasks, urls, views, warming
+from .autocomplete import DEFAULT_CHECK_INTERVAL, PrefixIndex
+from .caching import HOT_ALIAS, SHARED_ALIAS, bump_model_version, cache_get, cache_set, cached, make_key
+from .importers import CatalogueImportError, import_file, import_rows
+from .middleware import QueryInstrumentationMiddleware
+from .models import Author, Book, Job, Librarian, Library, UserProfile
+from .pagination import CursorPaginator, InvalidCursor
+from .search import AUTHOR_INDEX, BOOK_INDEX
+from .services import (
+    bulk_create_user_profiles, compute_dashboard_stats, get_dashboard_stats, get_library_summary,
+    recount_book_counts,
+)
+
+
+def clear_caches():
+    """Empty both cache tiers"""
+    for alias in (HOT_ALIAS, SHARED_ALIAS):
+        caches[alias].clear()
+
+
+class CursorPaginatorTests(TestCase):
+    """Keyset pagination over Book's (title, id) ordering"""
+
+    @classmethod
+    def setUpTestData(cls):
+        authors = [Author.objects.create(name="Author A"), Author.objects.create(name="Author B")]
+        # Duplicate titles (by different authors) make sure the id tie-breaker is honoured
+        Book.objects.bulk_create(
+            Book(title=f"Title {i // 2:03d}", author=authors[i % 2]) for i in range(25)
+        )
+        cls.expected = list(Book.objects.order_by('title', 'id').values_list('id', flat=True))
+
+    def walk_forward(self, paginator):
+        ids, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            ids.extend(book.id for book in page)
+            if not page.has_next:
+                return ids
+            cursor = page.next_cursor
+
+    def test_forward_walk_visits_every_row_once(self):
+        """Following next cursors yields every book exactly once, in order"""
+        self.assertEqual(self.walk_forward(CursorPaginator(Book.objects.all(), 7)), self.expected)
+
+    def test_previous_cursor_returns_preceding_page(self):
+        """The previous cursor of page 2 leads back to page 1"""
+        paginator = CursorPaginator(Book.objects.all(), 7)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        back = paginator.page(second.previous_cursor)
+        self.assertEqual([b.id for b in back], [b.id for b in first])
+        self.assertFalse(back.has_previous)
+        self.assertTrue(back.has_next)
+
+    def test_values_queryset(self):
+        """Dict rows from values() can be paginated as well"""
+        paginator = CursorPaginator(Book.objects.values('id', 'title'), 10)
+        page = paginator.page(paginator.page().next_cursor)
+        self.assertEqual([row['id'] for row in page], self.expected[10:20])
+
+    def test_cursors_match_next_cursors(self):
+        """cursors() gives the cursors a walk through the pages would"""
+        paginator = CursorPaginator(Book.objects.all(), 7)
+        cursors, page = [], paginator.page()
+        while page.has_next:
+            cursors.append(page.next_cursor)
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(paginator.cursors(4), cursors)
+        self.assertEqual(paginator.cursors(2), cursors[:1])
+
+    def test_invalid_cursor(self):
+        """Malformed cursors raise InvalidCursor"""
+        with self.assertRaises(InvalidCursor):
+            CursorPaginator(Book.objects.all(), 7).page('not-a-cursor')
+
+    def test_list_books_invalid_cursor_is_404(self):
+        """The list view answers 404 to a malformed cursor"""
+        user = User.objects.create_user('reader', password='pass12345')
+        self.client.force_login(user)
+        response = self.client.get(reverse('relationship_app:list_books'), {'cursor': '!!'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_forged_cursor_keys_are_invalid(self):
+        """Well-formed cursors with wrong-typed or null keys are rejected like malformed ones"""
+        self.client.force_login(User.objects.create_user('reader', password='pass12345'))
+        for key in ([['x'], 1], [None, None], ['Title', 'abc'], ['Title']):
+            cursor = CursorPaginator.encode_cursor('next', key)
+            with self.subTest(key=key):
+                with self.assertRaises(InvalidCursor):
+                    CursorPaginator(Book.objects.all(), 7).page(cursor)
+                for name, status in (('list_books', 404), ('api_books', 400)):
+                    response = self.client.get(reverse(f'relationship_app:{name}'), {'cursor': cursor})
+                    self.assertEqual(response.status_code, status)
+
+
+class LibraryDetailQueryTests(TestCase):
+    """LibraryDetailView must not issue one query per book"""
+
+    # session + user + conditional-GET probe + library/librarian + books/authors
+    EXPECTED_QUERIES = 5
+
+    def setUp(self):
+        clear_caches()
+        self.client.force_login(User.objects.create_user('reader', password='pass12345'))
+
+    def make_library(self, name, book_count):
+        library = Library.objects.create(name=name)
+        Librarian.objects.create(name=f"{name} Librarian", library=library)
+        authors = Author.objects.bulk_create(Author(name=f"{name} Author {i}") for i in range(book_count))
+        books = Book.objects.bulk_create(
+            Book(title=f"{name} Book {i}", author=author) for i, author in enumerate(authors)
+        )
+        library.books.add(*books)
+        return library
+
+    def assertDetailQueries(self, library):
+        url = reverse('relationship_app:library_detail', args=[library.pk])
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_is_constant(self):
+        """The same number of queries is used for 1 book and for 30 books"""
+        self.assertDetailQueries(self.make_library("Small", 1))
+        response = self.assertDetailQueries(self.make_library("Large", 30))
+        self.assertContains(response, "Large Book 29 by Large Author 29")
+        self.assertContains(response, "Large Librarian")
+
+    def test_library_without_librarian(self):
+        """A library with no librarian still renders"""
+        library = Library.objects.create(name="Unstaffed")
+        self.assertDetailQueries(library)
+
+
+class LibrarySummaryTests(TestCase):
+    """Annotated, cached book counts for the dashboards"""
+
+    def setUp(self):
+        clear_caches()
+        user = User.objects.create_user('librarian', password='pass12345')
+        user.profile.role = 'Librarian'
+        user.profile.save()
+        self.client.force_login(user)
+        self.author = Author.objects.create(name="Author")
+
+    def make_libraries(self, count):
+        start = Library.objects.count()
+        for i in range(start, start + count):
+            library = Library.objects.create(name=f"Branch {i:03d}")
+            library.books.add(Book.objects.create(title=f"Book {i}", author=self.author))
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('relationship_app:librarian_view'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_librarian_view_query_count_is_constant(self):
+        """Book counts do not cost one query per library"""
+        self.make_libraries(2)
+        clear_caches()
+        few = self.count_queries()
+        self.make_libraries(20)
+        clear_caches()
+        self.assertEqual(self.count_queries(), few)
+
+    def test_summary_counts(self):
+        """Each library reports how many books it holds"""
+        self.make_libraries(2)
+        summary = get_library_summary()
+        self.assertEqual([row['book_count'] for row in summary], [1, 1])
+
+    def test_m2m_change_invalidates_summary(self):
+        """Adding a book to a library refreshes the cached count"""
+        self.make_libraries(1)
+        self.assertEqual(get_library_summary()[0]['book_count'], 1)
+        library = Library.objects.get()
+        library.books.add(Book.objects.create(title="Another", author=self.author))
+        self.assertEqual(get_library_summary()[0]['book_count'], 2)
+        library.books.clear()
+        self.assertEqual(get_library_summary()[0]['book_count'], 0)
+
+
+class DashboardStatsTests(TestCase):
+    """Admin dashboard counters: one query, served from the cache"""
+
+    def setUp(self):
+        clear_caches()
+        for username, role in [('admin', 'Admin'), ('ann', 'Member'), ('bob', 'Member')]:
+            user = User.objects.create_user(username, password='pass12345')
+            user.profile.role = role
+            user.profile.save()
+        library = Library.objects.create(name="Central Library")
+        library.books.add(Book.objects.create(title="Animal Farm", author=Author.objects.create(name="George Orwell")))
+
+    def test_counts_in_one_query(self):
+        """Totals and the role breakdown come from a single SELECT"""
+        with self.assertNumQueries(1):
+            stats = compute_dashboard_stats()
+        self.assertEqual(
+            stats,
+            {
+                'total_users': 3, 'total_books': 1, 'total_authors': 1, 'total_libraries': 1,
+                'users_by_role': [('Admin', 1), ('Librarian', 0), ('Member', 2)],
+            },
+        )
+
+    def test_stale_stats_are_served_and_refreshed_in_background(self):
+        """Expired statistics are returned at once while a thread recomputes them"""
+        self.assertEqual(get_dashboard_stats()['total_books'], 1)
+        Book.objects.create(title="1984", author=Author.objects.get())
+        with self.assertNumQueries(0):
+            self.assertEqual(get_dashboard_stats()['total_books'], 1)
+
+        stats, computed_at = cache_get(services.DASHBOARD_STATS_KEY)
+        cache_set(services.DASHBOARD_STATS_KEY, (stats, computed_at - 60))
+        with mock.patch.object(services.threading, 'Thread') as thread:
+            with self.assertNumQueries(0):
+                self.assertEqual(get_dashboard_stats()['total_books'], 1)
+            # Only one refresh is started until the lock expires
+            get_dashboard_stats()
+        thread.return_value.start.assert_called_once_with()
+        thread.call_args.kwargs['target']()
+        self.assertEqual(get_dashboard_stats()['total_books'], 2)
+
+    def test_background_refresh_changes_admin_etag(self):
+        """A client holding the dashboard's ETag gets the refreshed statistics, not a 304"""
+        self.client.force_login(User.objects.get(username='admin'))
+        url = reverse('relationship_app:admin_view')
+        get_dashboard_stats()
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        stats, computed_at = cache_get(services.DASHBOARD_STATS_KEY)
+        cache_set(services.DASHBOARD_STATS_KEY, (dict(stats, total_books=2), computed_at + 1))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['total_books'], 2)
+
+    def test_admin_view(self):
+        """The dashboard renders the cached counters"""
+        self.client.force_login(User.objects.get(username='admin'))
+        response = self.client.get(reverse('relationship_app:admin_view'))
+        self.assertEqual(response.context['total_users'], 3)
+        self.assertContains(response, 'Member Users')
+
+
+class BookCountSignalTests(TestCase):
+    """Author.book_count and Library.book_count follow every write path"""
+
+    def setUp(self):
+        self.orwell = Author.objects.create(name="George Orwell")
+        self.austen = Author.objects.create(name="Jane Austen")
+        self.library = Library.objects.create(name="Central Library")
+
+    def assertCounts(self, orwell, austen, library):
+        self.assertEqual(
+            [Author.objects.get(pk=self.orwell.pk).book_count,
+             Author.objects.get(pk=self.austen.pk).book_count,
+             Library.objects.get(pk=self.library.pk).book_count],
+            [orwell, austen, library],
+        )
+
+    def test_book_create_reassign_delete(self):
+        """Author counters follow creation, reassignment and deletion"""
+        book = Book.objects.create(title="1984", author=self.orwell)
+        Book.objects.create(title="Animal Farm", author=self.orwell)
+        self.assertCounts(2, 0, 0)
+        book = Book.objects.get(pk=book.pk)
+        book.author = self.austen
+        book.save()
+        self.assertCounts(1, 1, 0)
+        book.delete()
+        self.assertCounts(1, 0, 0)
+
+    def test_library_membership(self):
+        """Library counters follow add, remove, clear and book deletion"""
+        farm = Book.objects.create(title="Animal Farm", author=self.orwell)
+        novel = Book.objects.create(title="1984", author=self.orwell)
+        self.library.books.add(farm, novel)
+        self.library.books.add(farm)  # already present, must not double count
+        self.assertCounts(2, 0, 2)
+        self.library.books.remove(novel)
+        self.assertCounts(2, 0, 1)
+        novel.libraries.add(self.library)
+        self.assertCounts(2, 0, 2)
+        novel.libraries.clear()
+        self.assertCounts(2, 0, 1)
+        farm.delete()
+        self.assertCounts(1, 0, 0)
+        self.library.books.add(novel)
+        self.library.books.clear()
+        self.assertCounts(1, 0, 0)
+
+    def test_removing_non_members_changes_nothing(self):
+        """remove() only counts the books that were in the library, from either side"""
+        farm = Book.objects.create(title="Animal Farm", author=self.orwell)
+        novel = Book.objects.create(title="1984", author=self.orwell)
+        self.library.books.add(farm)
+        self.library.books.remove(farm, novel)
+        self.assertCounts(2, 0, 0)
+        self.library.books.remove(novel)
+        novel.libraries.remove(self.library)
+        self.assertCounts(2, 0, 0)
+
+    def test_reassign_with_deferred_author(self):
+        """A book loaded without its author still moves between authors' counts"""
+        book = Book.objects.create(title="1984", author=self.orwell)
+        book = Book.objects.only('title').get(pk=book.pk)
+        book.author = self.austen
+        book.save()
+        self.assertCounts(0, 1, 0)
+        book = Book.objects.only('title').get(pk=book.pk)
+        book.title = "Nineteen Eighty-Four"
+        # The author was never assigned, so it is neither read nor moved
+        with self.assertNumQueries(1):
+            book.save()
+        self.assertCounts(0, 1, 0)
+
+    def test_reassign_by_existing_pk(self):
+        """A new instance with an existing pk updates that book and moves its count"""
+        book = Book.objects.create(title="1984", author=self.orwell)
+        Book(pk=book.pk, title="1984", author=self.austen).save()
+        self.assertCounts(0, 1, 0)
+        # With a pk no book has yet, it is an insert
+        Book(pk=book.pk + 100, title="Emma", author=self.austen).save()
+        self.assertCounts(0, 2, 0)
+
+    def test_recount_repairs_drift(self):
+        """recount_library_stats fixes counters skipped by bulk_create"""
+        books = Book.objects.bulk_create([
+            Book(title="Emma", author=self.austen),
+            Book(title="Persuasion", author=self.austen),
+        ])
+        self.library.books.through.objects.bulk_create(
+            self.library.books.through(library=self.library, book=book) for book in books
+        )
+        self.assertCounts(0, 0, 0)
+        out = StringIO()
+        call_command('recount_library_stats', stdout=out)
+        self.assertIn('1 authors repaired', out.getvalue())
+        self.assertCounts(0, 2, 2)
+
+
+class UserProfileLifecycleTests(TestCase):
+    """Profiles are written only when they actually change"""
+
+    def test_login_does_not_touch_profile(self):
+        """The last_login update on login issues no profile query"""
+        User.objects.create_user('reader', password='pass12345')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(self.client.login(username='reader', password='pass12345'))
+        self.assertFalse([q for q in queries if 'relationship_app_userprofile' in q['sql']])
+
+    def test_unchanged_profile_save_is_skipped(self):
+        """Saving an unchanged profile is a no-op, a changed one updates only its role"""
+        user = User.objects.create_user('reader', password='pass12345')
+        profile = UserProfile.objects.get(user=user)
+        with self.assertNumQueries(0):
+            profile.save()
+        profile.role = 'Admin'
+        with CaptureQueriesContext(connection) as queries:
+            profile.save()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(UserProfile.objects.get(user=user).role, 'Admin')
+
+    def test_bulk_created_users_get_profiles(self):
+        """bulk_create_user_profiles fills in profiles for bulk-created users"""
+        users = User.objects.bulk_create(User(username=f"user{i}") for i in range(5))
+        with self.assertNumQueries(1):
+            bulk_create_user_profiles(users, role='Librarian')
+        bulk_create_user_profiles(users)  # existing profiles are left alone
+        self.assertEqual(UserProfile.objects.filter(role='Librarian').count(), 5)
+
+
+class RoleRequiredTests(TestCase):
+    """role_required and the profile-loading auth backend"""
+
+    def setUp(self):
+        clear_caches()
+
+    def login_as(self, role):
+        user = User.objects.create_user(role.lower(), password='pass12345')
+        user.profile.role = role
+        user.profile.save()
+        self.client.force_login(user)
+
+    def test_role_check_costs_no_extra_query(self):
+        """The user and profile arrive in one query; the role check adds none"""
+        self.login_as('Member')
+        Book.objects.create(title="Animal Farm", author=Author.objects.create(name="George Orwell"))
+        # session + user/profile + conditional-GET probe + one page of books
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('relationship_app:member_view'))
+        self.assertContains(response, '<strong>Role:</strong> Member', html=False)
+
+    def test_wrong_role_redirects_to_login(self):
+        """Users without the required role are sent to the login page"""
+        self.login_as('Member')
+        response = self.client.get(reverse('relationship_app:admin_view'))
+        self.assertRedirects(
+            response, '/relationship/login/?next=/relationship/admin/', fetch_redirect_response=False
+        )
+
+    def test_anonymous_redirects_to_login(self):
+        """Anonymous users are sent to the login page"""
+        response = self.client.get(reverse('relationship_app:librarian_view'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_user_without_profile(self):
+        """A user with no profile has no role instead of raising"""
+        user = User.objects.create_user('orphan', password='pass12345')
+        UserProfile.objects.filter(user=user).delete()
+        self.client.force_login(user)
+        response = self.client.get(reverse('relationship_app:member_view'))
+        self.assertEqual(response.status_code, 302)
+
+
+class TieredCacheTests(TestCase):
+    """Hot/shared cache tiers and model-versioned keys"""
+
+    def setUp(self):
+        clear_caches()
+
+    def test_tests_use_local_memory(self):
+        """The tests never clear the real file or database cache"""
+        self.assertIsInstance(caches[SHARED_ALIAS], LocMemCache)
+
+    def test_default_timeout(self):
+        """Without a timeout, values expire after the configured TIMEOUT, not never"""
+        with mock.patch.object(caches[SHARED_ALIAS], 'set') as shared_set:
+            cache_set('relationship_app:test', 42)
+            cached('answer', lambda: 42)
+        self.assertEqual(shared_set.call_count, 2)
+        for call in shared_set.call_args_list:
+            self.assertIs(call.args[2], DEFAULT_TIMEOUT)
+
+    def test_shared_tier_refills_hot_tier(self):
+        """A value evicted from the hot tier is served from the shared tier"""
+        cache_set('relationship_app:test', 42)
+        caches[HOT_ALIAS].clear()
+        self.assertEqual(cache_get('relationship_app:test'), 42)
+        self.assertEqual(caches[HOT_ALIAS].get('relationship_app:test'), 42)
+
+    def test_model_change_rotates_key(self):
+        """Saving a model changes the keys that depend on it"""
+        before = make_key('authors', depends_on=(Author,))
+        self.assertEqual(make_key('authors', depends_on=(Author,)), before)
+        Author.objects.create(name="New Author")
+        self.assertNotEqual(make_key('authors', depends_on=(Author,)), before)
+
+    def test_cached_recomputes_after_change(self):
+        """cached() serves the stored value until a dependency changes"""
+        compute = lambda: Author.objects.count()
+        self.assertEqual(cached('author_count', compute, depends_on=(Author,)), 0)
+        with self.assertNumQueries(0):
+            self.assertEqual(cached('author_count', compute, depends_on=(Author,)), 0)
+        Author.objects.create(name="New Author")
+        self.assertEqual(cached('author_count', compute, depends_on=(Author,)), 1)
+
+
+class FragmentCacheTests(TestCase):
+    """Cached catalogue fragments skip the database and follow model changes"""
+
+    # session + user/profile + conditional-GET probe
+    AUTH_QUERIES = 3
+
+    def setUp(self):
+        clear_caches()
+        self.client.force_login(User.objects.create_user('reader', password='pass12345'))
+        self.author = Author.objects.create(name="George Orwell")
+        self.book = Book.objects.create(title="Animal Farm", author=self.author)
+        self.library = Library.objects.create(name="Central Library")
+        self.library.books.add(self.book)
+
+    def test_cached_list_page_skips_catalogue_queries(self):
+        """A second request for the same page only runs the auth and probe queries"""
+        url = reverse('relationship_app:list_books')
+        self.client.get(url)
+        with self.assertNumQueries(self.AUTH_QUERIES):
+            response = self.client.get(url)
+        self.assertContains(response, "Animal Farm by George Orwell")
+
+    def test_book_save_invalidates_list_page(self):
+        """Renaming a book shows up on the next request"""
+        url = reverse('relationship_app:list_books')
+        self.client.get(url)
+        self.book.title = "Nineteen Eighty-Four"
+        self.book.save()
+        self.assertContains(self.client.get(url), "Nineteen Eighty-Four by George Orwell")
+
+    def test_library_detail_cached_and_invalidated_by_m2m(self):
+        """Library pages are cached per library and refreshed by m2m changes"""
+        url = reverse('relationship_app:library_detail', args=[self.library.pk])
+        self.client.get(url)
+        with self.assertNumQueries(self.AUTH_QUERIES):
+            self.client.get(url)
+        self.library.books.add(Book.objects.create(title="1984", author=self.author))
+        self.assertContains(self.client.get(url), "1984 by George Orwell")
+
+    def test_fragments_are_shared_between_processes(self):
+        """A fragment another process rendered is served from the shared tier"""
+        url = reverse('relationship_app:library_detail', args=[self.library.pk])
+        self.client.get(url)
+        caches[HOT_ALIAS].clear()
+        with self.assertNumQueries(self.AUTH_QUERIES):
+            self.assertContains(self.client.get(url), "Animal Farm by George Orwell")
+
+    def test_missing_library_is_404(self):
+        """The lazily loaded library still 404s when it does not exist"""
+        url = reverse('relationship_app:library_detail', args=[self.library.pk + 100])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+    """ETag / Last-Modified validators on the catalogue views"""
+
+    def setUp(self):
+        clear_caches()
+        self.user = User.objects.create_user('reader', password='pass12345')
+        self.client.force_login(self.user)
+        self.author = Author.objects.create(name="George Orwell")
+        self.book = Book.objects.create(title="Animal Farm", author=self.author)
+        self.url = reverse('relationship_app:list_books')
+
+    def test_unchanged_catalogue_returns_304(self):
+        """Repeating a request with the returned validators gives 304 without rendering"""
+        response = self.client.get(self.url)
+        self.assertTrue(response.has_header('ETag'))
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(response.templates)
+
+    def test_change_and_delete_invalidate_etag(self):
+        """Saving or deleting a book changes the ETag"""
+        etag = self.client.get(self.url)['ETag']
+        self.book.title = "1984"
+        self.book.save()
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.book.delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=changed['ETag']).status_code, 200)
+
+    def test_m2m_change_bumps_library_updated_at(self):
+        """Adding a book to a library moves its updated_at forward"""
+        library = Library.objects.create(name="Central Library")
+        before = Library.objects.get(pk=library.pk).updated_at
+        library.books.add(self.book)
+        self.assertGreater(Library.objects.get(pk=library.pk).updated_at, before)
+
+    def test_dashboard_etag_varies_by_user(self):
+        """Personalised dashboards never share a validator between users"""
+        url = reverse('relationship_app:member_view')
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(User.objects.create_user('other', password='pass12345'))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+
+class HotQueryIndexTests(TestCase):
+    """Guard against index regressions on the hot queries"""
+
+    def test_hot_queries_use_indexes(self):
+        """explain_hot_queries finds no full scans or unindexed sorts"""
+        out = StringIO()
+        call_command('explain_hot_queries', stdout=out)
+        self.assertIn('All hot queries use an index.', out.getvalue())
+
+
+class CatalogueImportTests(TestCase):
+    """Bulk import keeps counters right and is idempotent"""
+
+    CSV = (
+        'title,author,libraries\n'
+        'Emma,Jane Austen,Central Library;Community Library\n'
+        'Persuasion,Jane Austen,\n'
+        '1984,George Orwell,Central Library\n'
+        'Emma,Jane Austen,Central Library\n'
+    )
+
+    def import_csv(self):
+        out = StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write(self.CSV)
+        self.addCleanup(os.unlink, handle.name)
+        call_command('import_catalogue', handle.name, '--chunk-size', '2', stdout=out)
+        return out.getvalue()
+
+    def test_import_creates_rows_and_counters(self):
+        """Authors, libraries and memberships are created and counted"""
+        self.assertIn('Imported 4 rows', self.import_csv())
+        self.assertEqual(Book.objects.count(), 3)
+        austen = Author.objects.get(name='Jane Austen')
+        self.assertEqual(austen.book_count, 2)
+        central = Library.objects.get(name='Central Library')
+        self.assertEqual(central.book_count, 2)
+        self.assertEqual(Library.objects.get(name='Community Library').book_count, 1)
+
+    def test_reimport_is_idempotent(self):
+        """Importing the same file twice does not duplicate anything"""
+        self.import_csv()
+        self.import_csv()
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Library.objects.get(name='Central Library').books.count(), 2)
+
+    def test_rows_need_title_and_author(self):
+        """Malformed rows are rejected instead of importing blanks"""
+        with self.assertRaises(CatalogueImportError):
+            import_rows([{'title': 'Untitled', 'author': ''}])
+
+    def test_rows_must_be_objects_of_text(self):
+        """JSON Lines rows of the wrong shape are reported, not a traceback"""
+        for line in ['["Emma", "Jane Austen"]', '42', '{"title": 1984, "author": "George Orwell"}',
+                     '{"title": "Emma", "author": {"name": "Jane Austen"}}',
+                     '{"title": "Emma", "author": "Jane Austen", "libraries": [1]}']:
+            with self.subTest(line), self.assertRaisesMessage(CatalogueImportError, 'Row 1'):
+                import_file('rows.jsonl', stream=StringIO(line + '\n'))
+        self.assertFalse(Book.objects.exists())
+
+
+class CatalogueExportTests(TestCase):
+    """Streaming exports share one pipeline between views and command"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='pass12345')
+        import_rows([
+            {'title': 'Emma', 'author': 'Jane Austen', 'libraries': ['Central Library']},
+            {'title': '1984', 'author': 'George Orwell', 'libraries': []},
+        ])
+        cls.library = Library.objects.get(name='Central Library')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_books_csv(self):
+        """Books stream as CSV with a header, in id order"""
+        response = self.client.get(reverse('relationship_app:export_books', args=['csv']))
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = self.read(response).splitlines()
+        self.assertEqual(lines[0], 'id,title,author')
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['Emma', '1984'])
+
+    def test_library_books_jsonl(self):
+        """A library's books stream as JSON Lines; unknown libraries 404"""
+        url = reverse('relationship_app:export_library_books', args=[self.library.pk, 'jsonl'])
+        rows = [json.loads(line) for line in self.read(self.client.get(url)).splitlines()]
+        self.assertEqual([row['title'] for row in rows], ['Emma'])
+
+        missing = reverse('relationship_app:export_library_books', args=[self.library.pk + 100, 'jsonl'])
+        self.assertEqual(self.client.get(missing).status_code, 404)
+        unknown = reverse('relationship_app:export_books', args=['xml'])
+        self.assertEqual(self.client.get(unknown).status_code, 404)
+
+    def test_command_matches_view(self):
+        """export_catalogue writes the same bytes as the view"""
+        out = StringIO()
+        call_command('export_catalogue', 'authors', '--format', 'jsonl', stdout=out)
+        response = self.client.get(reverse('relationship_app:export_authors', args=['jsonl']))
+        self.assertEqual(out.getvalue(), self.read(response))
+        self.assertIn('"book_count": 1', out.getvalue())
+
+
+class JsonApiTests(TestCase):
+    """The JSON API reads values() rows in a fixed number of queries"""
+
+    # session + user/profile + conditional-GET probe
+    OVERHEAD_QUERIES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('client', password='pass12345')
+        import_rows(
+            {'title': f'Book {i:02d}', 'author': f'Author {i % 3}', 'libraries': ['Central Library']}
+            for i in range(12)
+        )
+        cls.library = Library.objects.get()
+        Librarian.objects.create(name='Ada', library=cls.library)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        clear_caches()
+
+    def get(self, name, expected_queries=None, pk=None, **params):
+        url = reverse(f'relationship_app:api_{name}_detail', args=[pk]) if pk else reverse(f'relationship_app:api_{name}')
+        if expected_queries is None:
+            return self.client.get(url, params)
+        with self.assertNumQueries(self.OVERHEAD_QUERIES + expected_queries):
+            return self.client.get(url, params)
+
+    def test_sparse_fields_and_pagination(self):
+        """?fields= trims attributes; cursors walk the whole list in order"""
+        response = self.get('books', fields='title', limit=5)
+        body = response.json()
+        self.assertEqual(body['data'][0], {'id': body['data'][0]['id'], 'title': 'Book 00'})
+        titles = [row['title'] for row in body['data']]
+        while body['next']:
+            body = self.client.get(body['next']).json()
+            titles += [row['title'] for row in body['data']]
+        self.assertEqual(titles, [f'Book {i:02d}' for i in range(12)])
+
+    def test_includes_use_constant_queries(self):
+        """to-one includes are JOINed and to-many includes cost one query each"""
+        response = self.get('books', 2, include='author,libraries')
+        book = response.json()['data'][0]
+        self.assertEqual(book['author']['name'], 'Author 0')
+        self.assertEqual(book['libraries'], [{'id': self.library.pk, 'name': 'Central Library'}])
+
+        response = self.get('libraries', 2, pk=self.library.pk, include='librarian,books')
+        library = response.json()['data']
+        self.assertEqual(library['librarian']['name'], 'Ada')
+        self.assertEqual(len(library['books']), 12)
+
+    def test_errors(self):
+        """Bad parameters are 400s, missing objects 404s, anonymous users 401s"""
+        self.assertEqual(self.get('books', fields='isbn').status_code, 400)
+        self.assertEqual(self.get('books', include='publisher').status_code, 400)
+        self.assertEqual(self.get('books', cursor='garbage').status_code, 400)
+        self.assertEqual(self.get('authors', pk=999).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.get('books').status_code, 401)
+
+
+class FullTextSearchTests(TestCase):
+    """FTS5 search stays in sync with writes and backs the admin search"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.orwell = Author.objects.create(name='George Orwell')
+        Book.objects.create(title='Animal Farm', author=cls.orwell)
+        Book.objects.create(title='Nineteen Eighty-Four', author=cls.orwell)
+        Book.objects.create(title='Farmer Giles of Ham', author=Author.objects.create(name='J.R.R. Tolkien'))
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass12345')
+
+    def test_ranked_prefix_search(self):
+        """Title matches outrank author matches; the last word is a prefix"""
+        titles = [book.title for book in BOOK_INDEX.search(Book.objects.all(), 'farm')]
+        self.assertEqual(titles, ['Animal Farm', 'Farmer Giles of Ham'])
+        titles = [book.title for book in BOOK_INDEX.search(Book.objects.all(), 'orwell anim')]
+        self.assertEqual(titles, ['Animal Farm'])
+        self.assertEqual(BOOK_INDEX.search(Book.objects.all(), '"*'), [])
+
+    def test_triggers_follow_writes(self):
+        """Renames, bulk inserts and deletes reach the index"""
+        self.orwell.name = 'Eric Blair'
+        self.orwell.save()
+        self.assertEqual(len(BOOK_INDEX.search(Book.objects.all(), 'blair')), 2)
+        self.assertEqual([a.name for a in AUTHOR_INDEX.search(Author.objects.all(), 'eric')], ['Eric Blair'])
+
+        Book.objects.bulk_create([Book(title='Burmese Days', author=self.orwell)])
+        self.assertEqual(len(BOOK_INDEX.search(Book.objects.all(), 'burmese')), 1)
+        Book.objects.filter(title='Burmese Days').delete()
+        self.assertEqual(BOOK_INDEX.search(Book.objects.all(), 'burmese'), [])
+
+    def test_search_view(self):
+        """The search page lists ranked books and authors"""
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('relationship_app:search'), {'q': 'orwell'})
+        self.assertContains(response, 'Animal Farm by George Orwell')
+        self.assertContains(response, 'George Orwell (2 books)')
+
+    def test_admin_search_uses_fts(self):
+        """Admin changelist searches query the FTS table instead of LIKE"""
+        self.client.force_login(self.admin)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('admin:relationship_app_book_changelist'), {'q': 'animal'})
+        self.assertContains(response, 'Animal Farm')
+        sql = ' '.join(query['sql'] for query in queries)
+        self.assertIn('relationship_app_book_fts', sql)
+        self.assertNotIn('LIKE', sql)
+
+
+class AutocompleteTests(TestCase):
+    """The prefix index answers from memory and follows model changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.orwell = Author.objects.create(name='George Orwell')
+        Book.objects.create(title='Animal Farm', author=cls.orwell)
+        Book.objects.create(title='The Farmer', author=Author.objects.create(name='Émile Zola'))
+
+    def setUp(self):
+        clear_caches()
+        # Check the model versions on every lookup
+        autocomplete.index.check_interval = 0
+        self.addCleanup(setattr, autocomplete.index, 'check_interval', DEFAULT_CHECK_INTERVAL)
+        autocomplete.index.build()
+
+    def labels(self, prefix, index=None):
+        return [result['label'] for result in (index or autocomplete.index).lookup(prefix)]
+
+    def test_word_prefixes_and_ranking(self):
+        """Label-start matches rank before matches on later words; accents are ignored"""
+        self.assertEqual(self.labels('farm'), ['Animal Farm', 'The Farmer'])
+        Book.objects.create(title='Farmhouse Tales', author=self.orwell)
+        self.assertEqual(self.labels('farm'), ['Farmhouse Tales', 'Animal Farm', 'The Farmer'])
+        self.assertEqual(self.labels('EMI'), ['Émile Zola'])
+
+    def test_incremental_updates_skip_rebuild(self):
+        """Saves and deletes in this process update the index without queries"""
+        book = Book.objects.create(title='Burmese Days', author=self.orwell)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels('burm'), ['Burmese Days'])
+        book.title = 'Coming Up for Air'
+        book.save()
+        book.libraries.add(Library.objects.create(name='Central Library'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels('burm'), [])
+            self.assertEqual(self.labels('coming up'), ['Coming Up for Air'])
+        book.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.labels('air'), [])
+
+    def test_rebuilds_after_changes_elsewhere(self):
+        """A version bump from another process or a bulk import triggers a rebuild"""
+        Book.objects.bulk_create([Book(title='Homage to Catalonia', author=self.orwell)])
+        bump_model_version(Book)
+        self.assertEqual(self.labels('homage'), ['Homage to Catalonia'])
+
+    def test_change_elsewhere_during_a_local_save_rebuilds(self):
+        """A local save does not take another process's bump as its own"""
+        self.labels('homage')
+        Book.objects.bulk_create([Book(title='Homage to Catalonia', author=self.orwell)])
+        bump_model_version(Book)
+        Book.objects.create(title='Burmese Days', author=self.orwell)
+        self.assertEqual(self.labels('homage'), ['Homage to Catalonia'])
+        self.assertEqual(self.labels('burm'), ['Burmese Days'])
+
+    def test_bounded_index_falls_back_to_fts(self):
+        """A truncated index still answers through the FTS5 search"""
+        index = PrefixIndex(max_entries=3)
+        index.build()
+        self.assertTrue(index.truncated)
+        self.assertLessEqual(len(index), 3)
+        self.assertIn('The Farmer', self.labels('farm', index))
+
+    def test_lookups_continue_during_rebuild(self):
+        """A rebuild loads outside the lookup lock; lookups answer from the old entries"""
+        index = PrefixIndex(check_interval=0)
+        index.build()
+        Book.objects.bulk_create([Book(title='Homage to Catalonia', author=self.orwell)])
+        bump_model_version(Book)
+        during = []
+        load = index._rebuild
+
+        def rebuild():
+            # Another thread looking up while this one loads neither waits nor rebuilds
+            thread = threading.Thread(target=lambda: during.append(self.labels('homage', index)))
+            thread.start()
+            thread.join(timeout=5)
+            self.assertFalse(thread.is_alive())
+            load()
+
+        with mock.patch.object(index, '_rebuild', side_effect=rebuild) as mocked:
+            self.assertEqual(self.labels('homage', index), ['Homage to Catalonia'])
+        self.assertEqual(mocked.call_count, 1)
+        self.assertEqual(during, [[]])
+
+    def test_view(self):
+        """The endpoint needs a signed-in user and only queries for the session"""
+        url = reverse('relationship_app:autocomplete')
+        self.assertEqual(self.client.get(url, {'q': 'orw'}).status_code, 302)
+        self.client.force_login(User.objects.create_user('reader', password='pass12345'))
+        # session + user
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'q': 'orw'})
+        self.assertEqual(response.json(), {'results': [{'type': 'author', 'id': self.orwell.pk, 'label': 'George Orwell'}]})
+
+
+class AdminChangelistTests(TestCase):
+    """Changelists cost the same few queries however large the tables grow"""
+
+    # session + user, then the count and the page; the small Librarian
+    # changelist also makes Django's unfiltered total count
+    QUERIES = {'author': 4, 'book': 4, 'library': 4, 'librarian': 5}
+
+    def setUp(self):
+        clear_caches()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass12345'))
+
+    def populate(self, count):
+        for i in range(Author.objects.count(), count):
+            author = Author.objects.create(name=f'Author {i:03d}')
+            library = Library.objects.create(name=f'Branch {i:03d}')
+            library.books.add(Book.objects.create(title=f'Book {i:03d}', author=author))
+            Librarian.objects.create(name=f'Librarian {i:03d}', library=library)
+
+    def assertChangelistQueries(self, model_name):
+        url = reverse(f'admin:relationship_app_{model_name}_changelist')
+        for count in (3, 40):
+            self.populate(count)
+            self.assertEqual(self.client.get(url).status_code, 200)  # caches the filter choices
+            with self.assertNumQueries(self.QUERIES[model_name]):
+                self.client.get(url)
+
+    def test_author_changelist(self):
+        self.assertChangelistQueries('author')
+
+    def test_book_changelist(self):
+        self.assertChangelistQueries('book')
+
+    def test_library_changelist(self):
+        self.assertChangelistQueries('library')
+
+    def test_librarian_changelist(self):
+        self.assertChangelistQueries('librarian')
+
+    def test_filter_offers_top_choices_and_the_selected_one(self):
+        """Only the most prolific authors are listed, plus a selected other one"""
+        self.populate(5)
+        for name in ('Author 002', 'Author 003'):
+            Book.objects.create(title=f'Another by {name}', author=Author.objects.get(name=name))
+        top = [(author.pk, author.name) for author in Author.objects.filter(name__in=['Author 002', 'Author 003'])]
+        url = reverse('admin:relationship_app_book_changelist')
+        with mock.patch.object(changelist, 'FILTER_CHOICES', 2):
+            self.assertEqual(self.client.get(url).context['cl'].filter_specs[0].lookup_choices, top)
+            other = Author.objects.get(name='Author 000')
+            response = self.client.get(url, {'author__id__exact': other.pk})
+        self.assertEqual(response.context['cl'].filter_specs[0].lookup_choices, top + [(other.pk, 'Author 000')])
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_estimated_count(self):
+        """Past the limit the count is estimated from the primary keys, or capped when filtered"""
+        self.populate(12)
+        with mock.patch.object(changelist, 'COUNT_LIMIT', 5):
+            with self.assertNumQueries(3):
+                self.assertEqual(changelist.EstimatedCountPaginator(Book.objects.all(), 10).count, 12)
+            self.assertEqual(
+                changelist.EstimatedCountPaginator(Book.objects.filter(title__startswith='Book'), 10).count, 5,
+            )
+            self.assertEqual(changelist.EstimatedCountPaginator(Book.objects.filter(title='Book 001'), 10).count, 1)
+
+    def test_short_last_page_corrects_the_estimate(self):
+        """Gaps in the keys inflate the estimate; the last page's rows bring it back down"""
+        self.populate(12)
+        Book.objects.filter(title__in=['Book 003', 'Book 004', 'Book 005', 'Book 006']).delete()
+        with mock.patch.object(changelist, 'COUNT_LIMIT', 5):
+            paginator = changelist.EstimatedCountPaginator(Book.objects.order_by('pk'), 5)
+            self.assertEqual((paginator.count, paginator.num_pages), (12, 3))
+            self.assertEqual(len(paginator.page(2)), 3)
+            self.assertEqual((paginator.count, paginator.num_pages), (8, 2))
+            with self.assertRaises(EmptyPage):
+                changelist.EstimatedCountPaginator(Book.objects.order_by('pk'), 5).page(3)
+
+            url = reverse('admin:relationship_app_book_changelist')
+            with mock.patch.object(site._registry[Book], 'list_per_page', 5):
+                self.assertEqual(self.client.get(url, {'p': 2}).context['cl'].result_count, 8)
+            self.assertEqual(self.client.get(url).context['cl'].result_count, 8)
+
+
+class BulkActionTests(TestCase):
+    """Bulk actions run a fixed number of statements per chunk and keep the counters right"""
+
+    def setUp(self):
+        clear_caches()
+        self.old, self.new = Author.objects.create(name='Old'), Author.objects.create(name='New')
+        self.library = Library.objects.create(name='Central')
+        Book.objects.bulk_create(Book(title=f'Book {i:03d}', author=self.old) for i in range(25))
+        recount_book_counts()
+        self.books = Book.objects.all()
+
+    def assertCountsAccurate(self):
+        self.assertEqual(recount_book_counts(dry_run=True), {'authors': 0, 'libraries': 0})
+
+    def test_reassign_in_chunks(self):
+        # The chunk bounds, then per chunk: its pks, savepoint, previous
+        # authors, UPDATE books, UPDATE authors, release
+        with mock.patch.object(bulk, 'BULK_CHUNK_SIZE', 10), self.assertNumQueries(1 + 2 * 6):
+            self.assertEqual(bulk.reassign_books(self.books.filter(title__lt='Book 020'), self.new), 20)
+        self.assertEqual(Book.objects.filter(author=self.new).count(), 20)
+        self.assertEqual((Author.objects.get(pk=self.new.pk).book_count, Author.objects.get(pk=self.old.pk).book_count), (20, 5))
+        self.assertCountsAccurate()
+
+    def test_library_membership_in_chunks(self):
+        with mock.patch.object(bulk, 'BULK_CHUNK_SIZE', 10):
+            self.assertEqual(bulk.add_books_to_library(self.books.filter(title__lt='Book 015'), self.library), 15)
+            # Already present rows are skipped, not duplicated
+            self.assertEqual(bulk.add_books_to_library(self.books, self.library), 10)
+            self.assertEqual(self.library.books.count(), 25)
+            self.assertEqual(bulk.remove_books_from_library(self.books.filter(title__gte='Book 020'), self.library), 5)
+        self.assertEqual(Library.objects.get(pk=self.library.pk).book_count, 20)
+        self.assertCountsAccurate()
+
+    def test_delete_in_chunks(self):
+        self.library.books.add(*self.books[:12])
+        with mock.patch.object(bulk, 'BULK_CHUNK_SIZE', 10):
+            self.assertEqual(bulk.delete_books(self.books.filter(title__lt='Book 020')), 20)
+        self.assertEqual(Book.objects.count(), 5)
+        self.assertFalse(Library.books.through.objects.exists())
+        self.assertEqual(Library.objects.get(pk=self.library.pk).book_count, 0)
+        self.assertCountsAccurate()
+        self.assertFalse(BOOK_INDEX.filter(Book.objects.all(), 'Book 003').exists())
+
+    def test_chunk_bounds(self):
+        pks = list(self.books.exclude(title='Book 005').order_by('pk').values_list('pk', flat=True))
+        bounds = bulk.chunk_bounds(self.books.exclude(title='Book 005'), 10)
+        self.assertEqual(bounds, [[pks[0], pks[9]], [pks[10], pks[19]], [pks[20], pks[23]]])
+        self.assertEqual(bulk.chunk_bounds(self.books.none(), 10), [])
+
+    def test_delete_issues_one_statement_per_chunk(self):
+        """delete_books() relies on the private QuerySet._raw_delete() to skip collecting the rows"""
+        receiver = mock.Mock()
+        post_delete.connect(receiver, sender=Book)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Book)
+        with mock.patch.object(bulk, 'BULK_CHUNK_SIZE', 10), CaptureQueriesContext(connection) as queries:
+            bulk.delete_books(self.books)
+        deletes = [q['sql'] for q in queries if q['sql'].startswith('DELETE')]
+        self.assertEqual(len([sql for sql in deletes if 'relationship_app_book"' in sql.split('WHERE')[0]]), 3)
+        self.assertEqual(len([sql for sql in deletes if 'library_books' in sql.split('WHERE')[0]]), 3)
+        self.assertEqual(len(deletes), 6)
+        receiver.assert_not_called()
+
+    def test_bulk_writes_invalidate_cached_pages(self):
+        self.client.force_login(User.objects.create_user('reader', password='pass12345'))
+        url = reverse('relationship_app:list_books')
+        self.assertContains(self.client.get(url), 'by Old')
+        bulk.reassign_books(self.books, self.new)
+        self.assertNotContains(self.client.get(url), 'by Old')
+
+    def test_admin_actions(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass12345'))
+        url = reverse('admin:relationship_app_book_changelist')
+        choices = self.client.get(url).context['action_form'].fields['action'].choices
+        self.assertNotIn('delete_selected', [name for name, _ in choices])
+        data = {'_selected_action': list(self.books.values_list('pk', flat=True)[:3])}
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(url, {**data, 'action': 'reassign_author', 'author': self.new.pk})
+        self.assertEqual(Author.objects.get(pk=self.new.pk).book_count, 3)
+        # The author id is looked up once, by the action form
+        lookups = [q for q in queries if q['sql'].startswith('SELECT "relationship_app_author"."id"')]
+        self.assertEqual(len(lookups), 1)
+
+        for field, value in (('author', 99999), ('author', 'abc'), ('library', 99999)):
+            action = 'reassign_author' if field == 'author' else 'add_to_library'
+            response = self.client.post(url, {**data, 'action': action, field: value}, follow=True)
+            self.assertContains(response, f'{field.capitalize()} id: Select a valid choice.')
+            self.assertNotContains(response, 'No action selected.')
+        self.client.post(url, {**data, 'action': 'add_to_library', 'library': self.library.pk})
+        self.assertEqual(Library.objects.get(pk=self.library.pk).book_count, 3)
+
+        response = self.client.post(url, {**data, 'action': 'delete_books'}, follow=True)
+        self.assertContains(response, 'Confirm delete: This field is required.')
+        self.assertEqual(Book.objects.count(), 25)
+        self.client.post(url, {**data, 'action': 'delete_books', 'confirm': 'on'})
+        self.assertEqual(Book.objects.count(), 22)
+        self.assertCountsAccurate()
+
+
+calls = []
+
+
+@jobs.task(name='tests.record', max_attempts=2)
+def record(value):
+    calls.append(value)
+    if value == 'fail':
+        raise RuntimeError('task failed')
+    return {'value': value}
+
+
+@jobs.task(name='tests.unserialisable')
+def unserialisable():
+    return {'books': {1, 2}}
+
+
+class JobQueueTests(TestCase):
+    """Jobs run once each, by priority, with retries; all on SQLite"""
+
+    def setUp(self):
+        calls.clear()
+
+    def test_priority_order_and_results(self):
+        low = jobs.enqueue('tests.record', ['low'], priority=-1)
+        jobs.enqueue('tests.record', ['normal'])
+        jobs.enqueue('tests.record', ['high'], priority=5)
+        later = jobs.enqueue('tests.record', ['later'], delay=60)
+        self.assertEqual(jobs.work(burst=True), 3)
+        self.assertEqual(calls, ['high', 'normal', 'low'])
+        low.refresh_from_db()
+        self.assertEqual((low.status, low.attempts, low.result), (Job.DONE, 1, {'value': 'low'}))
+        self.assertEqual(Job.objects.get(pk=later.pk).status, Job.QUEUED)
+
+    def test_retry_then_fail(self):
+        job = record.enqueue('fail')
+        with self.assertLogs('relationship_app.jobs', 'WARNING'):
+            jobs.work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('RuntimeError: task failed', job.error)
+        # Not due until the retry delay has passed
+        self.assertEqual(jobs.work(burst=True), 0)
+        Job.objects.filter(pk=job.pk).update(run_at=job.created_at)
+        with self.assertLogs('relationship_app.jobs', 'ERROR'):
+            jobs.work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(calls, ['fail', 'fail'])
+
+    def test_a_job_is_claimed_once(self):
+        job = record.enqueue('once')
+        self.assertEqual(jobs.claim('worker-1'), job)
+        self.assertIsNone(jobs.claim('worker-2'))
+
+    def test_enqueue_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                record.enqueue_on_commit('committed')
+                self.assertFalse(Job.objects.exists())
+        self.assertEqual(list(Job.objects.values_list('args', flat=True)), [['committed']])
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(ValueError):
+            with transaction.atomic():
+                record.enqueue_on_commit('rolled back')
+                raise ValueError
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_unserialisable_result_fails_the_job(self):
+        job = unserialisable.enqueue()
+        with self.assertLogs('relationship_app.jobs', 'ERROR'):
+            jobs.work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 1))
+        self.assertIn('TypeError', job.error)
+
+    def test_outcome_of_a_requeued_job_is_not_recorded(self):
+        """A worker does not overwrite a job requeue_stale() has since handed to another worker"""
+        job = record.enqueue('slow')
+
+        def taken_over(value):
+            Job.objects.filter(pk=job.pk).update(worker='elsewhere:1')
+            return value
+
+        with mock.patch.dict(jobs.registry, {'tests.record': taken_over}), \
+                self.assertLogs('relationship_app.jobs', 'WARNING'):
+            jobs.work(burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.result), (Job.RUNNING, 'elsewhere:1', None))
+
+    def test_requeue_stale(self):
+        """Only jobs whose heartbeat stopped are requeued, however long they have run"""
+        stale, slow, legacy = record.enqueue('stale'), record.enqueue('slow'), record.enqueue('legacy')
+        jobs.claim('dead'), jobs.claim('alive'), jobs.claim('old')
+        hours_ago = stale.created_at - timedelta(hours=2)
+        Job.objects.filter(pk=stale.pk).update(started_at=hours_ago, heartbeat_at=hours_ago)
+        Job.objects.filter(pk=slow.pk).update(started_at=hours_ago)
+        # Claimed before heartbeats were recorded
+        Job.objects.filter(pk=legacy.pk).update(started_at=hours_ago, heartbeat_at=None)
+        self.assertEqual(jobs.requeue_stale(timeout=3600), 2)
+        self.assertEqual(Job.objects.get(pk=stale.pk).status, Job.QUEUED)
+        self.assertEqual(Job.objects.get(pk=legacy.pk).status, Job.QUEUED)
+        self.assertEqual(Job.objects.get(pk=slow.pk).status, Job.RUNNING)
+
+    @override_settings(JOB_HEARTBEAT_INTERVAL=0.01)
+    def test_heartbeat_while_running(self):
+        """run() refreshes the heartbeat while the task runs, and stops afterwards"""
+        beats = threading.Event()
+
+        @jobs.task(name='tests.wait_for_heartbeat')
+        def wait_for_heartbeat():
+            return beats.wait(5)
+
+        self.addCleanup(jobs.registry.pop, 'tests.wait_for_heartbeat')
+        job = wait_for_heartbeat.enqueue()
+        # The heartbeat thread has its own connection, which cannot see
+        # this test's transaction
+        with mock.patch.object(jobs, '_beat', side_effect=lambda pk: beats.set()) as beat:
+            jobs.work(burst=True)
+            count = beat.call_count
+            time.sleep(0.05)
+        self.assertEqual(Job.objects.get(pk=job.pk).result, True)
+        beat.assert_called_with(job.pk)
+        self.assertEqual(beat.call_count, count)
+
+    @override_settings(BULK_BACKGROUND_THRESHOLD=2)
+    def test_large_admin_selections_become_jobs(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass12345'))
+        old, new = Author.objects.create(name='Old'), Author.objects.create(name='New')
+        books = [Book.objects.create(title=f'Book {i}', author=old).pk for i in range(3)]
+        response = self.client.post(
+            reverse('admin:relationship_app_book_changelist'),
+            {'_selected_action': books, 'action': 'reassign_author', 'author': new.pk}, follow=True,
+        )
+        job = Job.objects.get()
+        self.assertContains(response, f'3 books will be reassigned to New by background job {job.pk}.')
+        self.assertEqual((job.task, job.priority), ('relationship_app.tasks.reassign_books', tasks.HIGH))
+        self.assertEqual(Author.objects.get(pk=new.pk).book_count, 0)
+        jobs.work(burst=True)
+        self.assertEqual(Author.objects.get(pk=new.pk).book_count, 3)
+        self.assertEqual(Job.objects.get().result, 3)
+
+    @override_settings(BULK_BACKGROUND_THRESHOLD=2)
+    def test_select_across_is_queued_as_its_filter(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass12345'))
+        old, new = Author.objects.create(name='Old'), Author.objects.create(name='New')
+        books = [Book.objects.create(title=f'Book {i}', author=old).pk for i in range(3)]
+        Book.objects.create(title='Other', author=new)
+        self.client.post(
+            reverse('admin:relationship_app_book_changelist') + f'?author__id__exact={old.pk}',
+            {'_selected_action': books[:1], 'select_across': '1', 'action': 'reassign_author', 'author': new.pk},
+        )
+        selection = Job.objects.get().args[0]
+        self.assertEqual(set(selection), {'sql', 'params', 'last'})
+        # Rows added after the action are not part of the selection
+        late = Book.objects.create(title='Late', author=old)
+        jobs.work(burst=True)
+        self.assertEqual(Job.objects.get().result, 3)
+        self.assertEqual(Book.objects.get(pk=late.pk).author, old)
+        self.assertEqual(Author.objects.get(pk=new.pk).book_count, 4)
+
+    def test_background_import(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('title,author,libraries\nDune,Frank Herbert,Central\n')
+        self.addCleanup(os.remove, handle.name)
+        out = StringIO()
+        call_command('import_catalogue', handle.name, '--background', stdout=out)
+        self.assertIn('Queued as job', out.getvalue())
+        self.assertFalse(Book.objects.exists())
+        jobs.work(burst=True)
+        self.assertEqual(Job.objects.get().result['books'], 1)
+        self.assertTrue(Book.objects.filter(title='Dune', libraries__name='Central').exists())
+
+
+class JournalModeTests(TestCase):
+    """WAL is set once by a migration, not by every connection"""
+
+    def file_connection(self):
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        self.addCleanup(lambda: [os.remove(name) for name in (path, f'{path}-wal', f'{path}-shm') if os.path.exists(name)])
+        default = connections['default']
+        wrapper = type(default)({**default.settings_dict, 'NAME': path})
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def journal_mode(self, wrapper):
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            return cursor.fetchone()[0]
+
+    def test_connections_leave_the_mode_alone(self):
+        self.assertEqual(self.journal_mode(self.file_connection()), 'delete')
+
+    def test_migration_switches_to_wal(self):
+        migration = importlib.import_module('relationship_app.migrations.0011_sqlite_journal_mode')
+        wrapper = self.file_connection()
+        migration.set_journal_mode(None, types.SimpleNamespace(connection=wrapper))
+        self.assertEqual(self.journal_mode(wrapper), 'wal')
+
+
+class InstrumentationTests(TestCase):
+    """Server-Timing query/template figures and N+1 detection"""
+
+    def setUp(self):
+        clear_caches()
+        author = Author.objects.create(name='George Orwell')
+        for i in range(4):
+            library = Library.objects.create(name=f'Branch {i}')
+            library.books.add(Book.objects.create(title=f'Book {i}', author=author))
+
+    def timings(self, response):
+        return dict(
+            (entry.split(';')[0], entry) for entry in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing_counts_queries_and_templates(self):
+        """The header reports the request's query count and template time"""
+        user = User.objects.create_user('member', password='pass12345')
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('relationship_app:list_books'))
+        timings = self.timings(response)
+        self.assertIn(f'desc="{len(queries)} queries"', timings['db'])
+        self.assertRegex(timings['tpl'], r'dur=\d+\.\d\d')
+        self.assertNotIn('nplus1', timings)
+
+    def test_repeated_statements_are_flagged(self):
+        """A per-row count in a loop, like {{ library.books.count }}, is logged as an N+1"""
+        def view(request):
+            counts = [library.books.count() for library in Library.objects.all()]
+            return HttpResponse(str(counts))
+
+        middleware = QueryInstrumentationMiddleware(view)
+        with self.assertLogs('relationship_app.instrumentation', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/libraries/'))
+        self.assertIn('nplus1;desc="1 repeated statements"', response['Server-Timing'])
+        self.assertIn('ran 4 times', logs.output[0])
+
+    def test_repeated_lookups_are_flagged(self):
+        """Statements are counted by their SQL text, so repeating one with the same parameters counts too"""
+        middleware = QueryInstrumentationMiddleware(
+            lambda request: HttpResponse(str([Book.objects.filter(pk=1).exists() for _ in range(3)]))
+        )
+        with self.assertLogs('relationship_app.instrumentation', 'WARNING') as logs:
+            middleware(RequestFactory().get('/books/'))
+        self.assertIn('ran 3 times', logs.output[0])
+
+    def test_templates_are_timed_only_during_sampled_requests(self):
+        """Template.render is wrapped while a sampled request runs, and restored afterwards"""
+        render = DjangoTemplate.render
+        seen = []
+        middleware = QueryInstrumentationMiddleware(lambda request: seen.append(DjangoTemplate.render) or HttpResponse())
+        middleware(RequestFactory().get('/books/'))
+        self.assertIsNot(seen[0], render)
+        self.assertIs(DjangoTemplate.render, render)
+        with override_settings(INSTRUMENTATION_SAMPLE_RATE=0):
+            middleware(RequestFactory().get('/books/'))
+        self.assertIs(seen[1], render)
+
+    def test_structured_log_line(self):
+        """INSTRUMENTATION_LOG writes one JSON line per sampled request"""
+        middleware = QueryInstrumentationMiddleware(lambda request: HttpResponse(str(Book.objects.count())))
+        with override_settings(INSTRUMENTATION_LOG=True), \
+                self.assertLogs('relationship_app.instrumentation', 'INFO') as logs:
+            middleware(RequestFactory().get('/books/'))
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line['path'], line['status'], line['queries']), ('/books/', 200, 1))
+
+    def test_unsampled_requests_are_untouched(self):
+        """With a zero sample rate no header is added"""
+        with override_settings(INSTRUMENTATION_SAMPLE_RATE=0):
+            response = self.client.get(reverse('relationship_app:home'))
+        self.assertNotIn('Server-Timing', response)
+
+
+def async_urlconf():
+    """A URLconf that routes the catalogue pages to the async views, as under ASGI"""
+    catalogue_names = {pattern.name for pattern in urls.catalogue_urlpatterns(views)}
+    patterns = [pattern for pattern in urls.urlpatterns if getattr(pattern, 'name', None) not in catalogue_names]
+    patterns += urls.catalogue_urlpatterns(async_views)
+    module = types.ModuleType('async_urls')
+    module.urlpatterns = [path('relationship/', include((patterns, 'relationship_app')))]
+    return module
+
+
+@override_settings(ROOT_URLCONF=async_urlconf())
+class AsyncViewTests(TestCase):
+    """The async views match the sync ones in output, queries and caching"""
+
+    # session + user/profile + conditional-GET probe
+    AUTH_QUERIES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = Author.objects.create(name='George Orwell')
+        cls.book = Book.objects.create(title='Animal Farm', author=cls.author)
+        cls.library = Library.objects.create(name='Central Library')
+        cls.library.books.add(cls.book)
+        Librarian.objects.create(name='Ada', library=cls.library)
+        cls.users = {}
+        for role in ('Admin', 'Librarian', 'Member'):
+            user = User.objects.create_user(role.lower(), password='pass12345')
+            user.profile.role = role
+            user.profile.save()
+            cls.users[role] = user
+
+    def setUp(self):
+        clear_caches()
+
+    def client_for(self, role):
+        client = AsyncClient()
+        client.force_login(self.users[role])
+        return client
+
+    def get(self, client, name, *args, headers=None):
+        """Request through the ASGI handler; the views' ORM calls run on this thread"""
+        url = reverse(f'relationship_app:{name}', args=args)
+        return async_to_sync(client.get)(url, headers=headers)
+
+    def test_user_without_profile(self):
+        """A user whose profile is missing is sent to the login page, not a 500"""
+        user = User.objects.create_user('nobody', password='pass12345')
+        UserProfile.objects.filter(user=user).delete()
+        client = AsyncClient()
+        client.force_login(user)
+        for name in ('admin_view', 'librarian_view', 'member_view'):
+            with self.subTest(name):
+                self.assertEqual(self.get(client, name).status_code, 302)
+
+    def test_pages_render_and_cache(self):
+        """Each page renders, then is served from its fragment with no catalogue queries"""
+        pages = [
+            ('Member', 'list_books', (), 'Animal Farm by George Orwell'),
+            ('Member', 'library_detail', (self.library.pk,), 'Librarian: Ada'),
+            ('Member', 'member_view', (), 'Animal Farm'),
+            ('Librarian', 'librarian_view', (), 'Central Library'),
+        ]
+        for role, name, args, text in pages:
+            with self.subTest(name):
+                self.assertTrue(iscoroutinefunction(resolve(reverse(f'relationship_app:{name}', args=args)).func))
+                client = self.client_for(role)
+                self.assertContains(self.get(client, name, *args), text)
+                with self.assertNumQueries(self.AUTH_QUERIES):
+                    response = self.get(client, name, *args)
+                self.assertContains(response, text)
+                # The instrumentation sees the queries made from the async views
+                self.assertIn(f'desc="{self.AUTH_QUERIES} queries"', response['Server-Timing'])
+
+    def test_fragment_expiring_after_check(self):
+        """A fragment gone between the check and the render is rendered from loaded data"""
+        pages = [
+            ('Member', 'list_books', (), 'Animal Farm by George Orwell'),
+            ('Member', 'library_detail', (self.library.pk,), 'Librarian: Ada'),
+            ('Member', 'member_view', (), 'Animal Farm'),
+            ('Librarian', 'librarian_view', (), 'Central Library'),
+        ]
+        for role, name, args, text in pages:
+            with self.subTest(name):
+                client = self.client_for(role)
+                with mock.patch.object(async_views, 'fragment_cached', return_value=True):
+                    self.assertContains(self.get(client, name, *args), text)
+                # The fragment stored by that render is not empty
+                with self.assertNumQueries(self.AUTH_QUERIES):
+                    self.assertContains(self.get(client, name, *args), text)
+
+    def test_rendering_and_flushing_run_off_the_event_loop(self):
+        """Templates (and their {% cache %} lookups) and the access count flush run in a worker thread"""
+        def on_loop(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                threads.append('worker')
+            else:
+                threads.append('loop')
+
+        threads = []
+        template_rendered.connect(on_loop)
+        self.addCleanup(template_rendered.disconnect, on_loop)
+        with mock.patch.object(warming, 'ACCESS_FLUSH_INTERVAL', 0), \
+                mock.patch.object(warming, 'flush_access_counts', side_effect=on_loop) as flush:
+            self.assertContains(self.get(self.client_for('Member'), 'list_books'), 'Animal Farm')
+        flush.assert_called_once()
+        self.assertEqual(set(threads), {'worker'})
+
+    def test_admin_view(self):
+        """The admin dashboard counts users, books and libraries"""
+        response = self.get(self.client_for('Admin'), 'admin_view')
+        self.assertEqual(response.context['total_users'], 3)
+        self.assertEqual(response.context['total_books'], 1)
+        self.assertEqual(response.context['total_libraries'], 1)
+
+    def test_roles_conditional_get_and_404(self):
+        """Role checks redirect, ETags give 304s and missing libraries 404"""
+        client = self.client_for('Member')
+        response = self.get(client, 'admin_view')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/relationship/login/', response.url)
+
+        etag = self.get(client, 'list_books')['ETag']
+        self.assertEqual(self.get(client, 'list_books', headers={'if-none-match': etag}).status_code, 304)
+
+        response = self.get(client, 'library_detail', self.library.pk + 100)
+        self.assertEqual(response.status_code, 404)
+
+
+class CacheWarmingTests(TestCase):
+    """warm_caches renders the most requested pages into the cache"""
+
+    # session + user/profile + conditional-GET probe
+    AUTH_QUERIES = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        author = Author.objects.create(name='George Orwell')
+        cls.libraries = []
+        for i in range(3):
+            library = Library.objects.create(name=f'Branch {i}')
+            library.books.add(*[Book.objects.create(title=f'Book {i}.{j}', author=author) for j in range(i + 1)])
+            cls.libraries.append(library)
+        recount_book_counts()
+
+    def setUp(self):
+        clear_caches()
+        warming._pending.clear()
+
+    def test_plan_follows_recent_requests(self):
+        """Requested pages come first, most requested first, then the largest libraries"""
+        client = self.client
+        client.force_login(User.objects.create_user('reader', password='pass12345'))
+        for _ in range(3):
+            client.get(reverse('relationship_app:library_detail', args=[self.libraries[0].pk]))
+        client.get(reverse('relationship_app:list_books'))
+        client.get(reverse('relationship_app:library_detail', args=[self.libraries[1].pk]))
+        client.get(reverse('relationship_app:library_detail', args=[self.libraries[1].pk]))
+        warming.flush_access_counts()
+        plan = warming.warming_plan(libraries=3, book_pages=1)
+        self.assertEqual([(page.name, page.key) for page in plan], [
+            ('dashboard_stats', None), ('library_summary', None),
+            ('library_detail', self.libraries[0].pk), ('library_detail', self.libraries[1].pk),
+            ('book_list', None), ('library_detail', self.libraries[2].pk),
+        ])
+        self.assertAlmostEqual(plan[2].hits, 3, places=3)
+
+    def test_counts_decay(self):
+        """Older requests count for less, halving every ACCESS_COUNT_HALF_LIFE"""
+        warming.record_access(RequestFactory().get('/'), 'book_list', None)
+        warming.flush_access_counts()
+        later = time.time() + 3600
+        with override_settings(ACCESS_COUNT_HALF_LIFE=3600):
+            self.assertAlmostEqual(warming.access_counts(later)[('book_list', None)], 0.5, places=3)
+
+    def test_warmed_pages_skip_catalogue_queries(self):
+        """After warming, pages are served from their fragments"""
+        stats = warming.warm(threads=1)
+        self.assertEqual((stats.warmed, stats.failed, stats.hit_ratio), (2 + 3 + 1, [], 1.0))
+        # The warm-up's own requests are not counted as demand
+        self.assertEqual(warming._pending, {})
+        self.client.force_login(User.objects.create_user('reader', password='pass12345'))
+        for url in (
+            reverse('relationship_app:library_detail', args=[self.libraries[2].pk]),
+            reverse('relationship_app:list_books'),
+        ):
+            with self.assertNumQueries(self.AUTH_QUERIES):
+                self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(0):
+            get_dashboard_stats()
+            get_library_summary()
+
+    def test_command_reports_time_and_hit_ratio(self):
+        """The command prints how long warming took and the hit ratio"""
+        out = StringIO()
+        call_command('warm_caches', threads=1, libraries=2, pages=1, stdout=out)
+        self.assertRegex(out.getvalue(), r'Warmed 5 of 5 entries in \d+\.\d\ds on 1 threads')
+        self.assertIn('Hit ratio afterwards: 100.0% (5/5)', out.getvalue())
+        call_command('warm_caches', background=True, stdout=StringIO())
+        self.assertEqual(Job.objects.get().task, tasks.warm_caches.name)
@@ -1,9 +1,30 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import api, async_views, views
 
 app_name = 'relationship_app'
 
+
+def catalogue_urlpatterns(catalogue):
+    """
+    The catalogue pages and role dashboards, served by ``catalogue``:
+    relationship_app.views, or relationship_app.async_views under ASGI
+    """
+    return [
+        # Function-based view for listing all books
+        path('books/', catalogue.list_books, name='list_books'),
+        
+        # Class-based view for library detail
+        path('library/<int:pk>/', catalogue.LibraryDetailView.as_view(), name='library_detail'),
+        
+        # Role-based access control URLs
+        path('admin/', catalogue.admin_view, name='admin_view'),
+        path('librarian/', catalogue.librarian_view, name='librarian_view'),
+        path('member/', catalogue.member_view, name='member_view'),
+    ]
+
+
 urlpatterns = [
     # Home page
     path('', views.home_view, name='home'),
@@ -13,14 +34,21 @@ urlpatterns = [
     path('register/', views.register_view, name='register'),
     path('logout/', auth_views.LogoutView.as_view(template_name='relationship_app/logout.html', http_method_names=['get', 'post']), name='logout'),
     
-    # Function-based view for listing all books
-    path('books/', views.list_books, name='list_books'),
+    # Ranked full-text search and type-ahead suggestions
+    path('search/', views.search_view, name='search'),
+    path('autocomplete/', views.autocomplete_view, name='autocomplete'),
     
-    # Class-based view for library detail
-    path('library/<int:pk>/', views.LibraryDetailView.as_view(), name='library_detail'),
-    
-    # Role-based access control URLs
-    path('admin/', views.admin_view, name='admin_view'),
-    path('librarian/', views.librarian_view, name='librarian_view'),
-    path('member/', views.member_view, name='member_view'),
-]
\ No newline at end of file
+    # Streaming CSV / JSON Lines exports
+    path('export/books.<str:fmt>', views.export_books, name='export_books'),
+    path('export/library/<int:pk>/books.<str:fmt>', views.export_library_books, name='export_library_books'),
+    path('export/authors.<str:fmt>', views.export_authors, name='export_authors'),
+]
+
+urlpatterns += catalogue_urlpatterns(async_views if settings.ASYNC_VIEWS else views)
+
+# Read-only JSON API
+for name in api.RESOURCES:
+    urlpatterns += [
+        path(f'api/{name}/', api.list_views[name], name=f'api_{name}'),
+        path(f'api/{name}/<int:pk>/', api.detail_views[name], name=f'api_{name}_detail'),
+    ]
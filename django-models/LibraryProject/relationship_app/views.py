@@ -1,13 +1,44 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import get_object_or_404, render, redirect
 from django.views.generic import ListView
-from django.views.generic.detail import DetailView
-from django.http import HttpResponse
+from django.views.generic.detail import DetailView, SingleObjectMixin
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.forms import UserCreationForm
-from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.decorators import login_required
 from django.http import HttpResponseForbidden
 from django.contrib.auth.mixins import LoginRequiredMixin
 from .models import Book, Library, Author, Librarian, UserProfile
+from . import autocomplete
+from .caching import cache_version
+from .conditional import catalogue_condition
+from .decorators import get_user_role, role_required
+from .exporters import CONTENT_TYPES, author_rows, book_rows, export_blocks, library_book_rows
+from .pagination import paginate_by_cursor
+from .search import AUTHOR_INDEX, BOOK_INDEX
+from .services import dashboard_stats_version, get_dashboard_stats, get_library_summary
+from .warming import record_access
+
+# Page sizes for the keyset-paginated listings
+BOOKS_PER_PAGE = 50
+LIBRARIAN_BOOKS_PER_PAGE = 10
+MEMBER_BOOKS_PER_PAGE = 20
+SEARCH_RESULTS = 50
+
+
+def fragment_cache_context(*models):
+    """
+    Context for the {% cache %} blocks in the catalogue templates: the
+    fragment lifetime and the version of the models the fragment shows.
+    """
+    return {
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'cache_version': cache_version(*models),
+    }
+
 
 # Home view (no authentication required)
 def home_view(request):
@@ -18,19 +49,25 @@ def home_view(request):
 
 # Function-based view to list all books (requires authentication)
 @login_required
+@catalogue_condition(Book, Author)
 def list_books(request):
     """
     Function-based view that lists all books stored in the database.
-    Renders a list of book titles and their authors.
+    Renders a list of book titles and their authors, one page at a time
+    using keyset pagination (?cursor=...). The page is fetched lazily, so
+    a cached page fragment is served without querying the catalogue.
     Requires user authentication.
     """
     books = Book.objects.all().select_related('author')  # Optimize query with select_related
+    page = paginate_by_cursor(request, books, BOOKS_PER_PAGE)
+    record_access(request, 'book_list', page.cursor)
     
     # Render HTML template
-    context = {'books': books}
+    context = {'books': page, 'page': page, **fragment_cache_context(Book, Author)}
     return render(request, 'relationship_app/list_books.html', context)
 
 # Class-based view to display library details (requires authentication)
+@method_decorator(catalogue_condition(Library, Book, Author, Librarian), name='get')
 class LibraryDetailView(LoginRequiredMixin, DetailView):
     """
     Class-based view that displays details for a specific library,
@@ -42,16 +79,109 @@ class LibraryDetailView(LoginRequiredMixin, DetailView):
     context_object_name = 'library'
     login_url = '/relationship/login/'
     
+    def get_queryset(self):
+        """
+        Load the library, its librarian, its books and their authors in
+        a constant number of queries instead of one query per book.
+        """
+        return Library.objects.select_related('librarian').prefetch_related(
+            Prefetch('books', queryset=Book.objects.select_related('author'))
+        )
+    
+    def get(self, request, *args, **kwargs):
+        """
+        Defer loading the library until the template needs it, so a page
+        whose fragment is already cached is served without querying.
+        A missing library still raises Http404 when the fragment renders.
+        """
+        self.object = SimpleLazyObject(self.get_object)
+        record_access(request, 'library_detail', self.kwargs[self.pk_url_kwarg])
+        context = self.get_context_data(object=self.object)
+        return self.render_to_response(context)
+    
     def get_context_data(self, **kwargs):
         """
-        Add additional context data if needed
+        Add the library and the fragment cache key parts to the context.
+        SingleObjectMixin.get_context_data is skipped because it would
+        evaluate the lazy library.
         """
-        context = super().get_context_data(**kwargs)
-        # The library and its books are automatically available in the template
-        # through the DetailView's default behavior
+        context = super(SingleObjectMixin, self).get_context_data(**kwargs)
+        context['library'] = self.object
+        context['library_id'] = self.kwargs[self.pk_url_kwarg]
+        context.update(fragment_cache_context(Library, Book, Author, Librarian))
         return context
 
 
+@login_required
+def search_view(request):
+    """
+    Ranked full-text search over book titles and author names (?q=...).
+    Each result list is one FTS5 query for the ranked ids plus one query
+    to load those rows.
+    """
+    query = request.GET.get('q', '').strip()
+    books = authors = []
+    if query:
+        books = BOOK_INDEX.search(Book.objects.select_related('author'), query, SEARCH_RESULTS)
+        authors = AUTHOR_INDEX.search(Author.objects.all(), query, SEARCH_RESULTS)
+    context = {'query': query, 'books': books, 'authors': authors}
+    return render(request, 'relationship_app/search.html', context)
+
+
+@login_required
+def autocomplete_view(request):
+    """
+    Type-ahead suggestions for ?q=<prefix> from the in-memory prefix
+    index (relationship_app.autocomplete). Only the session lookup
+    touches the database.
+    """
+    try:
+        limit = int(request.GET.get('limit', 10))
+    except ValueError:
+        limit = 10
+    results = autocomplete.index.lookup(request.GET.get('q', ''), limit)
+    return JsonResponse({'results': results})
+
+
+# Streaming exports
+def stream_export(dataset, fmt, filename):
+    """
+    StreamingHttpResponse for a (header, rows) dataset from
+    relationship_app.exporters. Rows are read and encoded while the
+    response is sent, so memory use does not depend on the row count.
+    """
+    if fmt not in CONTENT_TYPES:
+        raise Http404(f'Unknown export format: {fmt}')
+    response = StreamingHttpResponse(export_blocks(dataset, fmt), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+
+@login_required
+def export_books(request, fmt):
+    """
+    Export every book with its author as CSV or JSON Lines
+    """
+    return stream_export(book_rows(), fmt, 'books')
+
+
+@login_required
+def export_library_books(request, pk, fmt):
+    """
+    Export the books in one library as CSV or JSON Lines
+    """
+    get_object_or_404(Library.objects.only('pk'), pk=pk)
+    return stream_export(library_book_rows(pk), fmt, f'library-{pk}-books')
+
+
+@login_required
+def export_authors(request, fmt):
+    """
+    Export every author with their book count as CSV or JSON Lines
+    """
+    return stream_export(author_rows(), fmt, 'authors')
+
+
 # Authentication Views
 
 def register_view(request):
@@ -74,62 +204,56 @@ def register_view(request):
     return render(request, 'relationship_app/register.html', {'form': form})
 
 
-# Role-based access control functions
-def is_admin(user):
-    """Check if user has Admin role"""
-    return user.is_authenticated and hasattr(user, 'profile') and user.profile.role == 'Admin'
-
-def is_librarian(user):
-    """Check if user has Librarian role"""
-    return user.is_authenticated and hasattr(user, 'profile') and user.profile.role == 'Librarian'
-
-def is_member(user):
-    """Check if user has Member role"""
-    return user.is_authenticated and hasattr(user, 'profile') and user.profile.role == 'Member'
-
-
-
-
-
 # Role-based views
-@user_passes_test(is_admin, login_url='/relationship/login/')
+@role_required('Admin', login_url='/relationship/login/')
+@catalogue_condition(UserProfile, Book, Library, personal=True, extra=dashboard_stats_version)
 def admin_view(request):
     """
     Admin view - only accessible to users with Admin role
     """
     context = {
         'user': request.user,
-        'role': request.user.profile.role,
-        'total_users': UserProfile.objects.count(),
-        'total_books': Book.objects.count(),
-        'total_libraries': Library.objects.count(),
+        'role': get_user_role(request),
+        'libraries': get_library_summary(),
+        **get_dashboard_stats(),
     }
     return render(request, 'relationship_app/admin_view.html', context)
 
 
-@user_passes_test(is_librarian, login_url='/relationship/login/')
+@role_required('Librarian', login_url='/relationship/login/')
+@catalogue_condition(Book, Author, Library, personal=True)
 def librarian_view(request):
     """
     Librarian view - only accessible to users with Librarian role
     """
+    page = paginate_by_cursor(request, Book.objects.select_related('author'), LIBRARIAN_BOOKS_PER_PAGE)
     context = {
         'user': request.user,
-        'role': request.user.profile.role,
-        'books': Book.objects.all()[:10],  # Show recent books
-        'libraries': Library.objects.all(),
+        'role': get_user_role(request),
+        'books': page,
+        'page': page,
+        # Passed uncalled: the template only evaluates it on a fragment cache miss
+        'libraries': get_library_summary,
+        'fragment_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'books_version': cache_version(Book, Author),
+        'libraries_version': cache_version(Library, Book),
     }
     return render(request, 'relationship_app/librarian_view.html', context)
 
 
-@user_passes_test(is_member, login_url='/relationship/login/')
+@role_required('Member', login_url='/relationship/login/')
+@catalogue_condition(Book, Author, personal=True)
 def member_view(request):
     """
     Member view - only accessible to users with Member role
     """
+    page = paginate_by_cursor(request, Book.objects.select_related('author'), MEMBER_BOOKS_PER_PAGE)
     context = {
         'user': request.user,
-        'role': request.user.profile.role,
-        'available_books': Book.objects.all()[:20],  # Show available books
+        'role': get_user_role(request),
+        'available_books': page,
+        'page': page,
+        **fragment_cache_context(Book, Author),
     }
     return render(request, 'relationship_app/member_view.html', context)
 
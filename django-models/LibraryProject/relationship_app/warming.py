@@ -0,0 +1,256 @@
+"""
+Cache warming for the catalogue pages, run by ``manage.py warm_caches``
+after a deploy or a cache flush.
+
+Pages are warmed in order of recent demand:
+- the dashboard aggregates first, since every admin page load needs them;
+- then library detail pages and book list pages, most requested first.
+  The views count requests per page with record_access(), or
+  arecord_access() in the async views. Each process
+  keeps its counts in memory and merges them into the shared tier every
+  ACCESS_FLUSH_INTERVAL seconds. The shared counts halve every
+  ACCESS_COUNT_HALF_LIFE seconds, so the order follows recent traffic;
+- pages nobody has requested recently fill the remaining places, the
+  first list pages and the largest libraries first.
+
+Each page is rendered by its view, as a request from a signed-in user,
+on up to WARM_CACHE_THREADS threads at once. The {% cache %} fragments
+land in both cache tiers (see relationship_app.caching), so every
+worker process serves them, and the database pages they read are left
+in the OS page cache. The compiled templates are cached per process and
+are only warmed in the process that runs warm().
+"""
+import logging
+import queue
+import threading
+import time
+from collections import Counter, namedtuple
+from dataclasses import dataclass, field
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import RequestFactory
+from django.urls import reverse
+
+from .caching import KEY_PREFIX, cache_get, cache_version, fragment_cached, make_key, shared_cache
+from .models import Author, Book, Librarian, Library
+from .pagination import CursorPaginator
+from .services import DASHBOARD_STATS_KEY, get_library_summary, refresh_dashboard_stats
+
+logger = logging.getLogger(__name__)
+
+ACCESS_KEY = f'{KEY_PREFIX}:access_counts'
+# Seconds between merges of a process's access counts into the shared tier
+ACCESS_FLUSH_INTERVAL = 30
+DEFAULT_HALF_LIFE = 3600
+# Pages whose access counts are kept, the most requested ones
+ACCESS_KEEP = 1000
+
+DEFAULT_THREADS = 4
+DEFAULT_LIBRARIES = 100
+DEFAULT_BOOK_PAGES = 10
+
+# A page to warm: ``name`` is a view's fragment name or a dashboard
+# aggregate, ``key`` the library id or list cursor, ``hits`` its recent
+# access count
+Page = namedtuple('Page', 'name key hits')
+
+_pending = Counter()
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def _count_access(request, name, key):
+    # True when the pending counts are due to be flushed
+    global _last_flush
+    if getattr(request, 'cache_warming', False):
+        return False
+    with _pending_lock:
+        _pending[name, key] += 1
+        now = time.monotonic()
+        due = now - _last_flush >= ACCESS_FLUSH_INTERVAL
+        if due:
+            _last_flush = now
+    return due
+
+
+def record_access(request, name, key):
+    """
+    Count a request for page ``key`` of ``name`` ('library_detail' or
+    'book_list'). Requests made by warm() itself are not counted.
+    """
+    if _count_access(request, name, key):
+        flush_access_counts()
+
+
+async def arecord_access(request, name, key):
+    """record_access() for the async views; the flush writes the shared tier through sync_to_async"""
+    if _count_access(request, name, key):
+        await sync_to_async(flush_access_counts)()
+
+
+def access_counts(now=None):
+    """Recent requests per page, ``{(name, key): hits}``, decayed to ``now``"""
+    entry = shared_cache().get(ACCESS_KEY)
+    if entry is None:
+        return {}
+    counts, counted_at = entry
+    now = time.time() if now is None else now
+    half_life = getattr(settings, 'ACCESS_COUNT_HALF_LIFE', DEFAULT_HALF_LIFE)
+    factor = 0.5 ** (max(now - counted_at, 0) / half_life)
+    return {page: hits * factor for page, hits in counts.items()}
+
+
+def flush_access_counts():
+    """
+    Add this process's pending counts to the shared ones. Two processes
+    flushing at the same moment can lose one's counts, which only blurs
+    the warming order.
+    """
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return
+    now = time.time()
+    counts = Counter(access_counts(now))
+    counts.update(pending)
+    shared_cache().set(ACCESS_KEY, (dict(counts.most_common(ACCESS_KEEP)), now), None)
+
+
+def _ranked(name, counts, fallback, limit):
+    hits = {key: n for (page_name, key), n in counts.items() if page_name == name}
+    keys = sorted(hits, key=hits.get, reverse=True)
+    keys += [key for key in fallback if key not in hits]
+    return [Page(name, key, hits.get(key, 0)) for key in keys[:limit]]
+
+
+def warming_plan(libraries=DEFAULT_LIBRARIES, book_pages=DEFAULT_BOOK_PAGES):
+    """
+    The pages to warm in priority order: the dashboard aggregates, then up
+    to ``libraries`` library pages and ``book_pages`` list pages, most
+    recently requested first
+    """
+    from .views import BOOKS_PER_PAGE  # the views import record_access from here
+
+    counts = access_counts()
+    requested = [key for name, key in counts if name == 'library_detail']
+    # Libraries deleted since they were counted would only render a 404
+    existing = set(Library.objects.filter(pk__in=requested).values_list('pk', flat=True))
+    counts = {page: hits for page, hits in counts.items() if page[0] != 'library_detail' or page[1] in existing}
+    largest = Library.objects.order_by('-book_count', 'pk').values_list('pk', flat=True)[:libraries]
+    paginator = CursorPaginator(Book.objects.all(), BOOKS_PER_PAGE)
+    first_pages = [None, *paginator.cursors(book_pages)] if book_pages else []
+    pages = _ranked('book_list', counts, first_pages, book_pages) + _ranked(
+        'library_detail', counts, largest, libraries,
+    )
+    pages.sort(key=lambda page: page.hits, reverse=True)
+    return [Page('dashboard_stats', None, None), Page('library_summary', None, None), *pages]
+
+
+def render_page(page, user):
+    """Compute a dashboard aggregate, or render a page through its view"""
+    from . import views
+
+    if page.name == 'dashboard_stats':
+        refresh_dashboard_stats()
+        return
+    if page.name == 'library_summary':
+        get_library_summary()
+        return
+    factory = RequestFactory()
+    if page.name == 'library_detail':
+        request = factory.get(reverse('relationship_app:library_detail', args=[page.key]))
+        view, kwargs = views.LibraryDetailView.as_view(), {'pk': page.key}
+    else:
+        request = factory.get(reverse('relationship_app:list_books'), {'cursor': page.key} if page.key else {})
+        view, kwargs = views.list_books, {}
+    request.user = user
+    request.cache_warming = True
+    response = view(request, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    if response.status_code != 200:
+        raise ValueError(f'{request.path} returned {response.status_code}')
+
+
+def is_cached(page):
+    """Whether the cache entry ``page`` renders is stored"""
+    if page.name == 'dashboard_stats':
+        return cache_get(DASHBOARD_STATS_KEY) is not None
+    if page.name == 'library_summary':
+        return cache_get(make_key('library_summary', depends_on=(Library, Book))) is not None
+    if page.name == 'library_detail':
+        return fragment_cached('library_detail', page.key, cache_version(Library, Book, Author, Librarian))
+    return fragment_cached('book_list', page.key, cache_version(Book, Author))
+
+
+@dataclass
+class WarmingStats:
+    warmed: int = 0
+    failed: list = field(default_factory=list)
+    hits: int = 0
+    checked: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def hit_ratio(self):
+        return self.hits / self.checked if self.checked else 0.0
+
+
+def warm(pages=None, threads=None):
+    """
+    Render ``pages`` (default: warming_plan()) in order on up to
+    ``threads`` threads, then check which of them are cached; returns
+    the WarmingStats. With one thread they render in the calling thread.
+    """
+    pages = warming_plan() if pages is None else pages
+    threads = threads or getattr(settings, 'WARM_CACHE_THREADS', DEFAULT_THREADS)
+    stats = WarmingStats()
+    # Unsaved: signed in as far as login_required is concerned, with no role
+    user = User(username='cache-warmer')
+    pending = queue.SimpleQueue()
+    for page in pages:
+        pending.put(page)
+    lock = threading.Lock()
+
+    def work():
+        while True:
+            try:
+                page = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                render_page(page, user)
+            except Exception as e:
+                logger.warning('Warming %s %s failed: %s', page.name, page.key, e)
+                with lock:
+                    stats.failed.append((page, e))
+            else:
+                with lock:
+                    stats.warmed += 1
+
+    def work_and_close():
+        try:
+            work()
+        finally:
+            connections.close_all()
+
+    start = time.perf_counter()
+    if threads <= 1:
+        work()
+    else:
+        workers = [
+            threading.Thread(target=work_and_close, name=f'warm-caches-{index}', daemon=True)
+            for index in range(min(threads, len(pages)))
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+    stats.elapsed = time.perf_counter() - start
+    stats.checked = len(pages)
+    stats.hits = sum(is_cached(page) for page in pages)
+    return stats